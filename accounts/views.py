@@ -6,16 +6,15 @@ from django.contrib import messages
 from django.urls import reverse_lazy
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth.models import User
-from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 import secrets
 
+from core.mail import queue_email
 from .forms import SignUpForm, SignInForm, ProfileForm, ChangePasswordForm, CustomPasswordResetForm, CustomSetPasswordForm
 from .models import UserProfile
 
@@ -28,19 +27,14 @@ def signup(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            
-            # Send welcome email
-            try:
-                send_mail(
-                    subject='Welcome to PackAxis!',
-                    message=f'Hi {user.first_name},\n\nThank you for creating an account with PackAxis. You can now enjoy faster checkout and track your orders.\n\nBest regards,\nThe PackAxis Team',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[user.email],
-                    fail_silently=True,
+            # Create the account and queue its welcome email together
+            with transaction.atomic():
+                user = form.save()
+                queue_email(
+                    'Welcome to PackAxis!',
+                    f'Hi {user.first_name},\n\nThank you for creating an account with PackAxis. You can now enjoy faster checkout and track your orders.\n\nBest regards,\nThe PackAxis Team',
+                    [user.email],
                 )
-            except Exception:
-                pass
             
             # Log the user in
             login(request, user)
@@ -0,0 +1,15 @@
+"""
+Flush buffered blog view counts
+Adds the views buffered in the cache to Post.view_count in one UPDATE.
+Run from cron more often than BLOG_VIEW_FLUSH_INTERVAL for fresher counts.
+"""
+from django.core.management.base import BaseCommand
+from blog.view_counts import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered blog post view counts to the database'
+
+    def handle(self, *args, **options):
+        flushed = flush_view_counts()
+        self.stdout.write(self.style.SUCCESS(f'✅ Flushed {flushed} blog views'))
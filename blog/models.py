@@ -75,6 +75,6 @@ class Post(models.Model):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
     
     def increment_views(self):
-        """Increment view count"""
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        """Count a view; buffered and added to view_count on the next flush"""
+        from .view_counts import record_view
+        record_view(self.slug)
@@ -0,0 +1,36 @@
+"""
+Model signal handlers for the blog app.
+Invalidate cached blog pages (see core.caching) when posts or categories change.
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from core import caching
+from core.images import generate_derivatives_on_commit, image_changed, remember_stored_image
+from .models import Category, Post
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, update_fields=None, **kwargs):
+    # View counting is not a content change
+    if update_fields and set(update_fields) == {'view_count'}:
+        return
+    caching.bump_tags_on_commit(caching.BLOG, caching.post_tag(instance.pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.BLOG)
+
+
+@receiver(pre_save, sender=Post)
+def featured_image_remember_stored(sender, instance, update_fields=None, **kwargs):
+    remember_stored_image(sender, instance, 'featured_image', update_fields)
+
+
+@receiver(post_save, sender=Post)
+def featured_image_uploaded(sender, instance, update_fields=None, **kwargs):
+    if not image_changed(instance, 'featured_image', update_fields):
+        return
+    generate_derivatives_on_commit(instance.featured_image, [caching.BLOG, caching.post_tag(instance.pk)])
@@ -1,3 +1,78 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core import caching
+from .models import Post
+from .view_counts import FLUSH_LOCK_KEY, flush_view_counts, pending_views, record_view
 
-# Create your tests here.
+
+class BlogViewCountTestCase(TestCase):
+    """Tests for buffered blog view counting"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.post = Post.objects.create(
+            title="Bag Sizes", slug="bag-sizes", excerpt="Sizes", content="Body",
+            meta_description="Sizes", status='published'
+        )
+        self.url = reverse('blog:post_detail', kwargs={'slug': self.post.slug})
+    
+    def test_views_are_not_written_per_hit(self):
+        """Test a post view issues no UPDATE once the flush interval lock is held"""
+        cache.set(FLUSH_LOCK_KEY, 1, 60)
+        with self.settings(PAGE_CACHE_ENABLED=False), CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 0)
+    
+    def test_flush_command_applies_buffered_views(self):
+        """Test flush_blog_views adds pending views once and resets the buffer"""
+        cache.set(FLUSH_LOCK_KEY, 1, 60)
+        for _ in range(3):
+            record_view(self.post.slug)
+        call_command('flush_blog_views', stdout=StringIO())
+        call_command('flush_blog_views', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 3)
+        self.assertEqual(pending_views([self.post.slug]), {})
+    
+    def test_failed_flush_keeps_views_pending(self):
+        """Test views stay buffered when the UPDATE fails"""
+        cache.set(FLUSH_LOCK_KEY, 1, 60)
+        for _ in range(2):
+            record_view(self.post.slug)
+        with patch('django.db.models.QuerySet.update', side_effect=DatabaseError('lock timeout')):
+            with self.assertRaises(DatabaseError):
+                flush_view_counts([self.post.slug])
+        self.assertEqual(pending_views([self.post.slug]), {self.post.slug: 2})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 0)
+    
+    def test_periodic_flush_from_request_path(self):
+        """Test the first view after the interval lock expires flushes the buffer"""
+        record_view(self.post.slug)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 1)
+
+
+class BlogCacheTagTestCase(TestCase):
+    """Tests for blog cache invalidation"""
+    
+    def test_tags_bumped_after_commit(self):
+        """Test saving a post bumps the blog tag only once the transaction commits"""
+        cache.clear()
+        before = caching.get_tag_versions([caching.BLOG])
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                title="Kraft Guide", slug="kraft-guide", excerpt="Kraft", content="Body",
+                meta_description="Kraft", status='published'
+            )
+            self.assertEqual(caching.get_tag_versions([caching.BLOG]), before)
+        self.assertNotEqual(caching.get_tag_versions([caching.BLOG]), before)
@@ -0,0 +1,71 @@
+"""
+Buffered blog post view counts.
+
+Each post view is an atomic cache incr instead of an UPDATE. The buffered
+counts are folded into Post.view_count in one UPDATE ... CASE by
+flush_view_counts(), run by the flush_blog_views command and opportunistically
+at most once per BLOG_VIEW_FLUSH_INTERVAL seconds from the request path, so
+the stored count lags real traffic by at most that long.
+
+Flushing subtracts exactly what it read (decr), so views recorded while a
+flush is running are kept for the next one. The subtraction only happens after
+the UPDATE has succeeded, so a flush whose UPDATE fails leaves the views
+pending for the next one instead of losing them.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+VIEW_KEY = 'blog:views:{}'
+FLUSH_LOCK_KEY = 'blog:views:flush-lock'
+FLUSH_INTERVAL = getattr(settings, 'BLOG_VIEW_FLUSH_INTERVAL', 300)
+
+
+def record_view(slug):
+    """Count one view of the post in the cache (keyed by slug, so cached pages need no query)"""
+    key = VIEW_KEY.format(slug)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First view since the last flush; another request may create it first
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+    if FLUSH_INTERVAL and cache.add(FLUSH_LOCK_KEY, 1, FLUSH_INTERVAL):
+        flush_view_counts()
+
+
+def pending_views(slugs):
+    """{slug: views recorded but not yet flushed}"""
+    keys = {VIEW_KEY.format(slug): slug for slug in slugs}
+    return {keys[key]: count for key, count in cache.get_many(list(keys)).items() if count}
+
+
+def flush_view_counts(slugs=None):
+    """Add buffered views to Post.view_count in one UPDATE; return the number of views flushed"""
+    if slugs is None:
+        slugs = Post.objects.values_list('slug', flat=True)
+    pending = pending_views(slugs)
+    if not pending:
+        return 0
+
+    with transaction.atomic():
+        Post.objects.filter(slug__in=pending).update(
+            view_count=Case(
+                *[When(slug=slug, then=F('view_count') + count) for slug, count in pending.items()],
+                output_field=IntegerField(),
+            )
+        )
+    for slug, count in pending.items():
+        try:
+            cache.decr(VIEW_KEY.format(slug), count)
+        except ValueError:
+            # Key evicted since it was read; nothing left to subtract
+            pass
+    total = sum(pending.values())
+    logger.info(f'Flushed {total} blog views for {len(pending)} posts')
+    return total
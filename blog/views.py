@@ -1,9 +1,18 @@
 from django.shortcuts import render, get_object_or_404
 from django.core.paginator import Paginator
 from django.utils import timezone
+from core import caching
+from core.page_cache import add_surrogate_keys, cache_anonymous_page
 from .models import Post, Category
+from .view_counts import record_view
 
 
+def count_cached_view(request, slug):
+    """Keep counting post views when the page is served from the page cache"""
+    record_view(slug)
+
+
+@cache_anonymous_page(tags=[caching.BLOG], vary_on=['category', 'page'])
 def blog_list(request):
     """Display list of published blog posts"""
     
@@ -40,6 +49,7 @@ def blog_list(request):
     return render(request, 'blog/blog.html', context)
 
 
+@cache_anonymous_page(tags=[caching.BLOG], on_hit=count_cached_view)
 def post_detail(request, slug):
     """Display individual blog post"""
     
@@ -50,8 +60,10 @@ def post_detail(request, slug):
         publish_date__lte=timezone.now()
     )
     
-    # Increment view count
-    post.increment_views()
+    add_surrogate_keys(request, caching.post_tag(post.pk))
+    
+    # Buffered in the cache; see view_counts
+    record_view(post.slug)
     
     # Get related posts (same category, excluding current post)
     related_posts = Post.objects.filter(
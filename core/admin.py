@@ -1,12 +1,13 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
-from django.core.cache import cache
 from .models import (
     MenuItem, Product, ProductImage, ProductCategory, Service, Quote, FAQ, Industry, 
     Cart, CartItem, Order, OrderItem, ProductVariant, TieredPricing, DiscountRule, 
-    ProductReview, UseCase, ProductUseCase, ProductIndustry, SiteSettings, PromoCode, Tag
+    ProductReview, UseCase, ProductUseCase, ProductIndustry, SiteSettings, PromoCode, Tag, OutboundEmail, StripeEvent
 )
 from .admin_mixins import HierarchyDisplayMixin, ImagePreviewMixin, CountDisplayMixin
+from .images import thumbnail_url
 
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
@@ -29,16 +30,6 @@ class MenuItemAdmin(admin.ModelAdmin):
         return obj.has_children()
     has_children.boolean = True
     has_children.short_description = 'Has Dropdown'
-    
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        # Invalidate menu cache when menu items change
-        cache.delete('top_level_menu_items')
-    
-    def delete_model(self, request, obj):
-        super().delete_model(request, obj)
-        # Invalidate menu cache when menu items are deleted
-        cache.delete('top_level_menu_items')
 
 
 @admin.register(ProductCategory)
@@ -49,6 +40,8 @@ class ProductCategoryAdmin(HierarchyDisplayMixin, ImagePreviewMixin, CountDispla
     search_fields = ['title', 'description', 'slug']
     prepopulated_fields = {'slug': ('title',)}
     list_per_page = 20
+    list_select_related = ['parent']
+    ordering = ['path']
     autocomplete_fields = ['parent']
     
     fieldsets = (
@@ -76,16 +69,6 @@ class ProductCategoryAdmin(HierarchyDisplayMixin, ImagePreviewMixin, CountDispla
         count = obj.products.count()
         return self.colored_count(count, 'products')
     product_count.short_description = 'Products'
-    
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        # Invalidate product categories cache when categories change
-        cache.delete('active_product_categories')
-    
-    def delete_model(self, request, obj):
-        super().delete_model(request, obj)
-        # Invalidate product categories cache when categories are deleted
-        cache.delete('active_product_categories')
 
 
 class ProductImageInline(admin.TabularInline):
@@ -96,7 +79,7 @@ class ProductImageInline(admin.TabularInline):
     
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="max-height: 80px; max-width: 80px; object-fit: cover; border-radius: 8px;" />', obj.image.url)
+            return format_html('<img src="{}" style="max-height: 80px; max-width: 80px; object-fit: cover; border-radius: 8px;" />', thumbnail_url(obj.image))
         return "No image"
     image_preview.short_description = 'Preview'
 
@@ -146,10 +129,34 @@ class ProductUseCaseInline(admin.TabularInline):
         return formset
 
 
+class RatingListFilter(admin.SimpleListFilter):
+    """Filter products by their stored average review rating"""
+    title = 'rating'
+    parameter_name = 'rating'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('4', '4★ and up'),
+            ('3', '3★ and up'),
+            ('low', 'Below 3★'),
+            ('none', 'No reviews'),
+        ]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value in ('4', '3'):
+            return queryset.filter(rating_count__gt=0, rating_avg__gte=int(value))
+        if value == 'low':
+            return queryset.filter(rating_count__gt=0, rating_avg__lt=3)
+        if value == 'none':
+            return queryset.filter(rating_count=0)
+        return queryset
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['image_preview', 'title', 'display_categories', 'display_tags', 'display_price_admin', 'stock_status', 'review_stats', 'order', 'is_active', 'is_featured']
-    list_filter = ['is_active', 'is_featured', 'categories', 'tags', 'track_inventory', 'created_at']
+    list_filter = ['is_active', 'is_featured', RatingListFilter, 'categories', 'tags', 'track_inventory', 'created_at']
     list_editable = ['order', 'is_active', 'is_featured']
     search_fields = ['title', 'description', 'categories__title', 'sku', 'tags__name']
     prepopulated_fields = {'slug': ('title',)}
@@ -193,7 +200,7 @@ class ProductAdmin(admin.ModelAdmin):
     
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="max-height: 50px; max-width: 50px; object-fit: cover; border-radius: 8px;" />', obj.image.url)
+            return format_html('<img src="{}" style="max-height: 50px; max-width: 50px; object-fit: cover; border-radius: 8px;" />', thumbnail_url(obj.image))
         return "No image"
     image_preview.short_description = 'Preview'
     
@@ -225,15 +232,11 @@ class ProductAdmin(admin.ModelAdmin):
     stock_status.short_description = 'Stock'
     
     def review_stats(self, obj):
-        try:
-            count = obj.review_count
-            if count > 0:
-                avg = obj.average_rating
-                return format_html('<span style="color: #ffc107;">★</span> {} ({} reviews)', avg, count)
-            return format_html('<span style="color: #999;">No reviews</span>')
-        except Exception:
-            return format_html('<span style="color: #999;">—</span>')
+        if obj.rating_count > 0:
+            return format_html('<span style="color: #ffc107;">★</span> {} ({} reviews)', obj.rating_avg, obj.rating_count)
+        return format_html('<span style="color: #999;">No reviews</span>')
     review_stats.short_description = 'Reviews'
+    review_stats.admin_order_field = 'rating_avg'
     
     def display_tags(self, obj):
         """Display product tags with colors"""
@@ -373,6 +376,8 @@ class IndustryAdmin(HierarchyDisplayMixin, ImagePreviewMixin, admin.ModelAdmin):
     list_editable = ['order', 'is_active']
     search_fields = ['title', 'url']
     list_per_page = 20
+    list_select_related = ['parent']
+    ordering = ['path']
     autocomplete_fields = ['parent']
     
     fieldsets = (
@@ -546,7 +551,7 @@ class CartAdmin(admin.ModelAdmin):
     list_display = ['id', 'session_key_short', 'total_items', 'subtotal', 'created_at', 'updated_at']
     list_filter = ['created_at']
     search_fields = ['session_key']
-    readonly_fields = ['session_key', 'created_at', 'updated_at']
+    readonly_fields = ['session_key', 'payment_intent_id', 'payment_intent_secret', 'payment_intent_fingerprint', 'created_at', 'updated_at']
     inlines = [CartItemInline]
     date_hierarchy = 'created_at'
     
@@ -770,3 +775,49 @@ class SiteSettingsAdmin(admin.ModelAdmin):
         settings = SiteSettings.get_settings()
         from django.shortcuts import redirect
         return redirect(f'/admin/core/sitesettings/{settings.pk}/change/')
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'to']
+    readonly_fields = [field.name for field in OutboundEmail._meta.fields]
+    date_hierarchy = 'created_at'
+    list_per_page = 50
+    actions = ['retry_now']
+    
+    def has_add_permission(self, request):
+        # Emails are queued by the site, not written by hand
+        return False
+    
+    def recipients(self, obj):
+        return ', '.join(obj.to)
+    recipients.short_description = "To"
+    
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboundEmail.STATUS_SENT).update(
+            status=OutboundEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f'{updated} email(s) queued for another delivery attempt.')
+    retry_now.short_description = "Retry selected emails now"
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'status', 'stripe_created', 'received_at', 'processed_at']
+    list_filter = ['status', 'type']
+    search_fields = ['event_id']
+    readonly_fields = [field.name for field in StripeEvent._meta.fields]
+    date_hierarchy = 'stripe_created'
+    list_per_page = 50
+    actions = ['reprocess']
+    
+    def has_add_permission(self, request):
+        # Events arrive through the webhook
+        return False
+    
+    def reprocess(self, request, queryset):
+        updated = queryset.update(status=StripeEvent.STATUS_PENDING, last_error='', processed_at=None)
+        self.message_user(request, f'{updated} event(s) queued to be applied again.')
+    reprocess.short_description = "Apply selected events again"
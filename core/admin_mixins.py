@@ -9,6 +9,7 @@ These mixins extract common admin patterns for:
 
 from django.contrib import admin
 from django.utils.html import format_html
+from .images import thumbnail_url
 
 
 class HierarchyDisplayMixin:
@@ -18,6 +19,10 @@ class HierarchyDisplayMixin:
     Models using this mixin must have:
     - A 'parent' ForeignKey field (nullable, self-referencing)
     - A 'level' property that returns the nesting depth
+    - A 'path' field that sorts nodes depth-first (see core.models.TreeNode)
+    
+    TreeNode stores the depth on the row, so rendering a changelist costs no
+    extra queries; pair it with list_select_related = ['parent'].
     
     Usage:
         @admin.register(ProductCategory)
@@ -35,14 +40,15 @@ class HierarchyDisplayMixin:
         )
     
     title_with_level.short_description = 'Title'
-    title_with_level.admin_order_field = 'title'
+    title_with_level.admin_order_field = 'path'
 
 
 class ImagePreviewMixin:
     """
     Mixin for displaying image field previews as thumbnails in admin list view.
     
-    Models using this mixin must have an 'image' field.
+    Models using this mixin must have an 'image' field. The preview uses the
+    smallest responsive rendition (see core.images) rather than the original.
     
     Usage:
         @admin.register(ProductCategory)
@@ -57,7 +63,7 @@ class ImagePreviewMixin:
                 return format_html(
                     '<img src="{}" style="max-height: 50px; max-width: 50px; '
                     'object-fit: cover; border-radius: 8px;" />',
-                    obj.image.url
+                    thumbnail_url(obj.image)
                 )
         except Exception:
             pass
@@ -0,0 +1,19 @@
+"""
+Storefront benchmarks.
+
+Times the hot storefront and checkout paths with the Django test client
+against a synthetic catalog, so runs can be compared across commits:
+
+- seed.py: deterministic synthetic catalog (category tree, industries, tags,
+  products with tiers, variants and reviews, carts, orders, blog posts)
+- scenarios.py: the measured requests (one callable per path)
+- runner.py: timing, query counts and tracemalloc allocation sampling
+
+Run them with the benchmark management command, which seeds a throwaway test
+database and writes the results as JSON.
+"""
+from .runner import BenchmarkError, run_scenario
+from .scenarios import SCENARIOS, Bench
+from .seed import Catalog, seed_catalog
+
+__all__ = ['Bench', 'BenchmarkError', 'Catalog', 'SCENARIOS', 'run_scenario', 'seed_catalog']
@@ -0,0 +1,85 @@
+"""
+Benchmark runner.
+
+Latency, query counts and cache traffic come from the request metrics the
+instrumentation middleware attaches to each request (core.instrumentation).
+Allocations are sampled in a separate pass with tracemalloc running, since
+tracing slows every allocation down and would distort the timings.
+"""
+import time
+import tracemalloc
+from statistics import mean
+from django.core.cache import cache
+from ..instrumentation import percentile
+
+
+class BenchmarkError(Exception):
+    """A scenario's request did not answer as expected"""
+
+
+def _stats(values):
+    return {
+        'p50': round(percentile(values, 0.5), 3),
+        'p95': round(percentile(values, 0.95), 3),
+        'mean': round(mean(values), 3),
+        'min': round(min(values), 3),
+        'max': round(max(values), 3),
+    }
+
+
+def run_scenario(prepare, bench, iterations=30, warmup=3, allocation_samples=5, cold=False):
+    """
+    Time one scenario and return its statistics.
+
+    With cold=True the cache is cleared before every measured request, so each
+    one rebuilds whatever it would normally read from the cache.
+    """
+    for _ in range(warmup):
+        prepare(bench)()
+
+    wall_ms, queries, sql_ms, template_ms, cache_hits, cache_misses = [], [], [], [], [], []
+    for _ in range(iterations):
+        request = prepare(bench)
+        if cold:
+            cache.clear()
+        start = time.perf_counter()
+        response = request()
+        wall_ms.append((time.perf_counter() - start) * 1000)
+        metrics = getattr(response.wsgi_request, 'metrics', None)
+        if metrics is None:
+            raise BenchmarkError('Request metrics are missing; is RequestMetricsMiddleware installed?')
+        queries.append(metrics.queries)
+        sql_ms.append(metrics.sql_ms)
+        template_ms.append(metrics.template_ms)
+        cache_hits.append(metrics.cache_hits)
+        cache_misses.append(metrics.cache_misses)
+
+    peak_kb, retained_kb = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(allocation_samples):
+            request = prepare(bench)
+            if cold:
+                cache.clear()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            request()
+            current, peak = tracemalloc.get_traced_memory()
+            peak_kb.append((peak - before) / 1024)
+            retained_kb.append((current - before) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'iterations': iterations,
+        'ms': _stats(wall_ms),
+        'sql_ms': _stats(sql_ms),
+        'template_ms': _stats(template_ms),
+        'queries': _stats(queries),
+        'cache_hits': _stats(cache_hits),
+        'cache_misses': _stats(cache_misses),
+    }
+    if peak_kb:
+        result['alloc_peak_kb'] = _stats(peak_kb)
+        result['alloc_retained_kb'] = _stats(retained_kb)
+    return result
@@ -0,0 +1,132 @@
+"""
+Benchmark scenarios.
+
+Each scenario is called once per iteration with the Bench and returns the
+request to time as a zero-argument callable, so per-iteration preparation
+(picking a product, filling a fresh cart before checkout) stays outside the
+measured window.
+"""
+import random
+from django.test import Client
+from django.urls import Resolver404, resolve, reverse
+from ..models import Product
+from .runner import BenchmarkError
+
+CHECKOUT_FORM = {
+    'first_name': 'Bench',
+    'last_name': 'Shopper',
+    'email': 'shopper@example.com',
+    'phone': '4165550100',
+    'shipping_address_1': '1 Main St',
+    'shipping_city': 'Toronto',
+    'shipping_state': 'ON',
+    'shipping_postal_code': 'M5V 1A1',
+}
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(prepare):
+        SCENARIOS[name] = prepare
+        return prepare
+    return register
+
+
+class Bench:
+    """Clients and seeded data shared by the scenarios of one run"""
+
+    def __init__(self, catalog, seed=0):
+        self.catalog = catalog
+        self.rng = random.Random(seed)
+        self.visitor = Client()
+        self.shopper = self.new_shopper()
+
+    def product_slug(self):
+        return self.rng.choice(self.catalog.purchasable_slugs)
+
+    def new_shopper(self, lines=3):
+        """A guest client whose cart holds a few products"""
+        client = Client()
+        client.cart_slugs = [self.product_slug() for _ in range(lines)]
+        for slug in client.cart_slugs:
+            client.post(reverse('core:add_to_cart', args=[slug]), {'quantity': 100})
+        return client
+
+    def shopper_product_id(self):
+        """A product in the shopper's cart (cart lines are addressed by product id)"""
+        return Product.objects.values_list('pk', flat=True).get(slug=self.rng.choice(self.shopper.cart_slugs))
+
+
+def _expect(response, *statuses):
+    if response.status_code not in statuses:
+        raise BenchmarkError(f'{response.request["PATH_INFO"]} returned {response.status_code}')
+    return response
+
+
+def _expect_redirect(response, view_name):
+    """A redirect to view_name; checkout redirects failures too, back to the cart"""
+    _expect(response, 302)
+    try:
+        target = resolve(response['Location']).view_name
+    except Resolver404:
+        target = None
+    if target != view_name:
+        raise BenchmarkError(f'{response.request["PATH_INFO"]} redirected to {response["Location"]}')
+    return response
+
+
+@scenario('index')
+def index(bench):
+    return lambda: _expect(bench.visitor.get(reverse('core:index')), 200)
+
+
+@scenario('products_page')
+def products_page(bench):
+    return lambda: _expect(bench.visitor.get(reverse('core:products')), 200)
+
+
+@scenario('category_detail')
+def category_detail(bench):
+    url = reverse('core:category_detail', args=[bench.rng.choice(bench.catalog.category_slugs)])
+    return lambda: _expect(bench.visitor.get(url), 200)
+
+
+@scenario('product_detail')
+def product_detail(bench):
+    url = reverse('core:product_detail', args=bench.rng.choice(bench.catalog.product_urls))
+    return lambda: _expect(bench.visitor.get(url), 200)
+
+
+@scenario('cart_view')
+def cart_view(bench):
+    return lambda: _expect(bench.shopper.get(reverse('core:cart')), 200)
+
+
+@scenario('add_to_cart')
+def add_to_cart(bench):
+    url = reverse('core:add_to_cart', args=[bench.product_slug()])
+    return lambda: _expect(bench.shopper.post(url, {'quantity': 100}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'), 200)
+
+
+@scenario('update_cart')
+def update_cart(bench):
+    data = {'product_id': bench.shopper_product_id(), 'quantity': bench.rng.choice([100, 250, 500, 1000])}
+    return lambda: _expect(bench.shopper.post(reverse('core:update_cart'), data), 200)
+
+
+@scenario('checkout')
+def checkout(bench):
+    # Checkout empties the cart, so every order starts from a fresh guest cart
+    client = bench.new_shopper()
+    return lambda: _expect_redirect(client.post(reverse('core:checkout'), CHECKOUT_FORM), 'core:order_confirmation')
+
+
+@scenario('sitemap_view')
+def sitemap_view(bench):
+    return lambda: _expect(bench.visitor.get(reverse('sitemap')), 200)
+
+
+@scenario('blog_list')
+def blog_list(bench):
+    return lambda: _expect(bench.visitor.get(reverse('blog:blog_list')), 200)
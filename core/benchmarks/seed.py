@@ -0,0 +1,148 @@
+"""
+Synthetic catalog for the benchmarks.
+
+Rows are bulk-inserted where the models allow it, which skips the signal
+handlers, so the derived data they would maintain (review aggregates,
+listing rows) is rebuilt once at the end, as the rebuild_* commands do.
+"""
+import random
+from dataclasses import dataclass, field
+from decimal import Decimal
+from blog.models import Category as BlogCategory, Post
+from ..listings import refresh_listings
+from ..models import (
+    Cart, CartItem, Industry, Order, OrderItem, Product, ProductCategory, ProductIndustry, ProductListing,
+    ProductReview, ProductVariant, Tag, TieredPricing,
+)
+
+SIZES = ['8x4x10', '10x5x13', '12x7x17', '16x6x12', '18x10x15']
+COLORS = ['Brown', 'White', 'Black', 'Natural']
+GSMS = ['80 GSM', '100 GSM', '120 GSM', '150 GSM']
+HANDLES = ['Twisted', 'Flat', 'No Handle']
+TAGS = ['Eco-Friendly', 'Bulk Discount', 'Custom Print', 'Food Safe', 'Recyclable', 'Best Seller']
+STOCK = 1_000_000
+
+
+@dataclass
+class Catalog:
+    """What was seeded, for the scenarios to pick from"""
+    category_slugs: list = field(default_factory=list)
+    product_urls: list = field(default_factory=list)  # (category slug, product slug)
+    purchasable_slugs: list = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+
+
+def seed_catalog(products=200, categories=12, industries=6, reviews=4, carts=50, orders=100, posts=20, seed=0):
+    """Create the synthetic catalog and return a Catalog describing it"""
+    rng = random.Random(seed)
+
+    # Category and industry trees: a quarter roots, the rest nested one level below
+    roots = max(1, categories // 4)
+    category_nodes = []
+    for i in range(categories):
+        parent = rng.choice(category_nodes[:roots]) if i >= roots else None
+        category_nodes.append(ProductCategory.objects.create(
+            title=f'Category {i}', slug=f'bench-category-{i}', parent=parent, order=i, is_active=True,
+        ))
+    industry_roots = max(1, industries // 3)
+    industry_nodes = []
+    for i in range(industries):
+        parent = rng.choice(industry_nodes[:industry_roots]) if i >= industry_roots else None
+        industry_nodes.append(Industry.objects.create(
+            title=f'Industry {i}', url=f'/bench-industry-{i}/', parent=parent, order=i, is_active=True,
+        ))
+    tags = [Tag.objects.create(name=name, slug=f'bench-{i}') for i, name in enumerate(TAGS)]
+
+    product_rows = Product.objects.bulk_create([
+        Product(
+            title=f'{rng.choice(COLORS)} Paper Bag {i}',
+            slug=f'bench-product-{i}',
+            description='Synthetic benchmark product. ' * 8,
+            price=Decimal(rng.randint(10, 500)) / 100,
+            size=rng.choice(SIZES),
+            gsm=rng.choice(GSMS),
+            color=rng.choice(COLORS),
+            handle_type=rng.choice(HANDLES),
+            sku=f'BENCH-{i}',
+            stock_quantity=STOCK,
+            feature_1='Recyclable',
+            feature_2='Custom printing available',
+            order=i,
+            is_active=True,
+            is_featured=i < 8,
+        )
+        for i in range(products)
+    ])
+
+    category_links, tag_links, industry_links = [], [], []
+    tiers, variants, review_rows = [], [], []
+    for product in product_rows:
+        for category in rng.sample(category_nodes, min(len(category_nodes), rng.randint(1, 2))):
+            category_links.append(Product.categories.through(product_id=product.pk, productcategory_id=category.pk))
+        for tag in rng.sample(tags, rng.randint(0, 3)):
+            tag_links.append(Product.tags.through(product_id=product.pk, tag_id=tag.pk))
+        for industry in rng.sample(industry_nodes, min(len(industry_nodes), rng.randint(0, 2))):
+            industry_links.append(ProductIndustry(product=product, industry=industry))
+        for step, quantity in enumerate((100, 500, 1000)):
+            tiers.append(TieredPricing(
+                product=product, min_quantity=quantity,
+                price_per_unit=(product.price * (Decimal('0.95') - step * Decimal('0.05'))).quantize(Decimal('0.01')),
+            ))
+        for order, size in enumerate(rng.sample(SIZES, 3)):
+            variants.append(ProductVariant(product=product, variant_type='size', name=size, value=size, order=order))
+        for order, color in enumerate(rng.sample(COLORS, 2)):
+            variants.append(ProductVariant(product=product, variant_type='color', name=color, value=color, order=order))
+        for n in range(rng.randint(0, reviews * 2)):
+            review_rows.append(ProductReview(
+                product=product, name=f'Buyer {n}', email=f'buyer{n}@example.com', rating=rng.randint(3, 5),
+                title='Solid bags', review='Held up well for our shop. ' * 3, is_approved=rng.random() < 0.9,
+            ))
+    Product.categories.through.objects.bulk_create(category_links)
+    Product.tags.through.objects.bulk_create(tag_links)
+    ProductIndustry.objects.bulk_create(industry_links)
+    TieredPricing.objects.bulk_create(tiers)
+    ProductVariant.objects.bulk_create(variants)
+    ProductReview.objects.bulk_create(review_rows)
+    Product.refresh_review_stats()
+    refresh_listings()
+
+    cart_rows = Cart.objects.bulk_create([Cart(session_key=f'bench-cart-{i}') for i in range(carts)])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=rng.choice([100, 250, 500, 1000]))
+        for cart in cart_rows
+        for product in rng.sample(product_rows, min(len(product_rows), rng.randint(1, 5)))
+    ])
+
+    for i in range(orders):
+        lines = rng.sample(product_rows, min(len(product_rows), rng.randint(1, 3)))
+        subtotal = sum((product.price * 100 for product in lines), Decimal('0.00'))
+        order = Order.objects.create(
+            order_number=f'BENCH-{i:06d}', email=f'customer{i}@example.com', first_name='Bench', last_name=f'Customer {i}', phone='4165550100',
+            shipping_address_1='1 Main St', shipping_city='Toronto', shipping_state='ON', shipping_postal_code='M5V 1A1',
+            subtotal=subtotal, total=subtotal, status=rng.choice(['pending', 'processing', 'shipped', 'delivered']),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_title=product.title, product_sku=product.sku,
+                      quantity=100, unit_price=product.price, total_price=product.price * 100)
+            for product in lines
+        ])
+
+    blog_category = BlogCategory.objects.create(name='Bench Guides', slug='bench-guides')
+    Post.objects.bulk_create([
+        Post(
+            title=f'Packaging guide {i}', slug=f'bench-post-{i}', excerpt='How to pick the right bag.',
+            content='<p>Synthetic benchmark post.</p>' * 20, meta_description='Packaging guide',
+            category=blog_category, status='published',
+        )
+        for i in range(posts)
+    ])
+
+    return Catalog(
+        category_slugs=[category.slug for category in category_nodes],
+        product_urls=list(ProductListing.objects.exclude(category_slug='').values_list('category_slug', 'slug')),
+        purchasable_slugs=[product.slug for product in product_rows],
+        counts={
+            'categories': categories, 'industries': industries, 'products': products, 'reviews': len(review_rows),
+            'carts': carts, 'orders': orders, 'posts': posts,
+        },
+    )
@@ -0,0 +1,185 @@
+"""
+Tag-versioned caching for catalog content.
+
+Every cached entry is stored under a key that embeds the current version of
+each tag it depends on (e.g. 'catalog', 'menu', 'product:42'). Bumping a tag
+changes the key, so all entries built from the old data stop being read and
+simply expire; nothing has to know which concrete keys exist.
+
+Entries stored with set_tagged() instead record the tag versions they were
+built under and are checked on read, so the tag list can be decided while the
+value is being built (used by core.page_cache for surrogate keys). Those
+versions must be read before the data they cover: an entry built from rows
+that changed mid-build then carries the old version and is never served.
+
+A bump can also record which ids it covers (bump_tag_with_changes()), so a
+process holding an in-memory structure built for an older version can ask
+changed_since() for just those ids and patch it instead of rebuilding.
+
+Tags are bumped after commit (bump_tags_on_commit()) by the signal handlers
+in core.signals and blog.signals, so edits made from the admin, management
+commands, scripts or a shell all invalidate the same way.
+"""
+import time
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+CATALOG = 'catalog'
+MENU = 'menu'
+CATEGORIES = 'categories'
+INDUSTRIES = 'industries'
+TAGS = 'tags'
+OAUTH = 'oauth'
+SERVICES = 'services'
+FAQ = 'faq'
+BLOG = 'blog'
+LISTINGS = 'listings'
+SKUS = 'skus'
+
+TAG_VERSION_KEY = 'cache_tag:{}'
+TAG_CHANGES_KEY = 'cache_tag_changes:{}:{}'
+# Further behind than this many versions, or this many changed ids, a caller
+# rebuilds instead of replaying changes
+MAX_REPLAYED_VERSIONS = 100
+MAX_REPLAYED_IDS = 200
+DEFAULT_TIMEOUT = getattr(settings, 'CACHE_TIMEOUT_LONG', 3600)
+
+_missing = object()
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def _new_version():
+    # Time-based so a tag whose version key was evicted never reuses an old version
+    return int(time.time() * 1000)
+
+
+def get_tag_versions(tags):
+    """Return {tag: version}, creating a version for tags seen for the first time"""
+    keys = {TAG_VERSION_KEY.format(tag): tag for tag in tags}
+    found = cache.get_many(list(keys))
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, tag in keys.items():
+        if tag not in versions:
+            version = _new_version()
+            cache.add(key, version, None)
+            versions[tag] = cache.get(key, version)
+    return versions
+
+
+def bump_tags(*tags):
+    """Invalidate every entry cached under any of the given tags"""
+    for tag in set(tags):
+        key = TAG_VERSION_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def bump_tags_on_commit(*tags):
+    """
+    Bump cache tags once the change is committed.
+
+    A bump inside the transaction would let a concurrent reader rebuild from
+    the old rows and cache them under the new version.
+    """
+    transaction.on_commit(partial(bump_tags, *tags))
+
+
+def bump_tag_with_changes(tag, ids):
+    """Bump a tag and record the ids its new version changed, for changed_since()"""
+    key = TAG_VERSION_KEY.format(tag)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        # The old version is gone, so nobody can replay from it
+        cache.set(key, _new_version(), None)
+        return
+    cache.set(TAG_CHANGES_KEY.format(tag, version), sorted(set(ids)), DEFAULT_TIMEOUT)
+
+
+def changed_since(tag, since, until):
+    """
+    Ids changed by the bumps of tag after version since, up to and including until.
+
+    None when any bump in between wasn't recorded (a plain bump_tags(), an
+    evicted entry or a reset version) or when more than MAX_REPLAYED_IDS
+    changed, so the caller has to rebuild.
+    """
+    if since is None or not 0 < until - since <= MAX_REPLAYED_VERSIONS:
+        return None
+    keys = [TAG_CHANGES_KEY.format(tag, version) for version in range(since + 1, until + 1)]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        return None
+    changed = set().union(*found.values())
+    return changed if len(changed) <= MAX_REPLAYED_IDS else None
+
+
+def tagged_key(key, tags):
+    """Cache key for an entry that depends on the given tags"""
+    versions = get_tag_versions(tags)
+    return '{}:{}'.format(key, '.'.join(str(versions[tag]) for tag in sorted(set(tags))))
+
+
+def get_or_set(key, builder, tags, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for key under the tags' current versions, building it on a miss"""
+    full_key = tagged_key(key, tags)
+    value = cache.get(full_key, _missing)
+    if value is _missing:
+        value = builder()
+        cache.set(full_key, value, timeout)
+    return value
+
+
+def set_tagged(key, value, tags, timeout=DEFAULT_TIMEOUT, versions=None):
+    """
+    Cache value under a plain key, remembering the versions of the tags it depends on.
+
+    versions are the {tag: version} pairs read with get_tag_versions() before
+    the value was built; tags missing from them are read now.
+    """
+    versions = dict(versions or {})
+    unread = [tag for tag in tags if tag not in versions]
+    if unread:
+        versions.update(get_tag_versions(unread))
+    cache.set(key, ({tag: versions[tag] for tag in set(tags)}, value), timeout)
+
+
+def get_tagged_entry(key):
+    """(versions, value) stored by set_tagged(), or None if missing or any of its tags was bumped since"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions, value = entry
+    if get_tag_versions(versions) != versions:
+        return None
+    return versions, value
+
+
+def get_tagged(key, default=None):
+    """Value stored by set_tagged(), or default if missing or any of its tags was bumped since"""
+    entry = get_tagged_entry(key)
+    return default if entry is None else entry[1]
+
+
+class TagVersions:
+    """Template lookup of current tag versions, for fragment cache keys: {{ cache_versions.faq }}"""
+
+    def __init__(self):
+        self._versions = {}
+
+    def __getitem__(self, tag):
+        if tag not in self._versions:
+            self._versions.update(get_tag_versions([tag]))
+        return self._versions[tag]
@@ -0,0 +1,67 @@
+"""
+Abandoned cart reaper.
+
+Cart rows outlive the visits that created them: checkout empties a cart but
+keeps its row, and nobody comes back for most carts. reap_carts_batch()
+deletes, oldest first,
+- carts not changed for CART_EXPIRY (abandoned, with or without items),
+- empty carts not changed for EMPTY_CART_GRACE (the grace spares a cart that
+  is being filled right now).
+
+Candidates are walked in keyset order over (updated_at, id) in bounded
+batches. Each batch locks, re-checks and deletes its carts in one short
+transaction, and their items go with a single DELETE, so the reaper can run
+continuously next to the storefront. PaymentIntents the deleted carts held
+for checkout are cancelled after the transaction. The reap_carts management
+command drives it from cron or as a worker process.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import Cart, CartItem
+from .payments import cancel_payment_intents
+
+CART_EXPIRY = timedelta(days=getattr(settings, 'CART_EXPIRY_DAYS', 30))
+EMPTY_CART_GRACE = timedelta(hours=getattr(settings, 'EMPTY_CART_GRACE_HOURS', 1))
+
+
+def reap_carts_batch(after=None, batch_size=500, now=None):
+    """
+    Delete the reapable carts among the next batch_size candidates after the
+    (updated_at, id) cursor.
+
+    Returns (cursor, carts deleted, items deleted); the cursor is None once
+    every candidate has been looked at.
+    """
+    now = now or timezone.now()
+    expired_before = now - CART_EXPIRY
+    empty_before = now - EMPTY_CART_GRACE
+
+    candidates = Cart.objects.filter(updated_at__lt=empty_before)
+    if after is not None:
+        updated_at, pk = after
+        candidates = candidates.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk))
+    rows = list(candidates.order_by('updated_at', 'pk').values_list('updated_at', 'pk')[:batch_size])
+    if not rows:
+        return None, 0, 0
+
+    with transaction.atomic():
+        # Re-check under lock: a cart may have been filled or touched since it was listed
+        doomed = list(
+            Cart.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=[pk for updated_at, pk in rows], updated_at__lt=empty_before)
+            .filter(Q(updated_at__lt=expired_before) | ~Exists(CartItem.objects.filter(cart=OuterRef('pk'))))
+            .values_list('pk', 'payment_intent_id')
+        )
+        deleted = {}
+        if doomed:
+            # Items have no dependents, so they go in one DELETE ... WHERE cart_id IN
+            deleted = Cart.objects.filter(pk__in=[pk for pk, intent_id in doomed]).delete()[1]
+
+    # Outside the transaction: Stripe calls must not hold the row locks
+    cancel_payment_intents([intent_id for pk, intent_id in doomed])
+
+    cursor = rows[-1] if len(rows) == batch_size else None
+    return cursor, deleted.get(Cart._meta.label, 0), deleted.get(CartItem._meta.label, 0)
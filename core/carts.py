@@ -0,0 +1,340 @@
+"""
+Cart storage backends.
+
+A visitor's cart lives in one of two places, picked per request by
+get_cart_backend() from settings.CART_BACKEND (signed-in customers) and
+settings.GUEST_CART_BACKEND (everyone else):
+- DatabaseCartBackend: CartItem rows of the Cart keyed by the session,
+- CookieCartBackend: a guest's (product_id, quantity) pairs in a signed
+  cookie, so browsing and filling a cart writes no rows and creates no
+  session.
+
+Views and context processors only talk to the backend interface. Its .cart is
+a Cart (unsaved for guests) whose totals come from the same CartTotals engine,
+and cart lines are addressed by product id in both backends. A guest cart
+becomes database rows only when it has to: promote() at checkout, where the
+order is placed from locked rows, and promote_guest_cart() when the guest
+signs in.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+from .models import Cart, CartItem
+
+GUEST_CART_COOKIE = getattr(settings, 'GUEST_CART_COOKIE_NAME', 'cart')
+GUEST_CART_COOKIE_AGE = getattr(settings, 'GUEST_CART_COOKIE_AGE', settings.SESSION_COOKIE_AGE)
+GUEST_CART_MAX_LINES = getattr(settings, 'GUEST_CART_MAX_LINES', 50)
+COOKIE_SALT = 'core.carts'
+MAX_LINE_QUANTITY = 9999
+
+
+class CartFull(ValueError):
+    """A guest cart already holds as many products as its cookie allows"""
+
+
+def line_quantity_error(product, quantity):
+    """Why a cart line can't hold this quantity of a product, or None"""
+    if quantity > MAX_LINE_QUANTITY:
+        return f'Maximum quantity is {MAX_LINE_QUANTITY}.'
+    if not product.price or product.price <= 0:
+        return 'This product is not available for purchase.'
+    if product.minimum_order and quantity < product.minimum_order:
+        return f'Minimum order quantity is {product.minimum_order} items.'
+    if product.track_inventory and not product.allow_backorder and product.stock_quantity < quantity:
+        return f'Only {product.stock_quantity} items available in stock.'
+    return None
+
+
+class CartBackend:
+    """Storage for one request's cart; lines are addressed by product id"""
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def cart(self):
+        """The visitor's Cart, loaded at most once per request"""
+        raise NotImplementedError
+
+    @property
+    def lines(self):
+        """The cart's {product_id: quantity} pairs"""
+        return {item.product_id: item.quantity for item in self.cart.totals.items}
+
+    def has_cart(self):
+        """Whether the visitor has any cart state, answered without loading items"""
+        raise NotImplementedError
+
+    def get_item(self, product_id):
+        """The cart line for a product, with its product and price ladder loaded, or None"""
+        return self.cart.totals.get_item(product_id)
+
+    def quantity(self, product_id):
+        """Quantity of a product in the cart (0 when it is not there)"""
+        return self.lines.get(int(product_id), 0)
+
+    def set_quantity(self, product_id, quantity):
+        """Store a product's quantity, adding the line if needed"""
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        """Drop a product's line"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Drop every line"""
+        raise NotImplementedError
+
+    def set_quantities(self, quantities):
+        """Apply {product_id: quantity} pairs in one go; a quantity of 0 drops the line"""
+        for product_id, quantity in quantities.items():
+            if quantity > 0:
+                self.set_quantity(product_id, quantity)
+            else:
+                self.remove(product_id)
+
+    def merge(self, lines):
+        """Add {product_id: quantity} pairs to the cart, summing quantities of products in both"""
+        for product_id, quantity in lines.items():
+            self.set_quantity(product_id, self.quantity(product_id) + quantity)
+
+    def promote(self):
+        """Return the cart saved as database rows, which checkout locks and empties"""
+        raise NotImplementedError
+
+    def checked_out(self):
+        """Forget the lines once an order has been placed from promote()'s rows"""
+        # place_order() has already emptied the rows
+        self.cart.invalidate_totals()
+
+    def process_response(self, response):
+        """Write back anything the backend keeps on the response"""
+        return response
+
+
+class DatabaseCartBackend(CartBackend):
+    """Lines stored as CartItem rows of the session's Cart"""
+
+    @cached_property
+    def cart(self):
+        # Unsaved until the first write, so read-only pages never create rows
+        session_key = self.request.session.session_key
+        cart = None
+        if session_key:
+            cart = Cart.objects.filter(session_key=session_key).first()
+        return cart or Cart(session_key=session_key or '')
+
+    @property
+    def lines(self):
+        if self.cart.pk is None:
+            return {}
+        return dict(self.cart.items.values_list('product_id', 'quantity'))
+
+    def has_cart(self):
+        return self.cart.pk is not None
+
+    def quantity(self, product_id):
+        if self.cart.pk is None:
+            return 0
+        return self.cart.items.filter(product_id=product_id).values_list('quantity', flat=True).first() or 0
+
+    def set_quantity(self, product_id, quantity):
+        CartItem.objects.update_or_create(cart=self.promote(), product_id=product_id, defaults={'quantity': quantity})
+        self._changed()
+
+    def remove(self, product_id):
+        if self.cart.pk is not None:
+            self.cart.items.filter(product_id=product_id).delete()
+            self._changed()
+
+    def clear(self):
+        if self.cart.pk is not None:
+            self.cart.items.all().delete()
+            self._changed()
+
+    def set_quantities(self, quantities):
+        keep = [(product_id, quantity) for product_id, quantity in quantities.items() if quantity > 0]
+        drop = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        with transaction.atomic():
+            cart = self.promote()
+            if keep:
+                # One upsert for every kept line, new or existing
+                CartItem.objects.bulk_create(
+                    [CartItem(cart=cart, product_id=product_id, quantity=quantity) for product_id, quantity in keep],
+                    update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity'],
+                )
+            if drop:
+                cart.items.filter(product_id__in=drop).delete()
+            self._changed()
+
+    def _changed(self):
+        # updated_at tracks item changes too: the cart reaper expires carts by it
+        Cart.objects.filter(pk=self.cart.pk).update(updated_at=timezone.now())
+        self.cart.invalidate_totals()
+
+    def merge(self, lines):
+        cart = self.promote()
+        existing = {item.product_id: item for item in cart.items.all()}
+        updated, created = [], []
+        for product_id, quantity in lines.items():
+            item = existing.get(product_id)
+            if item is None:
+                created.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+            else:
+                item.quantity += quantity
+                updated.append(item)
+        CartItem.objects.bulk_update(updated, ['quantity'])
+        CartItem.objects.bulk_create(created)
+        self._changed()
+
+    def promote(self):
+        if self.cart.pk is None:
+            if not self.request.session.session_key:
+                self.request.session.create()
+            self.cart, created = Cart.objects.get_or_create(session_key=self.request.session.session_key)
+        return self.cart
+
+
+def encode_lines(lines):
+    return ','.join(f'{product_id}:{quantity}' for product_id, quantity in lines.items())
+
+
+def decode_lines(value):
+    lines = {}
+    try:
+        for pair in filter(None, value.split(',')):
+            product_id, quantity = pair.split(':')
+            if int(quantity) > 0:
+                lines[int(product_id)] = int(quantity)
+    except ValueError:
+        return {}
+    return lines
+
+
+class CookieCartBackend(CartBackend):
+    """A guest's lines kept in a signed cookie, with no session or rows until promote()"""
+
+    modified = False
+
+    @cached_property
+    def lines(self):
+        return decode_lines(self.request.get_signed_cookie(
+            GUEST_CART_COOKIE, default='', salt=COOKIE_SALT, max_age=GUEST_CART_COOKIE_AGE,
+        ))
+
+    @cached_property
+    def cart(self):
+        cart = Cart()
+        cart.guest_lines = self.lines
+        return cart
+
+    def has_cart(self):
+        return bool(self.lines)
+
+    def set_quantity(self, product_id, quantity):
+        product_id = int(product_id)
+        if product_id not in self.lines and len(self.lines) >= GUEST_CART_MAX_LINES:
+            raise CartFull(f'Your cart can hold up to {GUEST_CART_MAX_LINES} different products.')
+        self.lines[product_id] = quantity
+        self._changed()
+
+    def remove(self, product_id):
+        self.lines.pop(int(product_id), None)
+        self._changed()
+
+    def set_quantities(self, quantities):
+        lines = dict(self.lines)
+        for product_id, quantity in quantities.items():
+            if quantity > 0:
+                lines[int(product_id)] = quantity
+            else:
+                lines.pop(int(product_id), None)
+        if len(lines) > GUEST_CART_MAX_LINES:
+            raise CartFull(f'Your cart can hold up to {GUEST_CART_MAX_LINES} different products.')
+        self.lines.clear()
+        self.lines.update(lines)
+        self._changed()
+
+    def clear(self):
+        self.lines.clear()
+        self._changed()
+
+    def _changed(self):
+        self.modified = True
+        self.cart.invalidate_totals()
+
+    def promote(self):
+        """
+        Copy the lines into the session's Cart rows for checkout.
+
+        The cookie stays the guest's cart: rows left by an earlier, abandoned
+        checkout are replaced, and the view clears the cookie once the order
+        is placed.
+        """
+        rows = DatabaseCartBackend(self.request)
+        cart = rows.promote()
+        cart.items.all().delete()
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=item.product, quantity=item.quantity)
+            for item in self.cart.totals.items
+        ])
+        rows._changed()
+        return cart
+
+    def checked_out(self):
+        self.clear()
+
+    def process_response(self, response):
+        if self.modified:
+            if self.lines:
+                response.set_signed_cookie(
+                    GUEST_CART_COOKIE, encode_lines(self.lines), salt=COOKIE_SALT, max_age=GUEST_CART_COOKIE_AGE,
+                    secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite=settings.SESSION_COOKIE_SAMESITE,
+                )
+            else:
+                response.delete_cookie(GUEST_CART_COOKIE, samesite=settings.SESSION_COOKIE_SAMESITE)
+        return response
+
+
+def _backend_classes():
+    return (
+        import_string(getattr(settings, 'CART_BACKEND', 'core.carts.DatabaseCartBackend')),
+        import_string(getattr(settings, 'GUEST_CART_BACKEND', 'core.carts.CookieCartBackend')),
+    )
+
+
+def _request_backends(request):
+    # Every backend used during the request, so the middleware can write each one back
+    return request.__dict__.setdefault('_cart_backends', [])
+
+
+def get_cart_backend(request):
+    """The request's cart backend, created once per request"""
+    backends = _request_backends(request)
+    if not backends:
+        signed_in_class, guest_class = _backend_classes()
+        user = getattr(request, 'user', None)
+        backend_class = signed_in_class if user is not None and user.is_authenticated else guest_class
+        backends.append(backend_class(request))
+    return backends[-1]
+
+
+def promote_guest_cart(request):
+    """
+    Fold a guest's cart into their signed-in cart.
+
+    Runs on user_logged_in, after login() has cycled the session key, so the
+    lines land in the cart of the new session.
+    """
+    backends = _request_backends(request)
+    signed_in_class, guest_class = _backend_classes()
+    if guest_class is signed_in_class:
+        return
+    guest = backends[-1] if backends and isinstance(backends[-1], guest_class) else guest_class(request)
+    signed_in = signed_in_class(request)
+    if guest.has_cart():
+        signed_in.merge(guest.lines)
+        guest.clear()
+    backends[:] = [guest, signed_in]
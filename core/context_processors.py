@@ -1,23 +1,19 @@
-from django.core.cache import cache
+from decimal import Decimal
 from django.conf import settings
-from .models import MenuItem, Product, ProductCategory, Cart
+from django.utils.functional import SimpleLazyObject, lazy
+from . import caching
+from .middleware import get_request_cart
+from .models import MenuItem, Product, ProductCategory
 from allauth.socialaccount.models import SocialApp
 
 
 def google_oauth_enabled(request):
-    """Check if Google OAuth is configured and available (with caching)"""
-    # Check cache first (1 hour TTL)
-    enabled = cache.get('google_oauth_enabled')
-    
-    if enabled is None:
-        try:
-            google_app = SocialApp.objects.get(provider='google')
-            enabled = True
-        except SocialApp.DoesNotExist:
-            enabled = False
-        
-        # Cache the result for 1 hour
-        cache.set('google_oauth_enabled', enabled, 3600)
+    """Check if Google OAuth is configured and available (cached until SocialApps change)"""
+    enabled = caching.get_or_set(
+        'google_oauth_enabled',
+        lambda: SocialApp.objects.filter(provider='google').exists(),
+        tags=[caching.OAUTH],
+    )
     
     return {
         'google_oauth_enabled': enabled,
@@ -25,28 +21,24 @@ def google_oauth_enabled(request):
 
 
 def menu_items(request):
-    """Make menu items available to all templates (with caching)"""
-    # Check cache first (1 hour TTL)
-    top_level_items = cache.get('top_level_menu_items')
-    
-    if top_level_items is None:
-        top_level_items = MenuItem.objects.filter(is_active=True, parent=None)
-        # Cache the result for 1 hour
-        cache.set('top_level_menu_items', list(top_level_items), 3600)
+    """Make menu items available to all templates (cached until the menu changes)"""
+    top_level_items = caching.get_or_set(
+        'top_level_menu_items',
+        lambda: list(MenuItem.objects.filter(is_active=True, parent=None).prefetch_related('children')),
+        tags=[caching.MENU],
+    )
     
     return {
         'menu_items': top_level_items
     }
 
 def product_categories_context(request):
-    """Make active product categories available to all templates (with caching)"""
-    # Check cache first (1 hour TTL)
-    product_categories = cache.get('active_product_categories')
-    
-    if product_categories is None:
-        product_categories = ProductCategory.objects.filter(is_active=True)
-        # Cache the result for 1 hour
-        cache.set('active_product_categories', list(product_categories), 3600)
+    """Make active product categories available to all templates (cached until categories change)"""
+    product_categories = caching.get_or_set(
+        'active_product_categories',
+        lambda: list(ProductCategory.objects.filter(is_active=True)),
+        tags=[caching.CATEGORIES],
+    )
     
     # Keep 'products' for backward compatibility, but prefer 'product_categories'
     return {
@@ -57,22 +49,28 @@ def product_categories_context(request):
 
 
 def cart_context(request):
-    """Make cart information available to all templates"""
-    cart_total_items = 0
-    cart_items = []
-    cart_subtotal = 0
-    
-    if request.session.session_key:
-        try:
-            cart = Cart.objects.get(session_key=request.session.session_key)
-            cart_total_items = cart.total_items
-            cart_items = cart.items.select_related('product')[:3]  # Limit to 3 items for dropdown
-            cart_subtotal = cart.subtotal
-        except Cart.DoesNotExist:
-            pass
+    """
+    Make cart information available to all templates.
+    Values are lazy: the cart and its totals load only if a template reads them,
+    and reuse the request's cart (see core.middleware) shared with the views.
+    """
+    def totals():
+        return get_request_cart(request).totals
     
     return {
-        'cart_total_items': cart_total_items,
-        'cart_items_preview': cart_items,
-        'cart_subtotal': cart_subtotal
+        'cart_total_items': lazy(lambda: totals().total_items, int)(),
+        'cart_items_preview': SimpleLazyObject(lambda: totals().items[:3]),  # Limit to 3 items for dropdown
+        'cart_subtotal': lazy(lambda: totals().subtotal, Decimal)(),
     }
+
+
+def page_cache(request):
+    """
+    Tag versions for {% cache %} fragment keys, plus a CSRF placeholder while a
+    page is being rendered for the anonymous page cache (see core.page_cache).
+    """
+    context = {'cache_versions': caching.TagVersions()}
+    if getattr(request, '_page_cache_pending', False):
+        from .page_cache import CSRF_PLACEHOLDER
+        context['csrf_token'] = CSRF_PLACEHOLDER
+    return context
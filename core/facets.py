@@ -0,0 +1,289 @@
+"""
+Faceted product filtering.
+
+Each ProductListing row stores its facet values (category and its ancestors,
+tags, industries and their ancestors, use cases, GSM, handle type, color and
+price band) in the facets column, written by core.listings whenever the
+listing is refreshed.
+
+FacetIndex loads those rows once, in listing order, and keeps one bitset per
+facet value: bit i is set when the i-th listing has that value. Filtering is
+then integer arithmetic in memory - OR within a facet, AND across facets -
+and the count shown next to each option is the popcount of its bitset ANDed
+with the other facets' selections. Listings are kept in (order, title,
+product_id) order as Python compares them, which is what page cursors and
+patches bisect on. Pages are read by position, so a filtered
+page is a primary-key lookup of at most one page of listings instead of a
+multi-join DISTINCT query.
+
+The index is per process and follows the listings cache tag. When
+refresh_listings() bumps it for some products (an order's stock decrement,
+a product save) the index reloads just those listing rows and patches their
+positions into a copy of its bitsets; it only reloads every listing after a
+full refresh, or when the change log is incomplete or lists too many
+products for patching to be cheaper (caching.changed_since()).
+"""
+import copy
+import re
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from django.utils.text import slugify
+from . import caching, listings
+from .models import ProductListing
+from .search import normalize
+
+# (query parameter, heading), in display order
+FACETS = [
+    ('category', 'Category'),
+    ('tag', 'Tag'),
+    ('industry', 'Industry'),
+    ('use_case', 'Use Case'),
+    ('gsm', 'Paper Weight'),
+    ('handle', 'Handle'),
+    ('color', 'Color'),
+    ('price', 'Price'),
+]
+FACET_NAMES = [name for name, heading in FACETS]
+
+# (value, label, upper bound) on the lowest unit price; the last band is open-ended
+PRICE_BANDS = [
+    ('under-0.25', 'Under $0.25', Decimal('0.25')),
+    ('0.25-0.50', '$0.25 - $0.50', Decimal('0.50')),
+    ('0.50-1.00', '$0.50 - $1.00', Decimal('1.00')),
+    ('1.00-5.00', '$1.00 - $5.00', Decimal('5.00')),
+    ('5.00-plus', '$5.00+', None),
+]
+PRICE_ORDER = {value: i for i, (value, label, upper) in enumerate(PRICE_BANDS)}
+
+_INDEX_FIELDS = ('product_id', 'order', 'title', 'facets')
+
+_SPEC_SEPARATOR = re.compile(r'[,/;]')
+
+
+def spec_values(text):
+    """[(value, label)] for a free-text spec field such as 'Brown, White' or '120 GSM'"""
+    values = []
+    for part in _SPEC_SEPARATOR.split(text or ''):
+        label = part.strip()
+        value = slugify(normalize(label))
+        if value and value not in [existing for existing, _ in values]:
+            values.append((value, label))
+    return values
+
+
+def price_band(price):
+    if price is None:
+        return None
+    for value, label, upper in PRICE_BANDS:
+        if upper is None or price < upper:
+            return value, label
+
+
+def _ancestry(node, active_nodes):
+    """The node and its active ancestors, root first"""
+    ids = [int(pk) for pk in node.path.split(node.PATH_SEPARATOR) if pk]
+    return [active_nodes[pk] for pk in ids if pk in active_nodes]
+
+
+def listing_facets(product, categories, tags, industries, use_cases, active_categories, active_industries, min_price):
+    """{facet: [[value, label], ...]} stored on a product's listing row"""
+    facets = {name: {} for name in FACET_NAMES}
+    for category in categories:
+        for node in _ancestry(category, active_categories):
+            facets['category'][node.slug] = node.title
+    for tag in tags:
+        facets['tag'][tag.slug] = tag.name
+    for industry in industries:
+        for node in _ancestry(industry, active_industries):
+            facets['industry'][str(node.pk)] = node.title
+    for use_case in use_cases:
+        facets['use_case'][str(use_case.pk)] = use_case.title
+    for name, text in (('gsm', product.gsm), ('handle', product.handle_type), ('color', product.color)):
+        facets[name].update(spec_values(text))
+    band = price_band(min_price)
+    if band:
+        facets['price'][band[0]] = band[1]
+    return {name: [[value, label] for value, label in values.items()] for name, values in facets.items() if values}
+
+
+def _bitset(positions, size):
+    raw = bytearray((size + 7) // 8)
+    for position in positions:
+        raw[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(raw, 'little')
+
+
+def _positions(mask, start=0):
+    """Set bit positions of mask at or after start, lowest first"""
+    mask >>= start
+    while mask:
+        low = mask & -mask
+        yield start + low.bit_length() - 1
+        mask ^= low
+
+
+def _remove_bit(mask, position):
+    """mask without the bit at position, higher bits shifted down"""
+    return (mask & ((1 << position) - 1)) | ((mask >> (position + 1)) << position)
+
+
+def _insert_bit(mask, position):
+    """mask with a clear bit inserted at position, higher bits shifted up"""
+    return (mask & ((1 << position) - 1)) | ((mask >> position) << (position + 1))
+
+
+class FacetIndex:
+    """Bitsets of listing positions for every facet value"""
+
+    def __init__(self, rows):
+        self.product_ids, self.keys = [], []
+        positions, self.labels = {}, {}
+        # Sorted here rather than by the database, whose collation may order titles
+        # differently from the tuple comparisons bisect makes on self.keys
+        rows = sorted(rows, key=lambda row: (row[1], row[2], row[0]))
+        for position, (product_id, order, title, facets) in enumerate(rows):
+            self.product_ids.append(product_id)
+            self.keys.append((order, title, product_id))
+            for name, values in (facets or {}).items():
+                for value, label in values:
+                    positions.setdefault(name, {}).setdefault(value, []).append(position)
+                    self.labels.setdefault(name, {}).setdefault(value, label)
+        size = len(self.product_ids)
+        self.all = (1 << size) - 1
+        self.bits = {
+            name: {value: _bitset(value_positions, size) for value, value_positions in values.items()}
+            for name, values in positions.items()
+        }
+
+    def patched(self, product_ids, rows):
+        """
+        A copy with the listings of product_ids replaced by rows.
+
+        Products missing from rows (no longer listed) are dropped. Every
+        bitset is shifted around each removed or inserted position, which is
+        a few big-integer operations per facet value instead of a reload of
+        every listing; the index in use is left untouched for other threads.
+        """
+        index = copy.copy(self)
+        index.product_ids, index.keys = list(self.product_ids), list(self.keys)
+        index.labels = {name: dict(values) for name, values in self.labels.items()}
+        index.bits = {name: dict(values) for name, values in self.bits.items()}
+        positions = {product_id: position for position, product_id in enumerate(self.product_ids)}
+        for position in sorted((positions[pid] for pid in product_ids if pid in positions), reverse=True):
+            del index.product_ids[position], index.keys[position]
+            for values in index.bits.values():
+                for value, bits in values.items():
+                    values[value] = _remove_bit(bits, position)
+        for product_id, order, title, facets in rows:
+            key = (order, title, product_id)
+            position = bisect_left(index.keys, key)
+            index.product_ids.insert(position, product_id)
+            index.keys.insert(position, key)
+            for values in index.bits.values():
+                for value, bits in values.items():
+                    values[value] = _insert_bit(bits, position)
+            for name, values in (facets or {}).items():
+                for value, label in values:
+                    name_bits = index.bits.setdefault(name, {})
+                    name_bits[value] = name_bits.get(value, 0) | (1 << position)
+                    index.labels.setdefault(name, {})[value] = label
+        for name, values in list(index.bits.items()):
+            for value in [value for value, bits in values.items() if not bits]:
+                del values[value], index.labels[name][value]
+            if not values:
+                del index.bits[name], index.labels[name]
+        index.all = (1 << len(index.product_ids)) - 1
+        return index
+
+    def value_bits(self, name, value):
+        return self.bits.get(name, {}).get(value, 0)
+
+    def facet_mask(self, name, values):
+        """Listings with any of the values (values of one facet are alternatives)"""
+        mask = 0
+        for value in values:
+            mask |= self.value_bits(name, value)
+        return mask
+
+    def match(self, selected, scope=None, exclude=None):
+        """Mask of listings matching every selected facet except `exclude`, within scope"""
+        mask = self.all if scope is None else scope
+        for name, values in selected.items():
+            if name != exclude:
+                mask &= self.facet_mask(name, values)
+        return mask
+
+    def counts(self, selected, scope=None):
+        """
+        [(name, heading, [(value, label, count, is_selected)])] for the filter UI.
+
+        Each option is counted against the other facets' selections, so choosing
+        a second value in the same facet shows how many listings it would add.
+        """
+        groups = []
+        for name, heading in FACETS:
+            base = self.match(selected, scope, exclude=name)
+            options = []
+            for value, bits in self.bits.get(name, {}).items():
+                count = (base & bits).bit_count()
+                is_selected = value in selected.get(name, ())
+                if count or is_selected:
+                    options.append((value, self.labels[name][value], count, is_selected))
+            if options:
+                if name == 'price':
+                    options.sort(key=lambda option: PRICE_ORDER.get(option[0], len(PRICE_ORDER)))
+                else:
+                    options.sort(key=lambda option: option[1].lower())
+                groups.append((name, heading, options))
+        return groups
+
+    def page(self, mask, cursor=None, per_page=None):
+        """
+        One page of matching listings after the cursor, in listing order.
+
+        Same contract and cursors as core.listings.listing_page().
+        """
+        per_page = per_page or listings.LISTING_PAGE_SIZE
+        after = listings.decode_cursor(cursor)
+        start = bisect_right(self.keys, after) if after is not None else 0
+        positions = []
+        for position in _positions(mask, start):
+            positions.append(position)
+            if len(positions) > per_page:
+                break
+        ids = [self.product_ids[position] for position in positions[:per_page]]
+        found = ProductListing.objects.in_bulk(ids)
+        rows = [found[product_id] for product_id in ids if product_id in found]
+        next_cursor = None
+        if len(positions) > per_page and rows:
+            next_cursor = listings.encode_cursor(rows[-1])
+        return rows, next_cursor
+
+
+_index = (None, None)
+
+
+def get_facet_index():
+    """The process-local FacetIndex, patched or rebuilt when the listings have changed since it was built"""
+    global _index
+    version = caching.get_tag_versions([caching.LISTINGS])[caching.LISTINGS]
+    built_for, index = _index
+    if index is None or built_for != version:
+        rows = ProductListing.objects.values_list(*_INDEX_FIELDS)
+        changed = caching.changed_since(caching.LISTINGS, built_for, version) if index is not None else None
+        if changed is not None:
+            index = index.patched(changed, rows.filter(product_id__in=changed))
+        else:
+            index = FacetIndex(rows)
+        _index = (version, index)
+    return index
+
+
+def selected_facets(params):
+    """{facet: [values]} from query parameters such as ?tag=eco&tag=bulk&gsm=120gsm"""
+    selected = {}
+    for name in FACET_NAMES:
+        values = [value for value in params.getlist(name) if value]
+        if values:
+            selected[name] = values
+    return selected
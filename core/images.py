@@ -0,0 +1,205 @@
+"""
+Responsive image derivatives.
+
+Uploaded images (product, category, industry, variant, gallery and blog
+images) are served through fixed-width renditions instead of the original
+file. For every source image render_derivatives() writes AVIF, WebP and a
+JPEG (or PNG, for images with transparency) fallback at each width in
+IMAGE_DERIVATIVE_WIDTHS that is not wider than the original, to
+
+    derivatives/<first 2 hash characters>/<content hash>/<width>w.<ext>
+
+next to the originals in the default storage. Keying by content hash means
+re-uploading the same picture reuses its renditions, and replacing a picture
+never serves stale ones.
+
+The renditions of each source are recorded in an ImageAsset row (and cached),
+which the {% responsive_image %} template tag turns into a <picture> with
+srcset attributes. Until an image has renditions the tag falls back to the
+original URL.
+
+Renditions are generated after the transaction that saves a new or replaced
+image commits (see the signal handlers; saves that keep the image do
+nothing), and only the cache tags of pages showing that image are bumped.
+With IMAGE_DERIVATIVES_ON_UPLOAD off, requests never render: the
+rebuild_image_derivatives command, run with --loop as a worker, picks up
+images without renditions instead and can rebuild everything with --force.
+"""
+import hashlib
+import logging
+from io import BytesIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from . import caching
+from .models import ImageAsset
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 960, 1280, 1920)))
+DERIVATIVE_ROOT = 'derivatives'
+ASSET_KEY = 'image:asset:{}'
+
+# (format, Pillow format, extension, save options), best first
+MODERN_FORMATS = [
+    ('avif', 'AVIF', 'avif', {'quality': 60}),
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+]
+JPEG = ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True})
+PNG = ('png', 'PNG', 'png', {'optimize': True})
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+
+def source_name(image):
+    """Storage name of an ImageField value (or the name itself)"""
+    return getattr(image, 'name', image) or ''
+
+
+def derivative_widths(original_width):
+    """Rendition widths for an image; never upscaled, so small originals get one at their own width"""
+    widths = [width for width in WIDTHS if width < original_width]
+    if 0 < original_width <= max(WIDTHS):
+        widths.append(original_width)
+    return widths
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _encode(image, pillow_format, options):
+    output = BytesIO()
+    image.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def render_derivatives(source):
+    """
+    Write every rendition of the source image and return its manifest.
+
+    Touches only storage (no database), so it can run in worker processes;
+    save_asset() records the result.
+    """
+    with default_storage.open(source, 'rb') as f:
+        raw = f.read()
+    content_hash = hashlib.sha256(raw).hexdigest()
+
+    with Image.open(BytesIO(raw)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    alpha = _has_alpha(image)
+    image = image.convert('RGBA' if alpha else 'RGB')
+    fallback = PNG if alpha else JPEG
+
+    renditions = {}
+    for width in derivative_widths(image.width):
+        height = max(round(image.height * width / image.width), 1)
+        resized = None
+        for format_name, pillow_format, extension, options in MODERN_FORMATS + [fallback]:
+            name = f'{DERIVATIVE_ROOT}/{content_hash[:2]}/{content_hash}/{width}w.{extension}'
+            if not default_storage.exists(name):
+                if resized is None:
+                    resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                try:
+                    default_storage.save(name, ContentFile(_encode(resized, pillow_format, options)))
+                except (OSError, KeyError, ValueError) as e:
+                    # Pillow built without this encoder; the other formats still apply
+                    logger.warning(f'Could not write {format_name} rendition of {source}: {e}')
+                    continue
+            renditions.setdefault(format_name, []).append([width, name])
+
+    return {
+        'source': source,
+        'content_hash': content_hash,
+        'width': image.width,
+        'height': image.height,
+        'renditions': renditions,
+    }
+
+
+def _cache_key(source):
+    return ASSET_KEY.format(hashlib.md5(source.encode()).hexdigest())
+
+
+def save_asset(manifest):
+    """Record a manifest from render_derivatives() and return the ImageAsset"""
+    asset, _ = ImageAsset.objects.update_or_create(
+        source=manifest['source'],
+        defaults={key: manifest[key] for key in ('content_hash', 'width', 'height', 'renditions')},
+    )
+    cache.set(_cache_key(asset.source), asset.renditions, caching.DEFAULT_TIMEOUT)
+    return asset
+
+
+def generate_derivatives(source):
+    """Render and record the renditions of one source image; returns None if it cannot be read"""
+    try:
+        return save_asset(render_derivatives(source))
+    except Exception as e:
+        logger.error(f'Image derivatives failed for {source}: {e}')
+        return None
+
+
+def remember_stored_image(sender, instance, field, update_fields=None):
+    """From pre_save: note the image name stored before this save, for image_changed()"""
+    stored = None
+    if instance.pk and (not update_fields or field in update_fields):
+        stored = sender._default_manager.filter(pk=instance.pk).values_list(field, flat=True).first()
+    instance.__dict__.setdefault('_stored_images', {})[field] = stored or ''
+
+
+def image_changed(instance, field, update_fields=None):
+    """From post_save: whether the save wrote a different image than the one stored before it"""
+    if update_fields and field not in update_fields:
+        return False
+    stored = instance.__dict__.get('_stored_images', {}).get(field, '')
+    return source_name(getattr(instance, field)) != stored
+
+
+def generate_derivatives_on_commit(image, tags=()):
+    """Schedule generate_derivatives() for a newly saved image, then invalidate the given cache tags"""
+    source = source_name(image)
+    if not source or not getattr(settings, 'IMAGE_DERIVATIVES_ON_UPLOAD', True) or get_renditions(source):
+        return
+
+    def generate():
+        if generate_derivatives(source) and tags:
+            caching.bump_tags(*tags)
+
+    transaction.on_commit(generate)
+
+
+def get_renditions(image):
+    """{format: [[width, name], ...]} for an image, or {} if it has no derivatives yet"""
+    source = source_name(image)
+    if not source:
+        return {}
+    key = _cache_key(source)
+    renditions = cache.get(key)
+    if renditions is None:
+        renditions = ImageAsset.objects.filter(source=source).values_list('renditions', flat=True).first() or {}
+        cache.set(key, renditions, caching.DEFAULT_TIMEOUT)
+    return renditions
+
+
+def srcset(renditions, format_name):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in renditions.get(format_name, []))
+
+
+def fallback_format(renditions):
+    return 'png' if 'png' in renditions else 'jpeg'
+
+
+def thumbnail_url(image, width=320):
+    """URL of the smallest fallback rendition at least `width` wide (the original if there is none)"""
+    renditions = get_renditions(image)
+    candidates = renditions.get(fallback_format(renditions), [])
+    if candidates:
+        name = next((name for w, name in candidates if w >= width), candidates[-1][1])
+        return default_storage.url(name)
+    source = source_name(image)
+    return default_storage.url(source) if source else ''
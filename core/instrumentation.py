@@ -0,0 +1,301 @@
+"""
+Per-request instrumentation.
+
+RequestMetricsMiddleware measures every request while it runs:
+
+- SQL queries and the time spent in them, through connection.execute_wrapper()
+- cache hits and misses, by wrapping get()/get_many() of the request thread's
+  default cache connection for the duration of the request
+- template rendering time (outermost renders only, so includes and extends
+  are not counted twice)
+- total time
+
+The numbers are sent back as a Server-Timing header (visible in the browser's
+network panel) and added to a rolling, per-process window of samples for the
+resolved URL name, which staff can read at the request metrics endpoint.
+
+Views declare how many queries they may run with @query_budget(n). Going over
+budget is logged; with QUERY_BUDGET_STRICT (on in DEBUG and in the test
+suite's budget checks) it raises QueryBudgetExceeded instead, so an N+1
+regression fails loudly.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template as BackendTemplate
+
+logger = logging.getLogger(__name__)
+
+WINDOW = getattr(settings, 'REQUEST_METRICS_WINDOW', 500)
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current = ContextVar('request_metrics', default=None)
+_missing = object()
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more SQL queries than its @query_budget allows"""
+
+
+class RequestMetrics:
+    """Counters for one request"""
+
+    __slots__ = ('started', 'total_ms', 'queries', 'sql_ms', 'cache_hits', 'cache_misses', 'template_ms', '_render_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_ms = 0.0
+        self._render_depth = 0
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {
+            'total_ms': self.total_ms,
+            'queries': self.queries,
+            'sql_ms': self.sql_ms,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'template_ms': self.template_ms,
+        }
+
+    def server_timing(self):
+        """Server-Timing header value"""
+        return ', '.join([
+            f'db;desc="{self.queries} queries";dur={self.sql_ms:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'tpl;desc="templates";dur={self.template_ms:.1f}',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+
+def current_metrics():
+    """RequestMetrics of the request being handled, or None outside a measured request"""
+    return _current.get()
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_ms += (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def _count_cache_lookups(metrics):
+    """Shadow get()/get_many() of this thread's default cache connection while the request runs"""
+    backend = caches['default']
+    get, get_many = backend.get, backend.get_many
+
+    def counted_get(key, default=None, version=None, **kwargs):
+        value = get(key, _missing, version, **kwargs)
+        if value is _missing:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def counted_get_many(keys, version=None, **kwargs):
+        keys = list(keys)
+        found = get_many(keys, version, **kwargs)
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+    backend.get, backend.get_many = counted_get, counted_get_many
+    try:
+        yield
+    finally:
+        del backend.get, backend.get_many
+
+
+def _timed_render(render):
+    @wraps(render)
+    def timed(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        metrics._render_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics._render_depth -= 1
+            if not metrics._render_depth:
+                metrics.template_ms += (time.perf_counter() - start) * 1000
+    timed.instrumented = True
+    return timed
+
+
+def install_template_timing():
+    """Time the Django template backend's render(), which every view render goes through"""
+    if not getattr(BackendTemplate.render, 'instrumented', False):
+        BackendTemplate.render = _timed_render(BackendTemplate.render)
+
+
+# ----------------------------------------------------------------------------
+# Rolling per-view window
+# ----------------------------------------------------------------------------
+
+_samples = {}
+_lock = threading.Lock()
+
+
+def record_sample(view_name, metrics):
+    with _lock:
+        samples = _samples.get(view_name)
+        if samples is None:
+            samples = _samples[view_name] = deque(maxlen=WINDOW)
+        samples.append(metrics.as_dict())
+
+
+def reset_samples():
+    with _lock:
+        _samples.clear()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty sequence, fraction in [0, 1]"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(values):
+    """{'p50', 'p95', 'max'} of a non-empty sequence"""
+    return {
+        'p50': round(percentile(values, 0.5), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'max': round(max(values), 2),
+    }
+
+
+def histogram(durations):
+    """{bucket label: count} of durations in ms"""
+    counts = {f'<={bound}ms': 0 for bound in BUCKETS}
+    counts[f'>{BUCKETS[-1]}ms'] = 0
+    for duration in durations:
+        label = next((f'<={bound}ms' for bound in BUCKETS if duration <= bound), f'>{BUCKETS[-1]}ms')
+        counts[label] += 1
+    return counts
+
+
+def snapshot():
+    """{view name: summary} over the current window, busiest view first"""
+    with _lock:
+        samples = {name: list(view_samples) for name, view_samples in _samples.items()}
+    views = {}
+    for name, view_samples in sorted(samples.items(), key=lambda item: -len(item[1])):
+        views[name] = {'requests': len(view_samples)}
+        for field in ('total_ms', 'queries', 'sql_ms', 'cache_hits', 'cache_misses', 'template_ms'):
+            views[name][field] = summarize([sample[field] for sample in view_samples])
+        views[name]['histogram'] = histogram([sample['total_ms'] for sample in view_samples])
+    return views
+
+
+# ----------------------------------------------------------------------------
+# Query budgets
+# ----------------------------------------------------------------------------
+
+def query_budget(queries):
+    """Declare the most SQL queries a view may run per request"""
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def check_query_budget(view_name, view, metrics):
+    budget = getattr(view, 'query_budget', None)
+    if budget is None or metrics.queries <= budget:
+        return
+    message = f'{view_name} ran {metrics.queries} queries, over its budget of {budget}'
+    if getattr(settings, 'QUERY_BUDGET_STRICT', settings.DEBUG):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def _measuring(metrics):
+    """Context of the query and cache counters, entered on the thread that runs the request's sync code"""
+    stack = ExitStack()
+    stack.enter_context(connections['default'].execute_wrapper(_record_query))
+    stack.enter_context(_count_cache_lookups(metrics))
+    return stack
+
+
+class RequestMetricsMiddleware:
+    """Measure each request; add a Server-Timing header and record it under its URL name"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_template_timing()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with _measuring(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_response(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            # Database connections are per thread: the request's sync_to_async()
+            # calls share one thread, so the query wrapper is installed there
+            measuring = await sync_to_async(_measuring)(metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(measuring.close)()
+        finally:
+            _current.reset(token)
+        return self.process_response(request, response, metrics)
+
+    def process_response(self, request, response, metrics):
+        metrics.finish()
+        request.metrics = metrics
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            view_name = match.view_name or match._func_path
+            record_sample(view_name, metrics)
+            check_query_budget(view_name, match.func, metrics)
+        response['Server-Timing'] = metrics.server_timing()
+        return response
@@ -0,0 +1,196 @@
+"""
+Product listing read model.
+
+ProductListing holds one row per active product with exactly what a listing
+card shows (title, URL slugs, thumbnail, price range, rating, stock, tags), so
+products_page and category_detail render from a single indexed query instead
+of loading full products and their price ladders.
+
+refresh_listings() rebuilds the rows for given products in a fixed number of
+queries; the signal handlers in core.signals call it after commit whenever a
+product, tier, review, category or tag changes, and the rebuild_listings
+command rebuilds everything.
+
+The rows also carry the normalized search text that core.search queries
+(and, on PostgreSQL, the search_vector derived from it) and the facet values
+that core.facets filters on.
+
+listing_page() paginates by keyset on (order, title, product_id): the cursor
+carries the last row's sort values, so a page costs the same however deep the
+visitor has scrolled.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Max, Min, Prefetch, Q
+from . import caching
+from .facets import listing_facets
+from .models import Industry, Product, ProductCategory, ProductIndustry, ProductListing, ProductUseCase, Tag
+from .search import search_document, search_vector, uses_postgres_search
+
+LISTING_PAGE_SIZE = 24
+
+LISTING_FIELDS = [
+    'title', 'slug', 'category_slug', 'category_title', 'thumbnail_url', 'image_name', 'price',
+    'compare_at_price', 'min_price', 'max_price', 'has_tier_pricing', 'rating_avg', 'rating_count',
+    'in_stock', 'is_featured', 'minimum_order', 'tags', 'order', 'search_primary', 'search_secondary',
+    'facets',
+]
+
+
+def _listing_for(product, active_categories, active_industries):
+    categories = [category for category in product.categories.all() if category.is_active]
+    primary = product.primary_category
+    prices = [price for price in (product.price, product.tier_min, product.tier_max) if price is not None]
+    min_price = min(prices) if prices else None
+    tags = list(product.tags.all())
+    industries = [link.industry for link in product.product_industries.all() if link.industry.is_active]
+    use_cases = [link.use_case for link in product.product_use_cases.all()]
+    search_primary, search_secondary = search_document(product, categories, tags)
+    return ProductListing(
+        product=product,
+        title=product.title,
+        slug=product.slug,
+        category_slug=primary.slug if primary else '',
+        category_title=primary.title if primary else '',
+        thumbnail_url=product.image.url if product.image else '',
+        image_name=product.image.name if product.image else '',
+        price=product.price,
+        compare_at_price=product.compare_at_price,
+        min_price=min_price,
+        max_price=max(prices) if prices else None,
+        has_tier_pricing=product.tier_count > 0,
+        rating_avg=product.rating_avg or Decimal('0.0'),
+        rating_count=product.rating_count,
+        in_stock=product.is_in_stock,
+        is_featured=product.is_featured,
+        minimum_order=product.minimum_order,
+        tags=[{'name': tag.name, 'slug': tag.slug} for tag in tags],
+        order=product.order,
+        search_primary=search_primary,
+        search_secondary=search_secondary,
+        facets=listing_facets(
+            product, categories, tags, industries, use_cases, active_categories, active_industries, min_price,
+        ),
+    )
+
+
+def _active_lineage(queryset, nodes):
+    """{pk: node} of the active ones among the nodes and their ancestors, read from the nodes' paths"""
+    ids = {pk for node in nodes for pk in node.ancestor_ids + [node.pk]}
+    return queryset.filter(is_active=True).in_bulk(ids) if ids else {}
+
+
+def refresh_listings(product_ids=None):
+    """Rebuild listing rows for the given products (all when None); inactive products lose theirs"""
+    products = Product.objects.filter(is_active=True)
+    stale = ProductListing.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(pk__in=product_ids)
+        stale = stale.filter(product_id__in=product_ids)
+
+    products = products.annotate(
+        tier_min=Min('tiered_prices__price_per_unit'),
+        tier_max=Max('tiered_prices__price_per_unit'),
+        tier_count=Count('tiered_prices'),
+    ).prefetch_related(
+        Prefetch('categories', queryset=ProductCategory.objects.only('slug', 'title', 'path', 'is_active')),
+        Prefetch('tags', queryset=Tag.objects.filter(is_active=True).only('name', 'slug')),
+        Prefetch('product_industries', queryset=ProductIndustry.objects.select_related('industry')),
+        Prefetch(
+            'product_use_cases',
+            queryset=ProductUseCase.objects.filter(is_enabled=True, use_case__is_active=True).select_related('use_case'),
+        ),
+    )
+    products = list(products)
+    # Facets include ancestors of a product's categories and industries; only those are loaded
+    active_categories = _active_lineage(
+        ProductCategory.objects.only('slug', 'title', 'path'),
+        {category for product in products for category in product.categories.all()},
+    )
+    active_industries = _active_lineage(
+        Industry.objects.only('title', 'path'),
+        {link.industry for product in products for link in product.product_industries.all()},
+    )
+    listings = [_listing_for(product, active_categories, active_industries) for product in products]
+
+    with transaction.atomic():
+        stale.exclude(product_id__in=[listing.product_id for listing in listings]).delete()
+        ProductListing.objects.bulk_create(
+            listings,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=LISTING_FIELDS,
+        )
+        if uses_postgres_search() and listings:
+            ProductListing.objects.filter(product_id__in=[listing.product_id for listing in listings]).update(
+                search_vector=search_vector()
+            )
+    if product_ids is None:
+        caching.bump_tags(caching.LISTINGS)
+    else:
+        # Lets the in-memory facet and search indexes patch just these products
+        caching.bump_tag_with_changes(caching.LISTINGS, product_ids)
+    return len(listings)
+
+
+def refresh_listings_on_commit(product_ids):
+    """Schedule refresh_listings() for after the current transaction commits"""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: refresh_listings(product_ids))
+
+
+def category_product_ids(category):
+    """Ids of products linked to the category or any of its descendants"""
+    return list(
+        Product.objects.filter(categories__path__startswith=category.path)
+        .values_list('pk', flat=True).distinct()
+    )
+
+
+def industry_product_ids(industry):
+    """Ids of products linked to the industry or any of its descendants"""
+    return list(
+        ProductIndustry.objects.filter(industry__path__startswith=industry.path)
+        .values_list('product_id', flat=True).distinct()
+    )
+
+
+def encode_cursor(listing):
+    raw = json.dumps([listing.order, listing.title, listing.product_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(order, title, product_id) from a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        order, title, product_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(order), str(title), int(product_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def listing_page(queryset, cursor=None, per_page=LISTING_PAGE_SIZE):
+    """
+    One page of listings after the cursor, in (order, title, product_id) order.
+
+    Returns (listings, next_cursor); next_cursor is None on the last page.
+    """
+    after = decode_cursor(cursor)
+    if after is not None:
+        order, title, product_id = after
+        queryset = queryset.filter(
+            Q(order__gt=order)
+            | Q(order=order, title__gt=title)
+            | Q(order=order, title=title, product_id__gt=product_id)
+        )
+    rows = list(queryset.order_by('order', 'title', 'product_id')[:per_page + 1])
+    if len(rows) > per_page:
+        return rows[:per_page], encode_cursor(rows[per_page - 1])
+    return rows, None
@@ -0,0 +1,110 @@
+"""
+Transactional email outbox.
+
+Views never talk to the mail server. queue_email() inserts an OutboundEmail
+row, normally inside the same transaction as the order, quote or account it
+is about, so the message exists exactly when the data it describes does.
+The send_queued_email management command drains the table: it claims due
+rows in batches, sends a batch over one SMTP connection and reschedules
+failures with exponential backoff until MAX_ATTEMPTS is reached.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+RETRY_BASE_SECONDS = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 60)
+
+
+def queue_email(subject, body, to, html_body='', from_email=None, reply_to=None):
+    """Add a message to the outbox and return the OutboundEmail row"""
+    return OutboundEmail.objects.create(
+        subject=subject[:255],
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        reply_to=list(reply_to or []),
+    )
+
+
+def retry_delay(attempts):
+    """Backoff after the given number of failed attempts: 1, 2, 4, 8... times the base"""
+    return timedelta(seconds=RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+
+
+def build_message(outbound, connection=None):
+    message = EmailMultiAlternatives(
+        subject=outbound.subject,
+        body=outbound.body,
+        from_email=outbound.from_email,
+        to=outbound.to,
+        reply_to=outbound.reply_to or None,
+        connection=connection,
+    )
+    if outbound.html_body:
+        message.attach_alternative(outbound.html_body, 'text/html')
+    return message
+
+
+def _record_failure(outbound, error, now):
+    outbound.attempts += 1
+    outbound.last_error = str(error)[:2000]
+    if outbound.attempts >= MAX_ATTEMPTS:
+        outbound.status = OutboundEmail.STATUS_FAILED
+        logger.error(f'Giving up on outbound email {outbound.pk} after {outbound.attempts} attempts: {error}')
+    else:
+        outbound.next_attempt_at = now + retry_delay(outbound.attempts)
+        logger.warning(f'Outbound email {outbound.pk} failed (attempt {outbound.attempts}): {error}')
+
+
+def send_queued_batch(batch_size=50):
+    """
+    Send up to batch_size due messages and return (sent, failed).
+
+    Rows are locked with SKIP LOCKED for the duration of the batch, so several
+    workers can drain the outbox concurrently without sending anything twice.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0, 0
+
+        sent, failed = [], []
+        try:
+            with get_connection() as connection:
+                for outbound in batch:
+                    try:
+                        build_message(outbound, connection).send()
+                    except Exception as e:
+                        _record_failure(outbound, e, now)
+                        failed.append(outbound)
+                    else:
+                        sent.append(outbound.pk)
+        except Exception as e:
+            # Opening or closing the connection failed; only undelivered rows are retried
+            for outbound in batch:
+                if outbound.pk not in sent and outbound not in failed:
+                    _record_failure(outbound, e, now)
+                    failed.append(outbound)
+
+        if sent:
+            OutboundEmail.objects.filter(pk__in=sent).update(
+                status=OutboundEmail.STATUS_SENT, sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+            )
+        if failed:
+            OutboundEmail.objects.bulk_update(failed, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+    return len(sent), len(failed)
@@ -0,0 +1,119 @@
+"""
+Benchmark hot storefront and checkout paths
+Seeds a synthetic catalog (core.benchmarks.seed) into a throwaway test
+database and times each scenario with the Django test client. Results (latency
+percentiles, query counts, cache traffic and tracemalloc allocations) are
+written as JSON, tagged with the current commit, so runs can be compared.
+
+The run uses its own local-memory cache and disables rate limiting and the
+SSL redirect; it never touches the configured database or cache unless
+--in-place is given (which leaves the seeded rows behind).
+"""
+import json
+import platform
+import subprocess
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from core.benchmarks import SCENARIOS, Bench, BenchmarkError, run_scenario, seed_catalog
+
+BENCHMARK_SETTINGS = {
+    'ALLOWED_HOSTS': ['testserver'],
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'RATELIMIT_ENABLE': False,
+    'SECURE_SSL_REDIRECT': False,
+    'REQUEST_METRICS_ENABLED': True,
+    'QUERY_BUDGET_STRICT': False,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = 'Time storefront and checkout requests against a synthetic catalog and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200, help='Products to seed')
+        parser.add_argument('--categories', type=int, default=12, help='Categories to seed (a quarter of them roots)')
+        parser.add_argument('--industries', type=int, default=6, help='Industries to seed')
+        parser.add_argument('--reviews', type=int, default=4, help='Average reviews per product')
+        parser.add_argument('--carts', type=int, default=50, help='Carts to seed')
+        parser.add_argument('--orders', type=int, default=100, help='Orders to seed')
+        parser.add_argument('--posts', type=int, default=20, help='Blog posts to seed')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the catalog and scenario choices')
+        parser.add_argument('--iterations', type=int, default=30, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per scenario first')
+        parser.add_argument('--allocation-samples', type=int, default=5, help='Requests per scenario traced with tracemalloc')
+        parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='Only run these scenarios (repeatable)')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every measured request')
+        parser.add_argument('--page-cache', action='store_true', help='Leave the anonymous full-page cache on')
+        parser.add_argument('--output', default='', help='JSON file to write (default benchmarks/<commit>-<timestamp>.json)')
+        parser.add_argument('--in-place', action='store_true', help='Use the configured database instead of a test database')
+
+    def handle(self, *args, **options):
+        names = options['scenario'] or list(SCENARIOS)
+        old_name = None
+        if not options['in_place']:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(PAGE_CACHE_ENABLED=options['page_cache'], **BENCHMARK_SETTINGS):
+                cache.clear()
+                self.stdout.write('Seeding synthetic catalog...')
+                catalog = seed_catalog(
+                    products=options['products'], categories=options['categories'], industries=options['industries'],
+                    reviews=options['reviews'], carts=options['carts'], orders=options['orders'],
+                    posts=options['posts'], seed=options['seed'],
+                )
+                bench = Bench(catalog, seed=options['seed'])
+                results = {}
+                for name in names:
+                    try:
+                        results[name] = run_scenario(
+                            SCENARIOS[name], bench, iterations=max(options['iterations'], 1), warmup=options['warmup'],
+                            allocation_samples=options['allocation_samples'], cold=options['cold'],
+                        )
+                    except BenchmarkError as e:
+                        raise CommandError(f'{name}: {e}')
+                    stats = results[name]
+                    self.stdout.write(
+                        f'{name:<16} p50 {stats["ms"]["p50"]:>8.2f} ms  p95 {stats["ms"]["p95"]:>8.2f} ms  '
+                        f'queries {stats["queries"]["p50"]:>5g}'
+                        + (f'  peak {stats["alloc_peak_kb"]["p50"]:>8.1f} KiB' if 'alloc_peak_kb' in stats else '')
+                    )
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        commit = _git_commit()
+        report = {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'options': {key: options[key] for key in (
+                'products', 'categories', 'industries', 'reviews', 'carts', 'orders', 'posts', 'seed',
+                'iterations', 'warmup', 'allocation_samples', 'cold', 'page_cache',
+            )},
+            'catalog': catalog.counts,
+            'results': results,
+        }
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' / (
+            f'{commit or "local"}-{timezone.now():%Y%m%d-%H%M%S}.json'
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'✅ Benchmarked {len(results)} scenarios, results in {output}'))
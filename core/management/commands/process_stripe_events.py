@@ -0,0 +1,33 @@
+"""
+Apply queued Stripe webhook events
+Drains the StripeEvent queue in batches, moving the payment status of the
+orders the events concern. Run once from cron, or with --loop as a worker
+process.
+"""
+import time
+from django.core.management.base import BaseCommand
+from core.webhooks import process_stripe_events_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply pending Stripe webhook events to orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events applied per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        total_processed = total_failed = 0
+        while True:
+            processed, failed = process_stripe_events_batch(options['batch_size'])
+            total_processed += processed
+            total_failed += failed
+            if processed or failed:
+                if options['loop']:
+                    self.stdout.write(f'Processed {processed}, failed {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Processed {total_processed} Stripe events ({total_failed} failed)'))
@@ -0,0 +1,53 @@
+"""
+Delete abandoned and empty carts
+Walks the Cart table oldest first in bounded batches (core.cart_reaper), each
+in its own short transaction. Run from cron, or with --loop as a worker;
+--vacuum compacts the cart tables afterwards on PostgreSQL.
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core.cart_reaper import reap_carts_batch
+from core.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = 'Delete expired carts and empty carts in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Carts looked at per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--loop', action='store_true', help='Keep reaping instead of exiting after one pass')
+        parser.add_argument('--interval', type=float, default=3600, help='Seconds to sleep between passes with --loop')
+        parser.add_argument('--vacuum', action='store_true', help='VACUUM ANALYZE the cart tables after a pass (PostgreSQL)')
+
+    def handle(self, *args, **options):
+        while True:
+            carts, items, batches = self.reap_pass(options['batch_size'], options['pause'])
+            if options['vacuum']:
+                self.vacuum()
+            if not options['loop']:
+                break
+            self.stdout.write(f'Deleted {carts} carts and {items} items in {batches} batches')
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Deleted {carts} carts and {items} cart items in {batches} batches'))
+
+    def reap_pass(self, batch_size, pause):
+        cursor = None
+        carts = items = batches = 0
+        while True:
+            cursor, deleted_carts, deleted_items = reap_carts_batch(cursor, max(batch_size, 1))
+            carts += deleted_carts
+            items += deleted_items
+            batches += 1
+            if cursor is None:
+                return carts, items, batches
+            if pause:
+                time.sleep(pause)
+
+    def vacuum(self):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(f'Skipping VACUUM: not supported on {connection.vendor}'))
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM (ANALYZE) {Cart._meta.db_table}, {CartItem._meta.db_table}')
@@ -0,0 +1,97 @@
+"""
+Rebuild responsive image derivatives
+Renders the AVIF/WebP/fallback renditions (see core.images) of every
+uploaded product, category, industry, variant, gallery and blog image in a
+pool of worker processes. Images that already have renditions are skipped
+unless --force is given. With --loop it keeps polling for new images, as the
+worker that renders uploads when IMAGE_DERIVATIVES_ON_UPLOAD is off.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.db import connections
+from blog.models import Post
+from core import caching
+from core.images import render_derivatives, save_asset
+from core.models import ImageAsset, Industry, Product, ProductCategory, ProductImage, ProductVariant
+
+# (model, image field, owner field, cache tag of the pages showing the owner's image)
+IMAGE_FIELDS = [
+    (Product, 'image', 'pk', caching.product_tag),
+    (ProductImage, 'image', 'product_id', caching.product_tag),
+    (ProductVariant, 'image', 'product_id', caching.product_tag),
+    (ProductCategory, 'image', 'pk', lambda pk: caching.CATEGORIES),
+    (Industry, 'image', 'pk', lambda pk: caching.INDUSTRIES),
+    (Post, 'featured_image', 'pk', caching.post_tag),
+]
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive renditions for uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+        parser.add_argument('--force', action='store_true', help='Rebuild images that already have renditions')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new images instead of exiting')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        # Sources that failed during this run; --loop doesn't retry them every poll
+        self.failed_sources = set()
+        total_built = total_failed = 0
+        while True:
+            built, failed = self.render_pass(options['workers'], options['force'])
+            total_built += built
+            total_failed += failed
+            if not options['loop']:
+                break
+            if built or failed:
+                self.stdout.write(f'Rendered {built} images ({failed} failed)')
+            options['force'] = False
+            time.sleep(options['interval'])
+        if not total_built and not total_failed:
+            self.stdout.write(self.style.SUCCESS('✅ All images already have renditions'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Rendered derivatives for {total_built} images ({total_failed} failed)'
+        ))
+
+    def pending_sources(self, force):
+        """{source: set of cache tags to bump once it has renditions}"""
+        rendered = ImageAsset.objects.values('source')
+        sources = {}
+        for model, field, owner, tag in IMAGE_FIELDS:
+            rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            if not force:
+                rows = rows.exclude(**{f'{field}__in': rendered})
+            for source, owner_id in rows.values_list(field, owner):
+                if source in self.failed_sources:
+                    continue
+                sources.setdefault(source, set()).add(tag(owner_id))
+        return sources
+
+    def render_pass(self, workers, force):
+        sources = self.pending_sources(force)
+        if not sources:
+            return 0, 0
+
+        # Workers only touch storage; database connections must not be shared with forked children
+        connections.close_all()
+        built, failed, tags = 0, 0, set()
+        with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = {pool.submit(render_derivatives, source): source for source in sorted(sources)}
+            for future in as_completed(futures):
+                try:
+                    save_asset(future.result())
+                except Exception as e:
+                    failed += 1
+                    self.failed_sources.add(futures[future])
+                    self.stderr.write(f'❌ {futures[future]}: {e}')
+                else:
+                    built += 1
+                    tags |= sources[futures[future]]
+
+        if tags:
+            caching.bump_tags(*tags)
+        return built, failed
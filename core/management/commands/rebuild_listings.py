@@ -0,0 +1,24 @@
+"""
+Rebuild the product listing read model
+Recomputes every ProductListing row from products, tiers, reviews,
+categories and tags. Changes made through queryset.update() bypass the
+signals that keep listings fresh; run this afterwards.
+"""
+from django.core.management.base import BaseCommand
+from core.listings import refresh_listings
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized product listing rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products rebuilt per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        listed = 0
+        for start in range(0, len(product_ids), batch_size):
+            listed += refresh_listings(product_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {listed} product listings'))
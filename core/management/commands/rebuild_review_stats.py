@@ -0,0 +1,21 @@
+"""
+Rebuild stored product review aggregates
+Recomputes rating_sum, rating_count and rating_avg from approved reviews.
+Reviews changed through queryset.update() bypass signals; run this afterwards.
+"""
+from django.core.management.base import BaseCommand
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized review aggregates on products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products updated per UPDATE statement')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            Product.refresh_review_stats(product_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt review stats for {len(product_ids)} products'))
@@ -0,0 +1,32 @@
+"""
+Deliver queued outbound email
+Drains the OutboundEmail outbox in batches; failed messages are retried with
+exponential backoff. Run once from cron, or with --loop as a worker process.
+"""
+import time
+from django.core.management.base import BaseCommand
+from core.mail import send_queued_batch
+
+
+class Command(BaseCommand):
+    help = 'Send pending emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the outbox is empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_queued_batch(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                if options['loop']:
+                    self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Sent {total_sent} emails ({total_failed} failed attempts)'))
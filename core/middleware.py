@@ -0,0 +1,80 @@
+"""
+Request middleware for the core app.
+Includes: request-scoped lazy cart, static files.
+
+Both run natively under ASGI as well as WSGI, so the async payment views
+are reached without a thread hop for each middleware in the chain.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .carts import get_cart_backend
+
+
+def get_request_cart(request):
+    """
+    The visitor's cart, looked up at most once per request.
+
+    Comes from the request's cart backend (core.carts): an unsaved Cart for
+    guests and for sessions without a cart yet, so read-only callers (context
+    processors, cart badges) never create rows.
+    """
+    return get_cart_backend(request).cart
+
+
+class CartMiddleware:
+    """Attach a lazily evaluated request.cart shared by views and context processors"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.cart = SimpleLazyObject(lambda: get_request_cart(request))
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        # Evaluated on first use, which async views do inside sync_to_async()
+        request.cart = SimpleLazyObject(lambda: get_request_cart(request))
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        # Guest carts are written back to their cookie here
+        for backend in getattr(request, '_cart_backends', ()):
+            response = backend.process_response(response)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, which is sync-only, made usable in an async middleware chain"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens and stats the file
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:12
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+
+def backfill_review_aggregates(apps, schema_editor):
+    """Populate the new aggregate columns from existing approved reviews"""
+    Product = apps.get_model('core', 'Product')
+    ProductReview = apps.get_model('core', 'ProductReview')
+    stats = ProductReview.objects.filter(is_approved=True).values('product_id').annotate(
+        total=Sum('rating'), count=Count('id'), avg=Avg('rating'),
+    )
+    for row in stats:
+        Product.objects.filter(pk=row['product_id']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            rating_avg=Decimal(str(round(row['avg'], 1))),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_convert_category_to_many_to_many'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=1, default=Decimal('0.0'), editable=False, help_text='Average approved rating', max_digits=2),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of approved reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Sum of approved review ratings'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='categories',
+            field=models.ManyToManyField(help_text='Product categories (can select multiple)', related_name='products', to='core.productcategory'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'rating_avg'], name='core_produc_is_acti_e98a1e_idx'),
+        ),
+        migrations.RunPython(backfill_review_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:13
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    """Compute materialized paths for existing categories and industries"""
+    for model_name in ('ProductCategory', 'Industry'):
+        model = apps.get_model('core', model_name)
+        parents = dict(model.objects.values_list('id', 'parent_id'))
+        paths = {}
+
+        def build(node_id):
+            if node_id not in paths:
+                parent_id = parents[node_id]
+                paths[node_id] = (build(parent_id) if parent_id else '') + f'{node_id}/'
+            return paths[node_id]
+
+        nodes = list(model.objects.only('id'))
+        for node in nodes:
+            node.path = build(node.id)
+            node.depth = node.path.count('/') - 1
+        model.objects.bulk_update(nodes, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_product_review_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='industry',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Nesting depth, 0 for root (maintained automatically)'),
+        ),
+        migrations.AddField(
+            model_name='industry',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Materialized path of ancestor ids (maintained automatically)', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Nesting depth, 0 for root (maintained automatically)'),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Materialized path of ancestor ids (maintained automatically)', max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
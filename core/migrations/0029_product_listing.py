@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:30
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_outbound_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='core.product')),
+                ('title', models.CharField(max_length=200)),
+                ('slug', models.SlugField()),
+                ('category_slug', models.SlugField(blank=True, help_text='Primary category, used in the product URL', max_length=100)),
+                ('category_title', models.CharField(blank=True, max_length=200)),
+                ('thumbnail_url', models.CharField(blank=True, max_length=500)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('compare_at_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, help_text='Lowest of the base and tier prices', max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, help_text='Highest of the base and tier prices', max_digits=10, null=True)),
+                ('has_tier_pricing', models.BooleanField(default=False)),
+                ('rating_avg', models.DecimalField(decimal_places=1, default=Decimal('0.0'), max_digits=2)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('in_stock', models.BooleanField(default=True)),
+                ('is_featured', models.BooleanField(default=False)),
+                ('minimum_order', models.IntegerField(blank=True, null=True)),
+                ('tags', models.JSONField(blank=True, default=list, help_text="[{'name': ..., 'slug': ...}] of active tags")),
+                ('order', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Product Listing',
+                'verbose_name_plural': 'Product Listings',
+                'ordering': ['order', 'title', 'product_id'],
+                'indexes': [models.Index(fields=['order', 'title', 'product'], name='core_listing_keyset_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:33
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    # GIN is PostgreSQL-only; SQLite searches through core.search.TokenIndex instead
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS core_listing_search_gin ON core_productlisting USING gin (search_vector)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS core_listing_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_product_listing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productlisting',
+            name='search_primary',
+            field=models.TextField(blank=True, help_text='Normalized title, size and keyword tokens (core.search)'),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='search_secondary',
+            field=models.TextField(blank=True, help_text='Normalized GSM, color, tag, category and description tokens'),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='PostgreSQL only; GIN-indexed by migration 0030', null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
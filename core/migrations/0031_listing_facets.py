@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productlisting',
+            name='facets',
+            field=models.JSONField(blank=True, default=dict, help_text='{facet: [[value, label], ...]} read by core.facets'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_listing_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Storage name of the original image', max_length=255, unique=True)),
+                ('content_hash', models.CharField(db_index=True, help_text='SHA-256 of the original; derivatives are stored under it', max_length=64)),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('renditions', models.JSONField(blank=True, default=dict, help_text='{format: [[width, storage name], ...]}, narrowest first')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Image Asset',
+                'verbose_name_plural': 'Image Assets',
+            },
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='image_name',
+            field=models.CharField(blank=True, help_text='Storage name of the product image, for responsive renditions', max_length=255),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_image_assets'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at', 'id'], name='core_cart_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_cart_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='payment_intent_fingerprint',
+            field=models.CharField(blank=True, help_text="Hash of the intent's amount and metadata", max_length=64),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='payment_intent_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='payment_intent_secret',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
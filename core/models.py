@@ -1,5 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Coalesce, Concat, Round, Substr
+from django.utils.functional import cached_property
+from django.utils import timezone
 from decimal import Decimal
 import uuid
 
@@ -23,10 +28,102 @@ class MenuItem(models.Model):
         return self.title
     
     def has_children(self):
+        if 'children' in getattr(self, '_prefetched_objects_cache', {}):
+            return any(child.is_active for child in self.children.all())
         return self.children.filter(is_active=True).exists()
 
 
-class ProductCategory(models.Model):
+class TreeNode(models.Model):
+    """Abstract self-referencing hierarchy with a stored materialized path.
+    
+    path holds the primary keys from the root down to the node, e.g. '3/17/42/',
+    and depth its nesting level. Both are maintained in save(), including for the
+    whole subtree when a node moves, so ancestors, descendants, depth and
+    breadcrumbs never need to walk parent links one query at a time.
+    Subclasses declare the 'parent' ForeignKey to 'self'.
+    """
+    PATH_SEPARATOR = '/'
+    
+    path = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True, help_text="Materialized path of ancestor ids (maintained automatically)")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Nesting depth, 0 for root (maintained automatically)")
+    
+    class Meta:
+        abstract = True
+    
+    def _build_path(self):
+        parent_path = self.parent.path if self.parent_id else ''
+        return f"{parent_path}{self.pk}{self.PATH_SEPARATOR}"
+    
+    def _parent_in_own_subtree(self):
+        """Whether parent is the node itself or one of its descendants, by the stored paths"""
+        if not (self.pk and self.parent_id):
+            return False
+        paths = dict(type(self)._default_manager.filter(pk__in=[self.pk, self.parent_id]).values_list('pk', 'path'))
+        own, parent = paths.get(self.pk), paths.get(self.parent_id)
+        return bool(own and parent and parent.startswith(own))
+    
+    def clean(self):
+        super().clean()
+        if self._parent_in_own_subtree():
+            raise ValidationError({'parent': "A node cannot be moved below itself or one of its descendants."})
+    
+    def save(self, *args, **kwargs):
+        # clean() isn't run by scripts, the shell or bulk admin actions; a cycle would corrupt every path below
+        if self._parent_in_own_subtree():
+            raise ValueError(f"{self} cannot be moved below itself or one of its descendants.")
+        super().save(*args, **kwargs)
+        old_path = self.path
+        new_path = self._build_path()
+        if new_path == old_path:
+            return
+        
+        manager = type(self)._default_manager
+        new_depth = new_path.count(self.PATH_SEPARATOR) - 1
+        manager.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            # Moved: rewrite the prefix of every descendant in one statement
+            manager.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=models.F('depth') + (new_depth - self.depth),
+            )
+        self.path = new_path
+        self.depth = new_depth
+    
+    @property
+    def ancestor_ids(self):
+        """Primary keys of all ancestors, root first, parsed from the stored path"""
+        return [int(pk) for pk in self.path.split(self.PATH_SEPARATOR)[:-2]]
+    
+    def get_ancestors(self):
+        """Get all ancestors from the root down, in one query"""
+        ids = self.ancestor_ids
+        if not ids:
+            return []
+        return list(type(self)._default_manager.filter(pk__in=ids).order_by('depth'))
+    
+    def get_subtree(self, include_self=True):
+        """Queryset of the node's whole subtree in depth-first order"""
+        subtree = type(self)._default_manager.filter(path__startswith=self.path).order_by('path')
+        if not include_self:
+            subtree = subtree.exclude(pk=self.pk)
+        return subtree
+    
+    def get_descendants(self, include_self=False):
+        """Get all descendants in depth-first order, in one query"""
+        return list(self.get_subtree(include_self=include_self))
+    
+    def get_full_path(self):
+        """Get the breadcrumb path of titles (e.g., 'Packaging > Paper Bags > Brown Kraft')"""
+        path_parts = [a.title for a in self.get_ancestors()] + [self.title]
+        return ' > '.join(path_parts)
+    
+    @property
+    def level(self):
+        """Get nesting level (0 for root, 1 for first child, etc.)"""
+        return self.depth
+
+
+class ProductCategory(TreeNode):
     """Product categories displayed on the homepage and products page"""
     title = models.CharField(max_length=200, help_text="Category name (e.g., Brown Kraft Bags)")
     description = models.TextField(blank=True, help_text="Category description (e.g., Grocery & Food Packaging)")
@@ -68,32 +165,13 @@ class ProductCategory(models.Model):
             return f"{self.parent.title} > {self.title}"
         return self.title
     
-    def get_ancestors(self):
-        """Get all parent categories up to root"""
-        ancestors = []
-        current = self.parent
-        while current:
-            ancestors.insert(0, current)
-            current = current.parent
-        return ancestors
-    
-    def get_descendants(self, include_self=False):
-        """Get all child categories recursively"""
-        descendants = [self] if include_self else []
-        for child in self.children.all():
-            descendants.extend(child.get_descendants(include_self=True))
-        return descendants
-    
-    def get_full_path(self):
-        """Get full category path (e.g., 'Packaging > Paper Bags > Brown Kraft')"""
-        ancestors = self.get_ancestors()
-        path_parts = [a.title for a in ancestors] + [self.title]
-        return ' > '.join(path_parts)
-    
-    @property
-    def level(self):
-        """Get nesting level (0 for root, 1 for first child, etc.)"""
-        return len(self.get_ancestors())
+    def get_subtree_products(self):
+        """Active products assigned to this category or any category below it"""
+        return Product.objects.filter(
+            is_active=True,
+            categories__path__startswith=self.path,
+            categories__is_active=True,
+        ).distinct()
     
     def get_specifications(self):
         """Return list of specifications for template"""
@@ -176,6 +254,11 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True, help_text="Show/hide this product")
     is_featured = models.BooleanField(default=False, help_text="Feature on homepage")
     
+    # Review aggregates (maintained from approved ProductReview rows, see refresh_review_stats)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, help_text="Sum of approved review ratings")
+    rating_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of approved reviews")
+    rating_avg = models.DecimalField(max_digits=2, decimal_places=1, default=Decimal('0.0'), editable=False, help_text="Average approved rating")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -189,6 +272,7 @@ class Product(models.Model):
             models.Index(fields=['is_active', 'order']),
             models.Index(fields=['sku']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['is_active', 'rating_avg']),
         ]
     
     def __str__(self):
@@ -196,8 +280,13 @@ class Product(models.Model):
     
     @property
     def primary_category(self):
-        """Get the first category for backward compatibility"""
-        return self.categories.first()
+        """
+        The category the product's URL is built from: its active category with the
+        lowest materialized path. Listings (core.listings) and the sitemap use the
+        same rule; this reads prefetched categories without a query.
+        """
+        active = [category for category in self.categories.all() if category.is_active]
+        return min(active, key=lambda category: category.path, default=None)
     
     def get_category_list(self):
         """Get comma-separated list of category names"""
@@ -226,27 +315,45 @@ class Product(models.Model):
     
     @property
     def average_rating(self):
-        """Calculate average rating from approved reviews"""
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
+        """Average rating of approved reviews (stored aggregate)"""
+        if self.rating_count:
+            return float(self.rating_avg)
         return 0
     
     @property
     def review_count(self):
-        """Count approved reviews"""
-        return self.reviews.filter(is_approved=True).count()
+        """Count approved reviews (stored aggregate)"""
+        return self.rating_count
+    
+    @classmethod
+    def refresh_review_stats(cls, product_ids=None):
+        """Recompute stored review aggregates from approved reviews in a single UPDATE"""
+        approved = ProductReview.objects.filter(
+            product=models.OuterRef('pk'), is_approved=True
+        ).order_by().values('product')
+        
+        products = cls.objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        return products.update(
+            rating_sum=Coalesce(models.Subquery(approved.annotate(total=models.Sum('rating')).values('total')), 0),
+            rating_count=Coalesce(models.Subquery(approved.annotate(total=models.Count('pk')).values('total')), 0),
+            rating_avg=Coalesce(
+                Round(models.Subquery(approved.annotate(avg=models.Avg('rating')).values('avg')), 1),
+                Decimal('0.0'),
+                output_field=models.DecimalField(max_digits=2, decimal_places=1),
+            ),
+        )
+    
+    @cached_property
+    def price_ladder(self):
+        """Compiled tier ladder for this product (cached, no per-lookup queries)"""
+        from .pricing import get_price_ladder
+        return get_price_ladder(self.pk)
     
     def get_tiered_price(self, quantity):
         """Get price for a specific quantity based on tiered pricing"""
-        tiered = self.tiered_prices.filter(
-            min_quantity__lte=quantity
-        ).filter(
-            models.Q(max_quantity__gte=quantity) | models.Q(max_quantity__isnull=True)
-        ).first()
-        if tiered:
-            return tiered.price_per_unit
-        return self.price
+        return self.price_ladder.price_for(quantity, default=self.price)
     
     def get_specifications(self):
         """Return list of specifications for template"""
@@ -374,7 +481,7 @@ class Service(models.Model):
         return self.title
 
 
-class Industry(models.Model):
+class Industry(TreeNode):
     """Industries displayed on the homepage"""
     title = models.CharField(max_length=200, help_text="Industry name (e.g., Restaurant & Takeout)")
     image = models.ImageField(upload_to='industries/', help_text="Industry icon/image")
@@ -399,33 +506,6 @@ class Industry(models.Model):
             return f"{self.parent.title} > {self.title}"
         return self.title
     
-    def get_ancestors(self):
-        """Get all parent industries up to root"""
-        ancestors = []
-        current = self.parent
-        while current:
-            ancestors.insert(0, current)
-            current = current.parent
-        return ancestors
-    
-    def get_descendants(self, include_self=False):
-        """Get all child industries recursively"""
-        descendants = [self] if include_self else []
-        for child in self.children.all():
-            descendants.extend(child.get_descendants(include_self=True))
-        return descendants
-    
-    def get_full_path(self):
-        """Get full industry path (e.g., 'Food Service > Restaurants > Fast Food')"""
-        ancestors = self.get_ancestors()
-        path_parts = [a.title for a in ancestors] + [self.title]
-        return ' > '.join(path_parts)
-    
-    @property
-    def level(self):
-        """Get nesting level (0 for root, 1 for first child, etc.)"""
-        return len(self.get_ancestors())
-    
     @property
     def slug(self):
         """Extract slug from URL path for template compatibility"""
@@ -500,6 +580,12 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # The Stripe PaymentIntent this cart's checkout collects through: reused and
+    # updated as the totals change, cancelled when the reaper deletes the cart
+    payment_intent_id = models.CharField(max_length=255, blank=True)
+    payment_intent_secret = models.CharField(max_length=255, blank=True)
+    payment_intent_fingerprint = models.CharField(max_length=64, blank=True, help_text="Hash of the intent's amount and metadata")
+    
     # Tax rates for Canada
     TAX_RATES = {
         'ON': Decimal('0.13'),  # Ontario HST
@@ -519,83 +605,96 @@ class Cart(models.Model):
     
     FREE_SHIPPING_THRESHOLD = Decimal('2000.00')
     
+    # Guest carts are never saved: their {product_id: quantity} lines live in a
+    # signed cookie (core.carts) and are set here instead of loaded from items
+    guest_lines = None
+    
     class Meta:
         verbose_name = "Shopping Cart"
         verbose_name_plural = "Shopping Carts"
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='core_cart_keyset_idx'),
+        ]
     
     def __str__(self):
         return f"Cart {self.id} - {self.session_key[:20]}..."
     
+    @cached_property
+    def totals(self):
+        """Cart totals computed from a single prefetch of items, products and tiers"""
+        from .pricing import CartTotals, guest_cart_items
+        # An unsaved cart has no item rows; a guest cart builds its items from its lines
+        if self.pk is None:
+            return CartTotals(self, items=guest_cart_items(self.guest_lines))
+        return CartTotals(self)
+    
+    def invalidate_totals(self):
+        """Drop cached totals after the cart's items have changed"""
+        self.__dict__.pop('totals', None)
+    
+    def set_payment_intent(self, intent_id='', secret='', fingerprint=''):
+        """Remember (or, called without arguments, forget) the cart's PaymentIntent without touching updated_at"""
+        self.payment_intent_id, self.payment_intent_secret, self.payment_intent_fingerprint = intent_id, secret, fingerprint
+        Cart.objects.filter(pk=self.pk).update(
+            payment_intent_id=intent_id, payment_intent_secret=secret, payment_intent_fingerprint=fingerprint,
+        )
+    
     @property
     def total_items(self):
         """Total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return self.totals.total_items
     
     @property
     def subtotal(self):
         """Subtotal of all items in cart (with tiered pricing)"""
-        return sum(item.total_price for item in self.items.all())
+        return self.totals.subtotal
     
     @property
     def original_subtotal(self):
         """What the cart would cost without tiered pricing"""
-        return sum(item.original_total for item in self.items.all())
+        return self.totals.original_subtotal
     
     @property
     def total_savings(self):
         """Total savings from tiered pricing"""
-        return sum(item.total_savings for item in self.items.all())
+        return self.totals.total_savings
     
     @property
     def has_savings(self):
         """Check if cart has any savings"""
-        return self.total_savings > 0
+        return self.totals.has_savings
     
     @property
     def savings_percentage(self):
         """Overall percentage savings"""
-        if self.original_subtotal and self.original_subtotal > 0:
-            return int((self.total_savings / self.original_subtotal) * 100)
-        return 0
+        return self.totals.savings_percentage
     
     def get_estimated_tax(self, province='ON'):
         """Estimate tax based on province"""
-        rate = self.TAX_RATES.get(province.upper(), Decimal('0.13'))
-        return (self.subtotal * rate).quantize(Decimal('0.01'))
+        return self.totals.get_estimated_tax(province)
     
     def get_shipping_estimate(self):
         """Estimate shipping cost"""
-        if self.subtotal >= self.FREE_SHIPPING_THRESHOLD:
-            return Decimal('0.00')
-        # Flat rate shipping for orders under threshold
-        if self.subtotal >= Decimal('500.00'):
-            return Decimal('29.99')
-        elif self.subtotal >= Decimal('200.00'):
-            return Decimal('49.99')
-        else:
-            return Decimal('79.99')
+        return self.totals.get_shipping_estimate()
     
     @property
     def shipping_progress(self):
         """Progress towards free shipping (percentage)"""
-        if self.subtotal >= self.FREE_SHIPPING_THRESHOLD:
-            return 100
-        return int((self.subtotal / self.FREE_SHIPPING_THRESHOLD) * 100)
+        return self.totals.shipping_progress
     
     @property
     def amount_to_free_shipping(self):
         """Amount needed for free shipping"""
-        remaining = self.FREE_SHIPPING_THRESHOLD - self.subtotal
-        return max(Decimal('0.00'), remaining)
+        return self.totals.amount_to_free_shipping
     
     def get_total_with_tax(self, province='ON'):
         """Total including tax"""
-        return self.subtotal + self.get_estimated_tax(province) + self.get_shipping_estimate()
+        return self.totals.get_total_with_tax(province)
     
     @property
     def total(self):
         """Total including any fees (can add shipping, tax later)"""
-        return self.subtotal
+        return self.totals.total
 
 
 class CartItem(models.Model):
@@ -625,29 +724,15 @@ class CartItem(models.Model):
         if not base:
             return Decimal('0.00')
         
-        # Check for tiered pricing
-        tiered_prices = self.product.tiered_prices.filter(
-            min_quantity__lte=self.quantity
-        ).order_by('-min_quantity').first()
-        
-        if tiered_prices:
-            # Check max_quantity if set
-            if tiered_prices.max_quantity is None or self.quantity <= tiered_prices.max_quantity:
-                return tiered_prices.price_per_unit
-        
+        tier = self.applied_tier
+        if tier:
+            return tier.price_per_unit
         return base
     
     @property
     def applied_tier(self):
-        """Get the applied tiered pricing tier"""
-        tiered_prices = self.product.tiered_prices.filter(
-            min_quantity__lte=self.quantity
-        ).order_by('-min_quantity').first()
-        
-        if tiered_prices:
-            if tiered_prices.max_quantity is None or self.quantity <= tiered_prices.max_quantity:
-                return tiered_prices
-        return None
+        """Get the applied tiered pricing tier from the product's price ladder"""
+        return self.product.price_ladder.tier_for(self.quantity)
     
     @property
     def savings_per_unit(self):
@@ -784,6 +869,7 @@ class Order(models.Model):
             models.Index(fields=['email']),
             models.Index(fields=['status']),
             models.Index(fields=['payment_status']),
+            models.Index(fields=['payment_id']),
             models.Index(fields=['created_at']),
             models.Index(fields=['status', 'created_at']),
         ]
@@ -797,8 +883,12 @@ class Order(models.Model):
             from datetime import datetime
             import random
             date_str = datetime.now().strftime('%Y%m%d')
-            random_str = ''.join([str(random.randint(0, 9)) for _ in range(4)])
-            self.order_number = f"PA-{date_str}-{random_str}"
+            # Only 10,000 numbers per day, so draw again if this one is taken
+            while True:
+                random_str = ''.join([str(random.randint(0, 9)) for _ in range(4)])
+                self.order_number = f"PA-{date_str}-{random_str}"
+                if not Order.objects.filter(order_number=self.order_number).exists():
+                    break
         
         # Auto-sync tracking_step with order status
         status_to_tracking = {
@@ -933,6 +1023,46 @@ class TieredPricing(models.Model):
         return f"{self.min_quantity}+"
 
 
+class ProductListing(models.Model):
+    """Denormalized listing card for an active product, rebuilt by core.listings"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='listing')
+    title = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=50)
+    category_slug = models.SlugField(max_length=100, blank=True, help_text="Primary category, used in the product URL")
+    category_title = models.CharField(max_length=200, blank=True)
+    thumbnail_url = models.CharField(max_length=500, blank=True)
+    image_name = models.CharField(max_length=255, blank=True, help_text="Storage name of the product image, for responsive renditions")
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    compare_at_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Lowest of the base and tier prices")
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Highest of the base and tier prices")
+    has_tier_pricing = models.BooleanField(default=False)
+    rating_avg = models.DecimalField(max_digits=2, decimal_places=1, default=Decimal('0.0'))
+    rating_count = models.PositiveIntegerField(default=0)
+    in_stock = models.BooleanField(default=True)
+    is_featured = models.BooleanField(default=False)
+    minimum_order = models.IntegerField(null=True, blank=True)
+    tags = models.JSONField(default=list, blank=True, help_text="[{'name': ..., 'slug': ...}] of active tags")
+    order = models.IntegerField(default=0)
+    search_primary = models.TextField(blank=True, help_text="Normalized title, size and keyword tokens (core.search)")
+    search_secondary = models.TextField(blank=True, help_text="Normalized GSM, color, tag, category and description tokens")
+    search_vector = SearchVectorField(null=True, editable=False, help_text="PostgreSQL only; GIN-indexed by migration 0030")
+    facets = models.JSONField(default=dict, blank=True, help_text="{facet: [[value, label], ...]} read by core.facets")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # The keyset pagination order; product_id breaks ties between equal titles
+        ordering = ['order', 'title', 'product_id']
+        verbose_name = "Product Listing"
+        verbose_name_plural = "Product Listings"
+        indexes = [
+            models.Index(fields=['order', 'title', 'product'], name='core_listing_keyset_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
 class DiscountRule(models.Model):
     """Discount rules for products"""
     DISCOUNT_TYPES = [
@@ -1214,3 +1344,91 @@ class SiteSettings(models.Model):
         """Get the singleton settings instance, creating it if needed"""
         settings, created = cls.objects.get_or_create(pk=1)
         return settings
+
+
+class OutboundEmail(models.Model):
+    """Email waiting in the outbox; delivered by the send_queued_email command"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True, help_text="Plain text body")
+    html_body = models.TextField(blank=True, help_text="Optional HTML alternative")
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(help_text="List of recipient addresses")
+    reply_to = models.JSONField(default=list, blank=True, help_text="List of Reply-To addresses")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Delivery attempts made so far")
+    next_attempt_at = models.DateTimeField(default=timezone.now, help_text="Not retried before this time")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)}"
+
+
+class StripeEvent(models.Model):
+    """Verified Stripe webhook event waiting to be applied; processed by the process_stripe_events command"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSED = 'processed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSED, 'Processed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True, help_text="Stripe event id; a redelivered event is stored once")
+    type = models.CharField(max_length=100)
+    payload = models.JSONField(help_text="The event as Stripe sent it")
+    stripe_created = models.DateTimeField(help_text="When Stripe created the event; events are applied in this order")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-stripe_created']
+        verbose_name = "Stripe Event"
+        verbose_name_plural = "Stripe Events"
+        indexes = [
+            models.Index(fields=['status', 'stripe_created']),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
+
+
+class ImageAsset(models.Model):
+    """Responsive renditions of one uploaded image, written by core.images"""
+    source = models.CharField(max_length=255, unique=True, help_text="Storage name of the original image")
+    content_hash = models.CharField(max_length=64, db_index=True, help_text="SHA-256 of the original; derivatives are stored under it")
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    renditions = models.JSONField(default=dict, blank=True, help_text="{format: [[width, storage name], ...]}, narrowest first")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Image Asset"
+        verbose_name_plural = "Image Assets"
+
+    def __str__(self):
+        return self.source
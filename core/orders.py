@@ -0,0 +1,108 @@
+"""
+Order placement service.
+
+place_order() turns a cart into an Order in one transaction with a fixed
+number of statements regardless of how many lines the cart has:
+- lock the cart items, then the products they reference in one
+  SELECT ... FOR UPDATE ordered by id (a stable order avoids deadlocks
+  between concurrent checkouts sharing products),
+- check stock in memory against the locked rows,
+- insert the order and all its items (bulk_create),
+- decrement stock for every tracked product with a single CASE UPDATE,
+- empty the cart.
+
+Both the checkout form and the Stripe payment flow use it.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+from . import caching
+from .listings import refresh_listings_on_commit
+from .models import Order, OrderItem, Product
+from .pricing import CartTotals, cart_items_queryset
+
+
+class InsufficientStock(ValueError):
+    """A cart line asks for more than the locked stock allows"""
+
+
+def _lock_products(product_ids):
+    return {
+        product_id: (title, stock_quantity, track_inventory, allow_backorder)
+        for product_id, title, stock_quantity, track_inventory, allow_backorder in (
+            Product.objects.select_for_update()
+            .filter(id__in=product_ids)
+            .order_by('id')
+            .values_list('id', 'title', 'stock_quantity', 'track_inventory', 'allow_backorder')
+        )
+    }
+
+
+def _decrement_stock(quantities):
+    """Subtract {product_id: quantity} from stock in one UPDATE"""
+    if not quantities:
+        return
+    Product.objects.filter(id__in=quantities).update(
+        stock_quantity=Case(
+            *[When(id=product_id, then=F('stock_quantity') - quantity) for product_id, quantity in quantities.items()],
+            output_field=IntegerField(),
+        )
+    )
+
+
+def place_order(cart, **order_fields):
+    """
+    Create an Order with its items from the cart and decrement stock.
+
+    order_fields are passed to Order (addresses, totals, payment info).
+    Raises InsufficientStock (a ValueError) if a tracked product no longer has
+    enough stock; nothing is written in that case.
+    """
+    with transaction.atomic():
+        items = list(cart_items_queryset(cart).select_for_update(of=('self',)))
+        if not items:
+            raise ValueError('Your cart is empty.')
+
+        requested = defaultdict(int)
+        for item in items:
+            requested[item.product_id] += item.quantity
+
+        products = _lock_products(sorted(requested))
+        to_decrement = {}
+        for product_id, quantity in requested.items():
+            title, stock_quantity, track_inventory, allow_backorder = products[product_id]
+            if not track_inventory:
+                continue
+            if not allow_backorder and stock_quantity < quantity:
+                raise InsufficientStock(f'{title}: only {stock_quantity} available')
+            to_decrement[product_id] = quantity
+
+        # Price the locked snapshot with one batch of price ladder lookups
+        totals = CartTotals(cart, items=items)
+
+        order = Order.objects.create(**order_fields)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                product_title=item.product.title,
+                product_sku=item.product.sku or '',
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                # bulk_create skips OrderItem.save(), which derives the line total
+                total_price=item.unit_price * item.quantity,
+            )
+            for item in totals
+        ])
+        _decrement_stock(to_decrement)
+
+        cart.items.all().delete()
+        cart.invalidate_totals()
+
+        # Queryset updates send no signals; refresh listings and cached pages showing stock
+        product_tags = [caching.product_tag(product_id) for product_id in to_decrement]
+        if product_tags:
+            refresh_listings_on_commit(to_decrement)
+            transaction.on_commit(lambda: caching.bump_tags(caching.CATALOG, *product_tags))
+
+    return order
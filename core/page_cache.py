@@ -0,0 +1,133 @@
+"""
+Full-page cache for anonymous catalog pages.
+
+Views opt in with @cache_anonymous_page. A page is served from (and stored in)
+the cache only for GET requests from anonymous visitors with no cart, no
+pending messages and no query parameters beyond the ones the view varies on,
+so everything in the base template that is normally per-visitor renders the
+same for every request the cache answers.
+
+Entries are invalidated through surrogate keys: the cache tags from
+core.caching that the page depends on, declared on the decorator or added
+while rendering with add_surrogate_keys(). The same keys are sent in the
+Surrogate-Key header so a CDN in front of the site can purge by them too.
+
+The CSRF token is the one per-visitor value such pages still contain. Renders
+destined for the cache use a placeholder (see context_processors.page_cache)
+that is swapped for the visitor's own token on every response.
+"""
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from . import caching
+from .carts import get_cart_backend
+
+
+CSRF_PLACEHOLDER = '__page_cache_csrf_token__'
+PAGE_KEY = 'page:{}'
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', caching.DEFAULT_TIMEOUT)
+
+# Data every page pulls in through the base template's context processors
+BASE_TAGS = (caching.MENU, caching.CATEGORIES, caching.OAUTH)
+
+
+def add_surrogate_keys(request, *tags, versions=None):
+    """
+    Tie the page being rendered to extra cache tags (e.g. the products it shows).
+
+    Call it before loading the data the tags cover, or pass the versions that
+    data was read under (e.g. a cached bundle's), so the page is stored under
+    versions no newer than its content.
+    """
+    keys = getattr(request, '_surrogate_keys', None)
+    if keys is None:
+        return
+    keys.update(tags)
+    known = request._surrogate_versions
+    for tag in tags:
+        if tag not in known and versions and tag in versions:
+            known[tag] = versions[tag]
+    unread = [tag for tag in tags if tag not in known]
+    if unread:
+        known.update(caching.get_tag_versions(unread))
+
+
+def is_cacheable_request(request, vary_on=()):
+    if not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+        return False
+    if request.method != 'GET' or not set(request.GET) <= set(vary_on):
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    if len(get_messages(request)):
+        return False
+    return not get_cart_backend(request).has_cart()
+
+
+def page_cache_key(request, vary_on=()):
+    params = '&'.join(
+        f'{name}={value}' for name in sorted(vary_on) for value in request.GET.getlist(name)
+    )
+    raw = f'{request.get_host()}{request.path}?{params}'
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _finalize(request, response, tags, status):
+    if not response.streaming and CSRF_PLACEHOLDER.encode() in response.content:
+        response.content = response.content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+    response['Surrogate-Key'] = ' '.join(sorted(tags))
+    response['X-Page-Cache'] = status
+    return response
+
+
+def cache_anonymous_page(tags=(), vary_on=(), on_hit=None, timeout=None):
+    """
+    Serve the view from the page cache for anonymous, cart-less visitors.
+
+    tags: surrogate keys the page always depends on (in addition to BASE_TAGS)
+    vary_on: query parameters that change the page; requests with any other
+        parameter bypass the cache
+    on_hit: optional callable(request, *args, **kwargs) for side effects the
+        view would have performed (e.g. counting a view) on cache hits
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request, vary_on):
+                return view_func(request, *args, **kwargs)
+
+            key = page_cache_key(request, vary_on)
+            entry = caching.get_tagged(key)
+            if entry is not None:
+                if on_hit is not None:
+                    on_hit(request, *args, **kwargs)
+                response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                return _finalize(request, response, entry['tags'], 'HIT')
+
+            request._surrogate_keys = set(BASE_TAGS) | set(tags)
+            # Read before rendering, so a tag bumped mid-render leaves this copy already stale
+            request._surrogate_versions = caching.get_tag_versions(request._surrogate_keys)
+            request._page_cache_pending = True
+            try:
+                response = view_func(request, *args, **kwargs)
+            finally:
+                request._page_cache_pending = False
+
+            page_tags = request._surrogate_keys
+            if response.status_code == 200 and not response.streaming and not response.cookies \
+                    and not request.session.modified:
+                # Stored before _finalize, so the content still holds the CSRF placeholder
+                caching.set_tagged(
+                    key,
+                    {'content': response.content, 'content_type': response['Content-Type'], 'tags': sorted(page_tags)},
+                    page_tags,
+                    timeout or PAGE_CACHE_TIMEOUT,
+                    versions=request._surrogate_versions,
+                )
+            return _finalize(request, response, page_tags, 'MISS')
+        return wrapper
+    return decorator
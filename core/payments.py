@@ -0,0 +1,101 @@
+"""
+Stripe API client for the payment views.
+
+The payment views are async (served through packaxis_app.asgi), so a slow
+Stripe response waits on the event loop instead of holding a worker. They
+share one StripeClient per event loop, backed by Stripe's httpx client: its
+AsyncClient keeps a pool of open connections, so calls after the first skip
+the TCP and TLS handshakes.
+
+Timeouts and the retry budget come from settings:
+- STRIPE_TIMEOUT: seconds a whole request may take,
+- STRIPE_CONNECT_TIMEOUT: seconds to open a connection,
+- STRIPE_MAX_NETWORK_RETRIES: retries after a connection error, timeout or
+  409/5xx answer; Stripe's idempotency keys make them safe for creates,
+- STRIPE_API_BASE: another API host, such as stripe-mock or the fake server
+  the tests run.
+
+A cart keeps one PaymentIntent through checkout (Cart.payment_intent_*): the
+payment view creates it once, updates it when intent_fingerprint() of the new
+amount and metadata differs from the stored one, and answers from the stored
+client secret without calling Stripe when nothing changed. The cart reaper
+cancels the intents of the carts it deletes.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import weakref
+import httpx
+import stripe
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_clients = weakref.WeakKeyDictionary()  # event loop: (config, StripeClient)
+
+
+def _client_config():
+    return (
+        settings.STRIPE_SECRET_KEY,
+        getattr(settings, 'STRIPE_API_BASE', ''),
+        getattr(settings, 'STRIPE_TIMEOUT', 10),
+        getattr(settings, 'STRIPE_CONNECT_TIMEOUT', 3),
+        getattr(settings, 'STRIPE_MAX_NETWORK_RETRIES', 2),
+    )
+
+
+def build_stripe_client(api_key, api_base='', timeout=10, connect_timeout=3, max_network_retries=2):
+    """A StripeClient making async requests through a pooled httpx client"""
+    return stripe.StripeClient(
+        api_key,
+        base_addresses={'api': api_base} if api_base else {},
+        max_network_retries=max_network_retries,
+        http_client=stripe.HTTPXClient(timeout=httpx.Timeout(timeout, connect=connect_timeout)),
+    )
+
+
+def get_stripe_client():
+    """
+    The StripeClient for the running event loop.
+
+    Pooled httpx connections belong to the loop that opened them, so each
+    loop gets its own client: one per worker under ASGI, one per request when
+    an async view runs under WSGI or the test client.
+    """
+    loop = asyncio.get_running_loop()
+    config = _client_config()
+    cached = _clients.get(loop)
+    if cached is None or cached[0] != config:
+        cached = _clients[loop] = (config, build_stripe_client(*config))
+    return cached[1]
+
+
+def intent_fingerprint(params):
+    """Hash of the PaymentIntent parameters that change with the cart and checkout choices"""
+    significant = {key: params.get(key) for key in ('amount', 'currency', 'metadata')}
+    return hashlib.sha256(json.dumps(significant, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def _cancel_all(intent_ids):
+    client = get_stripe_client()
+    results = await asyncio.gather(
+        *(client.payment_intents.cancel_async(intent_id) for intent_id in intent_ids), return_exceptions=True,
+    )
+    cancelled = 0
+    for intent_id, result in zip(intent_ids, results):
+        if isinstance(result, Exception):
+            # Already succeeded or cancelled, or Stripe is unreachable: leave the intent as it is
+            logger.warning(f'Could not cancel PaymentIntent {intent_id}: {result}')
+        else:
+            cancelled += 1
+    return cancelled
+
+
+def cancel_payment_intents(intent_ids):
+    """Cancel abandoned PaymentIntents concurrently; returns how many were cancelled"""
+    intent_ids = [intent_id for intent_id in intent_ids if intent_id]
+    if not intent_ids:
+        return 0
+    return async_to_sync(_cancel_all)(intent_ids)
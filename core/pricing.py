@@ -0,0 +1,226 @@
+"""
+Pricing engine.
+
+PriceLadder compiles a product's TieredPricing rows into sorted arrays so a
+quantity resolves to its tier with a bisect and no database access. Ladders are
+cached process-locally and in the shared cache, and are dropped by the signal
+handlers in core.signals whenever tiers change.
+
+CartTotals loads a cart's items, products and price ladders in a fixed number
+of queries and computes every cart-level number (item count, subtotal, savings,
+shipping progress, tax) in memory. Views, context processors and the checkout
+utilities share one instance per cart instead of re-iterating cart.items.
+"""
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+
+
+Tier = namedtuple('Tier', ['min_quantity', 'max_quantity', 'price_per_unit', 'label'])
+
+
+class PriceLadder:
+    """Sorted tier arrays for one product, answering quantity lookups by bisect"""
+
+    __slots__ = ('product_id', 'tiers', 'min_quantities', 'max_quantities', 'prices')
+
+    def __init__(self, product_id, tiers):
+        self.product_id = product_id
+        self.tiers = sorted(tiers, key=lambda t: t.min_quantity)
+        self.min_quantities = [t.min_quantity for t in self.tiers]
+        self.max_quantities = [t.max_quantity for t in self.tiers]
+        self.prices = [t.price_per_unit for t in self.tiers]
+
+    def __bool__(self):
+        return bool(self.tiers)
+
+    def __getstate__(self):
+        return (self.product_id, self.tiers)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def tier_for(self, quantity):
+        """Tier with the highest min_quantity <= quantity, if quantity is within its max"""
+        index = bisect_right(self.min_quantities, quantity) - 1
+        if index < 0:
+            return None
+        max_quantity = self.max_quantities[index]
+        if max_quantity is not None and quantity > max_quantity:
+            return None
+        return self.tiers[index]
+
+    def price_for(self, quantity, default=None):
+        """Tiered unit price for a quantity, or default when no tier applies"""
+        tier = self.tier_for(quantity)
+        return tier.price_per_unit if tier else default
+
+
+PRICE_LADDER_KEY = 'price_ladder:{}'
+# Other workers may serve a ladder this old after a tier change
+LOCAL_LADDER_TIMEOUT = getattr(settings, 'CACHE_TIMEOUT_SHORT', 60)
+SHARED_LADDER_TIMEOUT = getattr(settings, 'CACHE_TIMEOUT_DAY', 86400)
+
+_local_ladders = {}
+
+
+def _build_price_ladders(product_ids):
+    from .models import TieredPricing
+
+    rows = {product_id: [] for product_id in product_ids}
+    tiers = TieredPricing.objects.filter(product_id__in=product_ids).values_list(
+        'product_id', 'min_quantity', 'max_quantity', 'price_per_unit', 'label',
+    )
+    for product_id, min_quantity, max_quantity, price, label in tiers:
+        rows[product_id].append(Tier(min_quantity, max_quantity, price, label))
+    return {product_id: PriceLadder(product_id, tiers) for product_id, tiers in rows.items()}
+
+
+def get_price_ladders(product_ids):
+    """Return {product_id: PriceLadder}, using one cache round trip and at most one query"""
+    now = time.monotonic()
+    ladders = {}
+    missing = []
+    for product_id in set(product_ids):
+        entry = _local_ladders.get(product_id)
+        if entry and entry[0] > now:
+            ladders[product_id] = entry[1]
+        else:
+            missing.append(product_id)
+
+    if missing:
+        keys = {PRICE_LADDER_KEY.format(product_id): product_id for product_id in missing}
+        for key, ladder in cache.get_many(list(keys)).items():
+            ladders[keys[key]] = ladder
+        unbuilt = [product_id for product_id in missing if product_id not in ladders]
+        if unbuilt:
+            built = _build_price_ladders(unbuilt)
+            cache.set_many(
+                {PRICE_LADDER_KEY.format(product_id): ladder for product_id, ladder in built.items()},
+                SHARED_LADDER_TIMEOUT,
+            )
+            ladders.update(built)
+        expires = now + LOCAL_LADDER_TIMEOUT
+        for product_id in missing:
+            _local_ladders[product_id] = (expires, ladders[product_id])
+
+    return ladders
+
+
+def get_price_ladder(product_id):
+    return get_price_ladders([product_id])[product_id]
+
+
+def invalidate_price_ladder(product_id):
+    """Drop a product's compiled ladder from the local and shared caches"""
+    _local_ladders.pop(product_id, None)
+    cache.delete(PRICE_LADDER_KEY.format(product_id))
+
+
+def cart_items_queryset(cart):
+    """Cart items with their products and categories preloaded"""
+    return cart.items.select_related('product').prefetch_related(
+        'product__categories',
+    ).order_by('added_at', 'id')
+
+
+def guest_cart_items(lines):
+    """Unsaved cart items for a guest cart's {product_id: quantity} lines, in line order"""
+    if not lines:
+        return []
+    from .models import CartItem, Product
+    products = Product.objects.prefetch_related('categories').in_bulk(list(lines))
+    return [
+        CartItem(product=products[product_id], quantity=quantity)
+        for product_id, quantity in lines.items()
+        if product_id in products
+    ]
+
+
+class CartTotals:
+    """All cart totals computed once from a single prefetch of the cart items"""
+
+    def __init__(self, cart, items=None):
+        self.cart = cart
+        self.items = list(items if items is not None else cart_items_queryset(cart))
+
+        ladders = get_price_ladders([item.product_id for item in self.items])
+        for item in self.items:
+            item.product.price_ladder = ladders[item.product_id]
+
+        self.total_items = 0
+        self.subtotal = Decimal('0.00')
+        self.original_subtotal = Decimal('0.00')
+        self.total_savings = Decimal('0.00')
+        for item in self.items:
+            self.total_items += item.quantity
+            self.subtotal += item.total_price
+            self.original_subtotal += item.original_total
+            self.total_savings += item.total_savings
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def get_item(self, product_id):
+        """Return the loaded cart item for the given product, or None"""
+        product_id = int(product_id)
+        for item in self.items:
+            if item.product_id == product_id:
+                return item
+        return None
+
+    @property
+    def is_empty(self):
+        return self.total_items == 0
+
+    @property
+    def total(self):
+        return self.subtotal
+
+    @property
+    def has_savings(self):
+        return self.total_savings > 0
+
+    @property
+    def savings_percentage(self):
+        if self.original_subtotal > 0:
+            return int((self.total_savings / self.original_subtotal) * 100)
+        return 0
+
+    @property
+    def shipping_progress(self):
+        threshold = self.cart.FREE_SHIPPING_THRESHOLD
+        if self.subtotal >= threshold:
+            return 100
+        return int((self.subtotal / threshold) * 100)
+
+    @property
+    def amount_to_free_shipping(self):
+        remaining = self.cart.FREE_SHIPPING_THRESHOLD - self.subtotal
+        return max(Decimal('0.00'), remaining)
+
+    def get_shipping_estimate(self):
+        """Flat-rate shipping estimate based on the subtotal"""
+        if self.subtotal >= self.cart.FREE_SHIPPING_THRESHOLD:
+            return Decimal('0.00')
+        if self.subtotal >= Decimal('500.00'):
+            return Decimal('29.99')
+        elif self.subtotal >= Decimal('200.00'):
+            return Decimal('49.99')
+        return Decimal('79.99')
+
+    def get_tax_rate(self, province='ON'):
+        rates = self.cart.TAX_RATES
+        return rates.get((province or 'ON').upper(), rates.get('ON', Decimal('0.13')))
+
+    def get_estimated_tax(self, province='ON'):
+        return (self.subtotal * self.get_tax_rate(province)).quantize(Decimal('0.01'))
+
+    def get_total_with_tax(self, province='ON'):
+        return self.subtotal + self.get_estimated_tax(province) + self.get_shipping_estimate()
@@ -0,0 +1,193 @@
+"""
+Product detail read model.
+
+ProductDetailBundle loads everything the product page shows - the product,
+its category, gallery images, variants, approved reviews, industries, use
+cases, tier prices and related products - in a fixed number of queries, and
+serializes it into plain dicts and lists that the template reads directly.
+
+The serialized bundle is cached under the category and product slugs with the
+versions of the catalog and product cache tags, so it is served without any
+queries until one of the rows it was built from changes (see core.signals).
+Both versions are read before the rows they cover are loaded.
+"""
+from django.db.models import Prefetch, prefetch_related_objects
+from . import caching
+from .facets import get_facet_index
+from .models import (
+    Product, ProductCategory, ProductImage, ProductIndustry, ProductReview, ProductUseCase, ProductVariant,
+)
+from .pricing import get_price_ladder
+
+BUNDLE_KEY = 'product:detail:{}:{}'
+RELATED_LIMIT = 4
+
+# Product columns copied into the bundle as-is
+PRODUCT_FIELDS = [
+    'id', 'title', 'slug', 'description', 'sku', 'price', 'compare_at_price', 'price_per', 'price_range',
+    'size', 'gsm', 'color', 'handle_type', 'minimum_order', 'case_quantity', 'stock_quantity',
+    'track_inventory', 'allow_backorder', 'meta_title', 'meta_description', 'schema_type',
+]
+
+
+def _image(field):
+    """{'url', 'name'} for an image field value, or None when it is empty"""
+    if not field:
+        return None
+    return {'url': field.url, 'name': field.name}
+
+
+def _price_range(listing):
+    if listing.min_price is None:
+        return ''
+    if listing.max_price is not None and listing.max_price != listing.min_price:
+        return f'${listing.min_price} - ${listing.max_price}'
+    return f'${listing.min_price}'
+
+
+class ProductDetailBundle:
+    """Loader and cache for the serialized product page"""
+
+    def __init__(self, category_slug, product_slug):
+        self.category_slug = category_slug
+        self.product_slug = product_slug
+        self.versions = {}  # tag versions of the bundle get() returned
+
+    @property
+    def cache_key(self):
+        return BUNDLE_KEY.format(self.category_slug, self.product_slug)
+
+    def get(self):
+        """The cached bundle, rebuilt if missing or stale; None if the product is not shown"""
+        entry = caching.get_tagged_entry(self.cache_key)
+        if entry is not None:
+            self.versions, bundle = entry
+            return bundle
+        versions = caching.get_tag_versions([caching.CATALOG])
+        bundle = self.build(versions)
+        if bundle is not None:
+            caching.set_tagged(
+                self.cache_key, bundle, [caching.CATALOG, caching.product_tag(bundle['product']['id'])],
+                versions=versions,
+            )
+            self.versions = versions
+        return bundle
+
+    def queryset(self, category):
+        return Product.objects.filter(slug=self.product_slug, is_active=True, categories=category)
+
+    def prefetches(self):
+        return [
+            Prefetch('additional_images', queryset=ProductImage.objects.filter(is_active=True), to_attr='active_images'),
+            Prefetch('variants', queryset=ProductVariant.objects.filter(is_active=True).order_by('order'), to_attr='active_variants'),
+            Prefetch(
+                'reviews',
+                queryset=ProductReview.objects.filter(is_approved=True).order_by('-created_at'),
+                to_attr='approved_reviews',
+            ),
+            Prefetch(
+                'product_industries',
+                queryset=ProductIndustry.objects.select_related('industry'),
+                to_attr='industry_links',
+            ),
+            Prefetch(
+                'product_use_cases',
+                queryset=ProductUseCase.objects.filter(is_enabled=True, use_case__is_active=True)
+                .select_related('use_case').order_by('order', 'use_case__order'),
+                to_attr='enabled_use_cases',
+            ),
+        ]
+
+    def build(self, versions=None):
+        """
+        Load and serialize the bundle from the database.
+
+        The product tag's version is added to versions, when given, once the
+        product is known and before its related rows are loaded.
+        """
+        category = ProductCategory.objects.filter(slug=self.category_slug, is_active=True).first()
+        if category is None:
+            return None
+        product = self.queryset(category).first()
+        if product is None:
+            return None
+        if versions is not None:
+            versions.update(caching.get_tag_versions([caching.product_tag(product.pk)]))
+        prefetch_related_objects([product], *self.prefetches())
+
+        data = {field: getattr(product, field) for field in PRODUCT_FIELDS}
+        data.update({
+            'image': _image(product.image),
+            'category': {'title': category.title, 'slug': category.slug},
+            'average_rating': product.average_rating,
+            'review_count': product.review_count,
+            'discount_percentage': product.discount_percentage,
+            'is_in_stock': product.is_in_stock,
+        })
+
+        images = []
+        if product.image:
+            images.append({'url': product.image.url, 'alt': product.title, 'is_main': True})
+        for img in product.active_images:
+            images.append({'url': img.image.url, 'alt': img.alt_text or product.title, 'is_main': False})
+
+        variants = {'size': [], 'color': []}
+        for variant in product.active_variants:
+            variants.setdefault(variant.variant_type, []).append({
+                'id': variant.pk,
+                'name': variant.name,
+                'value': variant.value,
+                'price_adjustment': variant.price_adjustment,
+                'image': _image(variant.image),
+            })
+
+        return {
+            'product': data,
+            'images': images,
+            'specifications': product.get_specifications(),
+            'features': product.get_features(),
+            'tiered_prices': [tier._asdict() for tier in get_price_ladder(product.pk).tiers],
+            'size_variants': variants['size'],
+            'color_variants': variants['color'],
+            'reviews': [
+                {
+                    'name': review.name,
+                    'rating': review.rating,
+                    'title': review.title,
+                    'review': review.review,
+                    'image': _image(review.image),
+                    'is_verified': review.is_verified,
+                    'created_at': review.created_at,
+                }
+                for review in product.approved_reviews
+            ],
+            'product_industries': [
+                {'industry': {'title': link.industry.title, 'url': link.industry.url}}
+                for link in product.industry_links
+            ],
+            'use_cases': [
+                {
+                    'title': link.use_case.title,
+                    'description': link.use_case.description,
+                    'icon_name': link.use_case.icon_name,
+                }
+                for link in product.enabled_use_cases
+            ],
+            'related_products': self.related_products(category, product.pk),
+        }
+
+    def related_products(self, category, product_id):
+        """Other listings of the category's subtree, read through the facet index"""
+        index = get_facet_index()
+        listings, _ = index.page(index.value_bits('category', category.slug), per_page=RELATED_LIMIT + 1)
+        return [
+            {
+                'title': listing.title,
+                'slug': listing.slug,
+                'category': {'slug': listing.category_slug},
+                'image': listing.image_name,
+                'price': listing.price,
+                'price_range': _price_range(listing),
+            }
+            for listing in listings if listing.product_id != product_id
+        ][:RELATED_LIMIT]
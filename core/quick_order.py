@@ -0,0 +1,151 @@
+"""
+Quick order: SKU lists pasted or uploaded as CSV.
+
+parse_quick_order() reads `sku,quantity` rows one line at a time from any
+iterable of text lines, so an uploaded file is streamed rather than read
+whole. Commas and tabs (a range pasted from a spreadsheet) both separate the
+columns; blank lines, # comments and a header row are skipped.
+
+SKUs resolve through SkuIndex, a dict of every active product's SKU and every
+active variant's full SKU (product SKU plus suffix) to its product. It is
+built in two queries, kept per process and rebuilt only after the skus cache
+tag is bumped (core.signals), so thousands of lines cost dict lookups. Cart
+lines are per product, so a variant SKU orders its product.
+
+plan_quick_order() then checks every product once - price, minimum order,
+stock and the tier the combined quantity lands in - with one product query and
+one price ladder lookup, and returns the cart quantities to write together
+with a report line per input row.
+"""
+import csv
+from . import caching
+from .carts import line_quantity_error
+from .models import Product, ProductVariant
+from .pricing import get_price_ladders
+
+MAX_QUICK_ORDER_LINES = 5000
+HEADER_SKUS = {'SKU', 'ITEM', 'PRODUCT', 'PART', 'CODE'}
+
+
+def normalize_sku(sku):
+    return sku.strip().upper()
+
+
+class SkuIndex:
+    """{normalized SKU: (product_id, variant name)} for active products and variants"""
+
+    def __init__(self, products, variants):
+        self.skus = {}
+        for product_id, sku, suffix, name in variants:
+            if sku and suffix:
+                self.skus[normalize_sku(f'{sku}-{suffix}')] = (product_id, name)
+        # A product's own SKU wins over a variant that happens to share it
+        for product_id, sku in products:
+            if sku:
+                self.skus[normalize_sku(sku)] = (product_id, '')
+
+    def __len__(self):
+        return len(self.skus)
+
+    def get(self, sku):
+        return self.skus.get(normalize_sku(sku))
+
+
+_sku_index = (None, None)
+
+
+def get_sku_index():
+    """The process-local SkuIndex, rebuilt when a product or variant changed since it was built"""
+    global _sku_index
+    version = caching.get_tag_versions([caching.SKUS])[caching.SKUS]
+    built_for, index = _sku_index
+    if index is None or built_for != version:
+        index = SkuIndex(
+            Product.objects.filter(is_active=True).exclude(sku='').values_list('pk', 'sku'),
+            ProductVariant.objects.filter(is_active=True, product__is_active=True).exclude(sku_suffix='')
+            .values_list('product_id', 'product__sku', 'sku_suffix', 'name'),
+        )
+        _sku_index = (version, index)
+    return index
+
+
+def parse_quick_order(lines):
+    """
+    Yield (line number, sku, quantity or None) for each row.
+
+    The quantity is None when it is missing or not a whole number; a first
+    row that looks like a header is skipped.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        row = next(csv.reader([line], delimiter='\t' if '\t' in line else ','), [])
+        sku = row[0].strip() if row else ''
+        raw_quantity = row[1].strip().replace(',', '') if len(row) > 1 else ''
+        try:
+            quantity = int(raw_quantity)
+        except ValueError:
+            quantity = None
+        if number == 1 and quantity is None and normalize_sku(sku) in HEADER_SKUS:
+            continue
+        yield number, sku, quantity
+
+
+def plan_quick_order(rows, current_lines, max_lines=MAX_QUICK_ORDER_LINES):
+    """
+    Resolve parsed rows against the catalog and the cart's current lines.
+
+    Returns ({product_id: new cart quantity}, report). Rows for the same
+    product are added together (and to what the cart already holds) before
+    validation, so every product is checked once at its final quantity; all
+    rows of a product that fails are reported with the reason.
+    """
+    index = get_sku_index()
+    report = []
+    added = {}  # product_id: quantity from this order
+    for number, sku, quantity in rows:
+        entry = {'line': number, 'sku': sku, 'quantity': quantity}
+        report.append(entry)
+        if len(report) > max_lines:
+            entry['error'] = f'Quick orders are limited to {max_lines} lines.'
+            break
+        match = index.get(sku) if sku else None
+        if match is None:
+            entry['error'] = 'Unknown SKU.' if sku else 'Missing SKU.'
+        elif quantity is None or quantity < 1:
+            entry['error'] = 'Quantity must be a whole number of at least 1.'
+        else:
+            entry['product_id'], variant = match
+            if variant:
+                entry['variant'] = variant
+            added[entry['product_id']] = added.get(entry['product_id'], 0) + quantity
+
+    products = Product.objects.in_bulk(list(added))
+    ladders = get_price_ladders(list(added))
+    quantities, errors = {}, {}
+    for product_id, quantity in added.items():
+        product = products.get(product_id)
+        total = current_lines.get(product_id, 0) + quantity
+        error = line_quantity_error(product, total) if product else 'Product not found.'
+        if error:
+            errors[product_id] = error
+        else:
+            quantities[product_id] = total
+
+    for entry in report:
+        product_id = entry.get('product_id')
+        if product_id is None:
+            continue
+        if product_id in errors:
+            entry['error'] = errors[product_id]
+            continue
+        product = products[product_id]
+        tier = ladders[product_id].tier_for(quantities[product_id])
+        entry.update(
+            title=product.title,
+            cart_quantity=quantities[product_id],
+            unit_price=str(tier.price_per_unit if tier else product.price),
+            tier=(tier.label or '') if tier else '',
+        )
+    return quantities, report
@@ -0,0 +1,305 @@
+"""
+Product search.
+
+Search runs over the ProductListing read model (core.listings). Each listing
+stores two normalized token strings:
+- search_primary: title, size and search keywords (weighted higher),
+- search_secondary: GSM, color, tags, category titles and description.
+
+Normalization makes spellings of the same spec compare equal, e.g.
+'10" x 12 x 5', '10×12×5' and '10x12x5' all become the token '10x12x5', and
+'120 GSM' becomes '120gsm'.
+
+Every query token is expanded against the catalog vocabulary before lookup:
+exact terms, prefixes (for autocomplete), sizes typed without separators
+('10125' finds '10x12x5') and single-edit typos (via a deletion index), so
+both backends only ever look up terms that exist.
+
+On PostgreSQL the expanded terms become a tsquery against the GIN-indexed
+search_vector column and are ordered by SearchRank. Both the vector and the
+query are cast from the normalized tokens as-is, so PostgreSQL's own parser
+never re-splits a size like '10.5x12'. Elsewhere (SQLite in
+development) the in-process TokenIndex answers the query from its postings.
+The vocabulary/index is built once per process and follows the listings
+cache tag: after refresh_listings() bumps it for some products, only those
+listings are reloaded and their terms patched into a copy of the index; a
+full refresh or an incomplete change log rebuilds it (see
+caching.changed_since()).
+"""
+import copy
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+from django.contrib.postgres.search import SearchQueryField, SearchRank, SearchVectorField
+from django.db import connection
+from django.db.models import BooleanField, F, Func, Value
+from django.db.models.functions import Cast
+from . import caching
+from .models import ProductListing
+
+PRIMARY_WEIGHT = 3
+SECONDARY_WEIGHT = 1
+
+# How much an expanded term counts compared with the token as typed
+EXACT = 1.0
+SIZE_MATCH = 0.9
+PREFIX_MATCH = 0.7
+TYPO_MATCH = 0.5
+
+MIN_TYPO_LENGTH = 4
+MAX_PREFIX_TERMS = 50
+
+STOPWORDS = frozenset(['a', 'an', 'and', 'for', 'of', 'the', 'to', 'with'])
+
+_INCH_MARKS = re.compile(r'(?<=\d)\s*(?:"|″|”|inches|inch|in\b)')
+_SIZE_SEPARATOR = re.compile(r'(?<=\d)\s*(?:x|×|\*|by)\s*(?=\d)')
+_GSM = re.compile(r'(?<=\d)\s*gsm\b')
+_TOKEN = re.compile(r'[a-z0-9]+(?:\.[0-9]+[a-z0-9]*)*')
+_SIZE = re.compile(r'^\d+(?:\.\d+)?(?:x\d+(?:\.\d+)?)+$')
+
+
+def normalize(text):
+    """Lowercase text with sizes and GSM written one canonical way"""
+    text = (text or '').lower()
+    text = _INCH_MARKS.sub('', text)
+    text = _SIZE_SEPARATOR.sub('x', text)
+    return _GSM.sub('gsm', text)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(normalize(text)) if token not in STOPWORDS]
+
+
+def size_key(token):
+    """Digits of a size token ('10x12x5' -> '10125'), so missing separators still match"""
+    return token.replace('x', '').replace('.', '') if _SIZE.match(token) else None
+
+
+def _deletes(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _term_weights(primary, secondary):
+    """{term: weight} of a listing, each term at its highest weight"""
+    weights = {}
+    for weight, text in ((PRIMARY_WEIGHT, primary), (SECONDARY_WEIGHT, secondary)):
+        for term in text.split():
+            if weights.get(term, 0) < weight:
+                weights[term] = weight
+    return weights
+
+
+def _vocabulary_keys(term):
+    """(table, key) pairs a term is filed under for size and typo expansion"""
+    key = size_key(term)
+    if key:
+        yield 'size_terms', key
+    if len(term) >= MIN_TYPO_LENGTH:
+        for deleted in _deletes(term):
+            yield 'deletions', deleted
+
+
+def search_document(product, categories, tags):
+    """(primary, secondary) token strings for a product's listing row"""
+    primary = [product.title, product.size, product.search_keywords.replace(',', ' ')]
+    secondary = [product.gsm, product.color, product.description]
+    secondary += [tag.name for tag in tags]
+    secondary += [category.title for category in categories]
+    return ' '.join(tokenize(' '.join(primary))), ' '.join(tokenize(' '.join(secondary)))
+
+
+class TokenIndex:
+    """Inverted index over listing search text, with vocabulary helpers for query expansion"""
+
+    def __init__(self, rows):
+        postings = defaultdict(dict)
+        self.documents = {}  # product id: its terms, to withdraw them when the listing changes
+        for product_id, primary, secondary in rows:
+            weights = _term_weights(primary, secondary)
+            self.documents[product_id] = tuple(weights)
+            for term, weight in weights.items():
+                postings[term][product_id] = weight
+        self.postings = dict(postings)
+        self.terms = sorted(self.postings)
+
+        self.size_terms = defaultdict(set)
+        self.deletions = defaultdict(set)
+        for term in self.terms:
+            for table, key in _vocabulary_keys(term):
+                getattr(self, table)[key].add(term)
+
+    def patched(self, product_ids, rows):
+        """
+        A copy with the postings of product_ids replaced by rows' search text.
+
+        Products missing from rows (no longer listed) are dropped. Postings
+        and vocabulary entries are copied only where a changed listing
+        touches them, so the index in use is left untouched for other threads.
+        """
+        index = copy.copy(self)
+        index.postings, index.documents = dict(self.postings), dict(self.documents)
+        index.size_terms, index.deletions = self.size_terms.copy(), self.deletions.copy()
+        touched = set()
+
+        def postings_for(term):
+            if term not in touched:
+                index.postings[term] = dict(index.postings.get(term, {}))
+                touched.add(term)
+            return index.postings[term]
+
+        for product_id in product_ids:
+            for term in index.documents.pop(product_id, ()):
+                del postings_for(term)[product_id]
+        for product_id, primary, secondary in rows:
+            weights = _term_weights(primary, secondary)
+            index.documents[product_id] = tuple(weights)
+            for term, weight in weights.items():
+                postings_for(term)[product_id] = weight
+
+        removed = {term for term in touched if not index.postings[term]}
+        added = {term for term in touched - removed if term not in self.postings}
+        if removed:
+            index.terms = [term for term in self.terms if term not in removed]
+        elif added:
+            index.terms = list(self.terms)
+        for term in removed:
+            del index.postings[term]
+            for table, key in _vocabulary_keys(term):
+                entries = getattr(index, table)
+                remaining = entries[key] - {term}
+                if remaining:
+                    entries[key] = remaining
+                else:
+                    del entries[key]
+        for term in added:
+            insort(index.terms, term)
+            for table, key in _vocabulary_keys(term):
+                entries = getattr(index, table)
+                entries[key] = entries.get(key, set()) | {term}
+        return index
+
+    def prefixed(self, prefix):
+        start = bisect_left(self.terms, prefix)
+        matches = []
+        for term in self.terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def expand(self, token, prefix=False):
+        """{term: factor} of vocabulary terms the token should match"""
+        expanded = {}
+
+        def add(term, factor):
+            if expanded.get(term, 0) < factor:
+                expanded[term] = factor
+
+        if token in self.postings:
+            add(token, EXACT)
+        key = size_key(token) or (token if token.isdigit() else None)
+        if key:
+            for term in self.size_terms.get(key, ()):
+                add(term, SIZE_MATCH)
+        if prefix:
+            for term in self.prefixed(token):
+                add(term, PREFIX_MATCH)
+        if not expanded and len(token) >= MIN_TYPO_LENGTH:
+            # One insertion, deletion or substitution away
+            candidates = set(self.deletions.get(token, ()))
+            for deleted in _deletes(token):
+                candidates |= self.deletions.get(deleted, set())
+                if deleted in self.postings:
+                    candidates.add(deleted)
+            for term in candidates:
+                add(term, TYPO_MATCH)
+        return expanded
+
+    def expand_query(self, query, prefix=False):
+        """Expansions for each query token; the last token is completed as a prefix when asked"""
+        tokens = tokenize(query)
+        return [self.expand(token, prefix=prefix and i == len(tokens) - 1) for i, token in enumerate(tokens)]
+
+    def search(self, expansions):
+        """[(product_id, score)] for products matching every token, best first"""
+        scores = None
+        for expanded in expansions:
+            token_scores = defaultdict(float)
+            for term, factor in expanded.items():
+                for product_id, weight in self.postings[term].items():
+                    token_scores[product_id] = max(token_scores[product_id], weight * factor)
+            if scores is None:
+                scores = dict(token_scores)
+            else:
+                scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+            if not scores:
+                return []
+        return sorted((scores or {}).items(), key=lambda item: -item[1])
+
+
+_index = (None, None)
+
+
+def get_index():
+    """The process-local TokenIndex, patched or rebuilt when the listings have changed since it was built"""
+    global _index
+    version = caching.get_tag_versions([caching.LISTINGS])[caching.LISTINGS]
+    built_for, index = _index
+    if index is None or built_for != version:
+        rows = ProductListing.objects.values_list('product_id', 'search_primary', 'search_secondary')
+        changed = caching.changed_since(caching.LISTINGS, built_for, version) if index is not None else None
+        if changed is not None:
+            index = index.patched(changed, rows.filter(product_id__in=changed))
+        else:
+            index = TokenIndex(rows)
+        _index = (version, index)
+    return index
+
+
+def uses_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+class Matches(Func):
+    """tsvector @@ tsquery"""
+    arg_joiner = ' @@ '
+    template = '%(expressions)s'
+    output_field = BooleanField()
+
+
+def _weighted(field, weight):
+    return Func(Cast(field, SearchVectorField()), Value(weight), function='setweight', output_field=SearchVectorField())
+
+
+def search_vector():
+    """Expression for ProductListing.search_vector, built from the stored tokens"""
+    return Func(
+        _weighted('search_primary', 'A'), _weighted('search_secondary', 'B'),
+        arg_joiner=' || ', template='(%(expressions)s)', output_field=SearchVectorField(),
+    )
+
+
+def _tsquery(expansions):
+    """tsquery where every token must match one of its (vocabulary-only) expansions"""
+    groups = ['(' + ' | '.join(f"'{term}'" for term in sorted(expanded)) + ')' for expanded in expansions]
+    return Cast(Value(' & '.join(groups)), SearchQueryField())
+
+
+def search_products(query, limit=20, prefix=False):
+    """Listings matching the query, best match first"""
+    index = get_index()
+    expansions = index.expand_query(query, prefix=prefix)
+    if not expansions or not all(expansions):
+        return []
+
+    if uses_postgres_search():
+        search_query = _tsquery(expansions)
+        return list(
+            ProductListing.objects.filter(Matches(F('search_vector'), search_query))
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', 'order', 'title')[:limit]
+        )
+
+    ranked = index.search(expansions)[:limit]
+    listings = ProductListing.objects.in_bulk([product_id for product_id, score in ranked])
+    return [listings[product_id] for product_id, score in ranked if product_id in listings]
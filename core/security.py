@@ -120,6 +120,14 @@ def ratelimit_search(view_func):
     return ratelimit(key='ip', rate='20/m', method='GET', block=True)(view_func)
 
 
+def ratelimit_search_suggest(view_func):
+    """
+    Rate limit search-as-you-type suggestions.
+    60 requests per minute per IP (one per pause while typing).
+    """
+    return ratelimit(key='ip', rate='60/m', method='GET', block=True)(view_func)
+
+
 def handle_ratelimit(view_func):
     """
     Decorator to handle rate limit exceptions gracefully.
@@ -0,0 +1,233 @@
+"""
+Model signal handlers for the core app.
+Keeps derived and cached data in sync with the rows it is built from, and
+moves a guest's cart into the database when they sign in.
+"""
+from functools import partial
+from allauth.socialaccount.models import SocialApp
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from . import caching
+from .carts import promote_guest_cart
+from .models import (
+    FAQ, Industry, MenuItem, Product, ProductCategory, ProductImage, ProductIndustry, ProductReview,
+    ProductUseCase, ProductVariant, Service, Tag, TieredPricing, UseCase,
+)
+from .images import generate_derivatives_on_commit, image_changed, remember_stored_image
+from .listings import category_product_ids, industry_product_ids, refresh_listings_on_commit
+from .pricing import invalidate_price_ladder
+
+
+@receiver(post_save, sender=TieredPricing)
+@receiver(post_delete, sender=TieredPricing)
+def tiered_pricing_changed(sender, instance, **kwargs):
+    """Recompile the product's price ladder when one of its tiers changes"""
+    transaction.on_commit(partial(invalidate_price_ladder, instance.product_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_pricing_changed(sender, instance, **kwargs):
+    """Drop any ladder cached under this product id"""
+    transaction.on_commit(partial(invalidate_price_ladder, instance.pk))
+
+
+@receiver(pre_save, sender=ProductReview)
+def review_remember_product(sender, instance, **kwargs):
+    """Note the product a review belonged to before this save, in case it moves"""
+    instance._previous_product_id = None
+    if instance.pk:
+        instance._previous_product_id = (
+            sender.objects.filter(pk=instance.pk).values_list('product_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def review_changed(sender, instance, **kwargs):
+    """Recompute the stored rating aggregates of the affected product(s)"""
+    product_ids = {instance.product_id}
+    previous = getattr(instance, '_previous_product_id', None)
+    if previous:
+        product_ids.add(previous)
+    Product.refresh_review_stats(product_ids)
+    refresh_listings_on_commit(product_ids)
+    caching.bump_tags_on_commit(*(caching.product_tag(pk) for pk in product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    refresh_listings_on_commit([instance.pk])
+    caching.bump_tags_on_commit(caching.CATALOG, caching.product_tag(instance.pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def sku_changed(sender, instance, **kwargs):
+    """Rebuild the quick-order SKU index (core.quick_order) on next use"""
+    caching.bump_tags_on_commit(caching.SKUS)
+
+
+@receiver(post_save, sender=TieredPricing)
+@receiver(post_delete, sender=TieredPricing)
+def tiered_pricing_cache_changed(sender, instance, **kwargs):
+    refresh_listings_on_commit([instance.product_id])
+    caching.bump_tags_on_commit(caching.CATALOG, caching.product_tag(instance.product_id))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductIndustry)
+@receiver(post_delete, sender=ProductIndustry)
+@receiver(post_save, sender=ProductUseCase)
+@receiver(post_delete, sender=ProductUseCase)
+def product_detail_changed(sender, instance, **kwargs):
+    """Rows shown only on a product's own page"""
+    caching.bump_tags_on_commit(caching.product_tag(instance.product_id))
+
+
+@receiver(post_save, sender=ProductIndustry)
+@receiver(post_delete, sender=ProductIndustry)
+@receiver(post_save, sender=ProductUseCase)
+@receiver(post_delete, sender=ProductUseCase)
+def product_facets_changed(sender, instance, **kwargs):
+    """Industry and use case links are listing facets"""
+    refresh_listings_on_commit([instance.product_id])
+    caching.bump_tags_on_commit(caching.CATALOG)
+
+
+@receiver(post_save, sender=UseCase)
+@receiver(post_delete, sender=UseCase)
+def use_case_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.CATALOG)
+
+
+@receiver(post_save, sender=UseCase)
+@receiver(pre_delete, sender=UseCase)
+def use_case_listings_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        refresh_listings_on_commit(instance.use_case_products.values_list('product_id', flat=True))
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.SERVICES)
+
+
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def faq_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.FAQ)
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def category_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.CATALOG, caching.CATEGORIES)
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(pre_delete, sender=ProductCategory)
+def category_listings_changed(sender, instance, created=False, **kwargs):
+    """Listings show the primary category; product links are already gone by post_delete"""
+    # A new category has no products yet (and no path to match a subtree with)
+    if not created and instance.path:
+        refresh_listings_on_commit(category_product_ids(instance))
+
+
+@receiver(post_save, sender=Industry)
+@receiver(post_delete, sender=Industry)
+def industry_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.CATALOG, caching.INDUSTRIES)
+
+
+@receiver(post_save, sender=Industry)
+@receiver(pre_delete, sender=Industry)
+def industry_listings_changed(sender, instance, created=False, **kwargs):
+    """Industry facets include ancestors, so the whole subtree's products are affected"""
+    if not created and instance.path:
+        refresh_listings_on_commit(industry_product_ids(instance))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.CATALOG, caching.TAGS)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_listings_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        refresh_listings_on_commit(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.MENU)
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Product <-> category/tag links changed, from either side of the relation"""
+    if reverse and action == 'pre_clear':
+        # Clearing from the category/tag side does not report which products were linked
+        product_ids = list(instance.products.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse and action == 'post_clear':
+            return
+        product_ids = pk_set if reverse else [instance.pk]
+    else:
+        return
+    refresh_listings_on_commit(product_ids)
+    caching.bump_tags_on_commit(caching.CATALOG, *(caching.product_tag(pk) for pk in product_ids))
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=ProductVariant)
+@receiver(pre_save, sender=ProductCategory)
+@receiver(pre_save, sender=Industry)
+def image_remember_stored(sender, instance, update_fields=None, **kwargs):
+    remember_stored_image(sender, instance, 'image', update_fields)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_save, sender=Industry)
+def image_uploaded(sender, instance, update_fields=None, **kwargs):
+    """Render responsive derivatives of a new or replaced image once it is committed"""
+    if not image_changed(instance, 'image', update_fields):
+        return
+    if sender is ProductCategory:
+        tags = [caching.CATEGORIES]
+    elif sender is Industry:
+        tags = [caching.INDUSTRIES]
+    else:
+        tags = [caching.product_tag(instance.pk if sender is Product else instance.product_id)]
+    generate_derivatives_on_commit(instance.image, tags)
+
+
+@receiver(post_save, sender=SocialApp)
+@receiver(post_delete, sender=SocialApp)
+def social_app_changed(sender, instance, **kwargs):
+    caching.bump_tags_on_commit(caching.OAUTH)
+
+
+@receiver(user_logged_in)
+def guest_cart_signed_in(sender, request, user, **kwargs):
+    """Keep what a guest put in their cart when they sign in"""
+    if request is not None:
+        promote_guest_cart(request)
@@ -1,94 +1,286 @@
-from django.http import HttpResponse
+"""
+sitemap.xml and robots.txt.
+
+The sitemap is built from sections (static pages, products, categories,
+industries, blog posts). Each section reads only the columns it prints,
+through values_list().iterator(), and the XML is streamed in chunks.
+
+While the site has at most MAX_URLS URLs, /sitemap.xml is a single urlset.
+Beyond that it becomes a sitemap index pointing at /sitemap-<section>.xml
+(with ?p=N pages for sections that are themselves over the limit).
+
+Every response carries an ETag and Last-Modified derived from each section's
+row count, latest updated_at and the versions of the cache tags it depends on
+(see core.caching), so unchanged sitemaps answer crawlers with a 304. The
+rendered XML is cached under the ETag, so a 200 for an unchanged sitemap does
+not query the rows either.
+"""
+import hashlib
+import math
+from xml.sax.saxutils import escape
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
-from core.models import Product
-from blog.models import Post
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from core import caching
+from core.models import Industry, Product, ProductCategory
+from blog.models import Post
+
+
+SITE_URL = 'https://packaxis.ca'
+MAX_URLS = 50000
+CHUNK_SIZE = 500
+SITEMAP_KEY = 'sitemap:{}'
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = '</urlset>'
+INDEX_OPEN = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_CLOSE = '</sitemapindex>'
+
+
+def url_entry(path, lastmod=None, changefreq=None, priority=None):
+    parts = [f'  <url>\n    <loc>{escape(SITE_URL + path)}</loc>\n']
+    if lastmod:
+        parts.append(f'    <lastmod>{lastmod.strftime("%Y-%m-%d")}</lastmod>\n')
+    if priority:
+        parts.append(f'    <priority>{priority}</priority>\n')
+    if changefreq:
+        parts.append(f'    <changefreq>{changefreq}</changefreq>\n')
+    parts.append('  </url>\n')
+    return ''.join(parts)
+
+
+class SitemapSection:
+    """A group of URLs read from one queryset"""
+    name = None
+    changefreq = 'monthly'
+    priority = '0.5'
+    tags = ()
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def rows(self):
+        """values_list() queryset whose first item is the path and last the lastmod"""
+        raise NotImplementedError
+
+    def path(self, row):
+        return row[0]
+
+    def state(self):
+        """(url count, latest updated_at, tag versions) - the section's cache validator"""
+        stats = self.queryset().aggregate(count=Count('pk'), last_modified=Max('updated_at'))
+        return stats['count'], stats['last_modified'], caching.get_tag_versions(self.tags)
+
+    def entries(self, page=1):
+        rows = self.rows()[(page - 1) * MAX_URLS:page * MAX_URLS]
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            path = self.path(row)
+            if path:
+                yield url_entry(path, row[-1], self.changefreq, self.priority)
+
+
+class StaticPagesSection(SitemapSection):
+    name = 'pages'
+    pages = [
+        ('/', '1.0', 'weekly'),
+        ('/products/', '0.9', 'weekly'),
+        ('/pricing-brochure/', '0.8', 'monthly'),
+        ('/faq/', '0.8', 'monthly'),
+        ('/blog/', '0.9', 'weekly'),
+        ('/quote/', '0.9', 'yearly'),
+        ('/privacy-policy/', '0.3', 'yearly'),
+        ('/terms-of-service/', '0.3', 'yearly'),
+    ]
+
+    def state(self):
+        return len(self.pages), None, {}
+
+    def entries(self, page=1):
+        for path, priority, changefreq in self.pages:
+            yield url_entry(path, changefreq=changefreq, priority=priority)
+
+
+class ProductSection(SitemapSection):
+    name = 'products'
+    priority = '0.8'
+    # Product URLs include a category slug, so category changes move them too
+    tags = (caching.CATALOG, caching.CATEGORIES)
+
+    def queryset(self):
+        return Product.objects.filter(is_active=True)
+
+    def rows(self):
+        first_category = (
+            ProductCategory.objects.filter(products=OuterRef('pk'), is_active=True)
+            .order_by('path').values('slug')[:1]
+        )
+        return (
+            self.queryset().annotate(category_slug=Subquery(first_category))
+            .order_by('pk').values_list('slug', 'category_slug', 'updated_at')
+        )
+
+    def path(self, row):
+        slug, category_slug, updated_at = row
+        if not category_slug:
+            return None
+        return f'/product/{category_slug}/{slug}/'
+
+
+class CategorySection(SitemapSection):
+    name = 'categories'
+    priority = '0.8'
+    changefreq = 'weekly'
+    tags = (caching.CATEGORIES,)
+
+    def queryset(self):
+        return ProductCategory.objects.filter(is_active=True)
+
+    def rows(self):
+        return self.queryset().order_by('path').values_list('slug', 'updated_at')
+
+    def path(self, row):
+        return f'/product/{row[0]}/'
+
+
+class IndustrySection(SitemapSection):
+    name = 'industries'
+    priority = '0.7'
+    tags = (caching.INDUSTRIES,)
+
+    def queryset(self):
+        return Industry.objects.filter(is_active=True)
+
+    def rows(self):
+        return self.queryset().order_by('path').values_list('url', 'updated_at')
+
+    def path(self, row):
+        url = row[0].strip()
+        if not url.startswith('/'):
+            return None
+        return url if url.endswith('/') else f'{url}/'
+
+
+class BlogSection(SitemapSection):
+    name = 'blog'
+    priority = '0.7'
+    tags = (caching.BLOG,)
+
+    def queryset(self):
+        return Post.objects.filter(status='published', publish_date__lte=timezone.now())
+
+    def rows(self):
+        return self.queryset().order_by('-publish_date').values_list('slug', 'updated_at')
+
+    def path(self, row):
+        return f'/blog/{row[0]}/'
+
+
+SECTIONS = {
+    section.name: section
+    for section in (StaticPagesSection(), ProductSection(), CategorySection(), IndustrySection(), BlogSection())
+}
+
+
+def _validators(*parts):
+    """(etag, last_modified) for a response built from the given section states"""
+    raw = repr([(name, count, last_modified, sorted(versions.items())) for name, count, last_modified, versions in parts])
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    dates = [last_modified for name, count, last_modified, versions in parts if last_modified]
+    return etag, max(dates) if dates else None
+
+
+def _chunked(pieces):
+    """Group the generated XML pieces so the stream is not one write per URL"""
+    buffer = []
+    for piece in pieces:
+        buffer.append(piece)
+        if len(buffer) >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _caching_stream(key, chunks):
+    """Yield the chunks, storing the complete document once the stream finishes"""
+    rendered = []
+    for chunk in chunks:
+        rendered.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(rendered), caching.DEFAULT_TIMEOUT)
+
+
+def _sitemap_response(request, etag, last_modified, build):
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if not_modified is not None:
+        return not_modified
+
+    key = SITEMAP_KEY.format(etag.strip('"'))
+    content = cache.get(key)
+    if content is not None:
+        response = HttpResponse(content, content_type='application/xml')
+    else:
+        response = StreamingHttpResponse(_caching_stream(key, _chunked(build())), content_type='application/xml')
+    response['ETag'] = etag
+    if last_modified_ts is not None:
+        response['Last-Modified'] = http_date(last_modified_ts)
+    return response
 
 
 def sitemap_view(request):
-    """Generate dynamic sitemap.xml"""
-    
-    # Build sitemap XML
-    xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml_content += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    
-    # Homepage
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/</loc>\n'
-    xml_content += '    <priority>1.0</priority>\n'
-    xml_content += '    <changefreq>weekly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    # Products page
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/products/</loc>\n'
-    xml_content += '    <priority>0.9</priority>\n'
-    xml_content += '    <changefreq>weekly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    # Individual products
-    products = Product.objects.filter(is_active=True)
-    for product in products:
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>https://packaxis.ca/product/{product.slug}/</loc>\n'
-        xml_content += '    <priority>0.8</priority>\n'
-        xml_content += '    <changefreq>monthly</changefreq>\n'
-        xml_content += '  </url>\n'
-    
-    # Pricing brochure
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/pricing-brochure/</loc>\n'
-    xml_content += '    <priority>0.8</priority>\n'
-    xml_content += '    <changefreq>monthly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    # FAQ
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/faq/</loc>\n'
-    xml_content += '    <priority>0.8</priority>\n'
-    xml_content += '    <changefreq>monthly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    # Blog
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/blog/</loc>\n'
-    xml_content += '    <priority>0.9</priority>\n'
-    xml_content += '    <changefreq>weekly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    # Blog posts
-    blog_posts = Post.objects.filter(status='published', publish_date__lte=timezone.now())
-    for post in blog_posts:
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>https://packaxis.ca/blog/{post.slug}/</loc>\n'
-        xml_content += f'    <lastmod>{post.updated_at.strftime("%Y-%m-%d")}</lastmod>\n'
-        xml_content += '    <priority>0.7</priority>\n'
-        xml_content += '    <changefreq>monthly</changefreq>\n'
-        xml_content += '  </url>\n'
-    
-    # Quote request
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/quote/</loc>\n'
-    xml_content += '    <priority>0.9</priority>\n'
-    xml_content += '    <changefreq>yearly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    # Privacy & Terms
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/privacy-policy/</loc>\n'
-    xml_content += '    <priority>0.3</priority>\n'
-    xml_content += '    <changefreq>yearly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    xml_content += '  <url>\n'
-    xml_content += '    <loc>https://packaxis.ca/terms-of-service/</loc>\n'
-    xml_content += '    <priority>0.3</priority>\n'
-    xml_content += '    <changefreq>yearly</changefreq>\n'
-    xml_content += '  </url>\n'
-    
-    xml_content += '</urlset>'
-    
-    return HttpResponse(xml_content, content_type='application/xml')
+    """Serve sitemap.xml: one urlset, or a sitemap index once there are more than MAX_URLS URLs"""
+    states = {name: section.state() for name, section in SECTIONS.items()}
+    total = sum(count for count, last_modified, versions in states.values())
+    etag, last_modified = _validators(*[(name, *state) for name, state in states.items()])
+
+    if total <= MAX_URLS:
+        def build():
+            yield XML_HEADER + URLSET_OPEN
+            for section in SECTIONS.values():
+                yield from section.entries()
+            yield URLSET_CLOSE
+    else:
+        def build():
+            yield XML_HEADER + INDEX_OPEN
+            for name, (count, section_modified, versions) in states.items():
+                location = SITE_URL + reverse('sitemap_section', kwargs={'section': name})
+                for page in range(1, max(math.ceil(count / MAX_URLS), 1) + 1):
+                    loc = location if page == 1 else f'{location}?p={page}'
+                    yield f'  <sitemap>\n    <loc>{escape(loc)}</loc>\n'
+                    if section_modified:
+                        yield f'    <lastmod>{section_modified.strftime("%Y-%m-%d")}</lastmod>\n'
+                    yield '  </sitemap>\n'
+            yield INDEX_CLOSE
+
+    return _sitemap_response(request, etag, last_modified, build)
+
+
+def sitemap_section_view(request, section):
+    """Serve one section's child sitemap (paged with ?p= when over MAX_URLS)"""
+    sitemap = SECTIONS.get(section)
+    if sitemap is None:
+        raise Http404('Unknown sitemap section')
+    try:
+        page = int(request.GET.get('p', 1))
+    except ValueError:
+        raise Http404('Invalid sitemap page')
+    count, last_modified, versions = sitemap.state()
+    if page < 1 or (page > 1 and (page - 1) * MAX_URLS >= count):
+        raise Http404('Sitemap page out of range')
+    etag, last_modified = _validators((f'{section}:{page}', count, last_modified, versions))
+
+    def build():
+        yield XML_HEADER + URLSET_OPEN
+        yield from sitemap.entries(page)
+        yield URLSET_CLOSE
+
+    return _sitemap_response(request, etag, last_modified, build)
 
 
 def robots_txt_view(request):
@@ -0,0 +1,55 @@
+"""
+Responsive image tags.
+
+    {% load images %}
+    {% responsive_image product.image product.title sizes="(max-width: 600px) 100vw, 280px" loading="lazy" %}
+
+renders a <picture> with AVIF and WebP sources and a JPEG/PNG <img>, each
+with a srcset of the renditions made by core.images. Extra keyword
+arguments become attributes of the <img>. Images without renditions yet
+render as a plain <img> of the original.
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from core.images import MIME_TYPES, MODERN_FORMATS, fallback_format, get_renditions, source_name, srcset, thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', **attrs):
+    source = source_name(image)
+    if not source:
+        return ''
+    renditions = get_renditions(source)
+    fallback = fallback_format(renditions)
+    if fallback not in renditions:
+        return format_html('<img src="{}" alt="{}"{}>', default_storage.url(source), alt, flatatt(attrs))
+
+    sources = [
+        format_html('<source type="{}" srcset="{}" sizes="{}">', MIME_TYPES[format_name], srcset(renditions, format_name), sizes)
+        for format_name, *_ in MODERN_FORMATS
+        if format_name in renditions
+    ]
+    largest = renditions[fallback][-1][1]
+    img = format_html(
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}>',
+        default_storage.url(largest), srcset(renditions, fallback), sizes, alt, flatatt(attrs),
+    )
+    # display: contents keeps the <img> laid out as if the <picture> were not there
+    return format_html('<picture style="display: contents;">{}{}</picture>', mark_safe(''.join(sources)), img)
+
+
+@register.simple_tag
+def image_srcset(image, format_name='webp'):
+    """srcset value for one format, e.g. for a CSS image-set() or a custom <source>"""
+    return srcset(get_renditions(image), format_name)
+
+
+@register.simple_tag
+def image_thumbnail(image, width=320):
+    """URL of a small rendition, for places that need a single src"""
+    return thumbnail_url(image, width)
@@ -2,11 +2,53 @@
 Unit tests for PackAxis core application.
 Tests critical flows: products, cart, checkout, contact.
 """
-from django.test import TestCase, Client
+from django.test import TestCase, AsyncClient, Client, override_settings
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.template import Context, Template
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
+from datetime import timedelta
 from decimal import Decimal
-from .models import ProductCategory, Product, Cart, CartItem, Order, Quote, FAQ, Industry
+from io import BytesIO, StringIO
+from PIL import Image
+import hashlib
+import hmac
+import json
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qsl
+from asgiref.sync import async_to_sync
+from .models import MenuItem, ProductCategory, Product, ProductReview, ProductVariant, Cart, CartItem, Order, OrderItem, Quote, FAQ, Industry, TieredPricing, OutboundEmail, StripeEvent, ProductListing, Tag, UseCase, ProductUseCase, ImageAsset
+from .orders import InsufficientStock, place_order
+from .pricing import CartTotals, PriceLadder, Tier, get_price_ladder
+from . import caching
+from .facets import FacetIndex, get_facet_index
+from .benchmarks import SCENARIOS, BenchmarkError
+from .carts import GUEST_CART_COOKIE
+from .cart_reaper import reap_carts_batch
+from .images import generate_derivatives, get_renditions
+from .instrumentation import QueryBudgetExceeded, RequestMetrics, check_query_budget, query_budget, reset_samples, snapshot
+from .listings import listing_page, refresh_listings
+from .mail import MAX_ATTEMPTS, queue_email, send_queued_batch
+from .payments import get_stripe_client
+from .product_detail import ProductDetailBundle
+from .search import TokenIndex, get_index, search_products, tokenize
+from .webhooks import process_stripe_events_batch, store_stripe_event
+from blog.view_counts import flush_view_counts
+from .views.checkout import send_order_confirmation_email, send_order_notification_email
 
 
 class ProductCategoryTestCase(TestCase):
@@ -349,6 +391,45 @@ class SEOTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/xml')
     
+    def test_sitemap_lists_products_under_category(self):
+        """Test product URLs are streamed with their category slug"""
+        category = ProductCategory.objects.create(title="Kraft Bags", slug="kraft-bags", is_active=True)
+        product = Product.objects.create(title="Flat Handle Bag", slug="flat-handle-bag", price=Decimal('1.00'), is_active=True)
+        product.categories.add(category)
+        response = self.client.get('/sitemap.xml')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('<loc>https://packaxis.ca/product/kraft-bags/flat-handle-bag/</loc>', content)
+        self.assertIn('<loc>https://packaxis.ca/product/kraft-bags/</loc>', content)
+        self.assertTrue(content.endswith('</urlset>'))
+    
+    def test_sitemap_conditional_get(self):
+        """Test an unchanged sitemap answers 304 and a catalog edit changes the ETag"""
+        cache.clear()
+        response = self.client.get('/sitemap.xml')
+        etag = response['ETag']
+        b''.join(response.streaming_content)
+        
+        self.assertEqual(self.client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cached = self.client.get('/sitemap.xml')
+        self.assertFalse(cached.streaming)
+        
+        ProductCategory.objects.create(title="New Category", slug="new-category", is_active=True)
+        response = self.client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_sitemap_index_over_url_limit(self):
+        """Test the sitemap becomes an index of section sitemaps past the URL limit"""
+        for i in range(3):
+            ProductCategory.objects.create(title=f"Category {i}", slug=f"category-{i}", is_active=True)
+        with patch('core.sitemaps.MAX_URLS', 2):
+            index = b''.join(self.client.get('/sitemap.xml').streaming_content).decode()
+            self.assertIn('<sitemapindex', index)
+            self.assertIn('https://packaxis.ca/sitemap-categories.xml?p=2', index)
+            page = self.client.get('/sitemap-categories.xml?p=2')
+            self.assertEqual(b''.join(page.streaming_content).decode().count('<url>'), 1)
+            self.assertEqual(self.client.get('/sitemap-categories.xml?p=3').status_code, 404)
+    
     def test_robots_txt_loads(self):
         """Test robots.txt loads"""
         response = self.client.get('/robots.txt')
@@ -396,3 +477,1702 @@ class OrderModelTestCase(TestCase):
         )
         self.assertIsNotNone(order.order_number)
         self.assertEqual(order.status, 'pending')
+
+
+class CartTotalsTestCase(TestCase):
+    """Tests for the single-prefetch cart totals engine"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.category = ProductCategory.objects.create(
+            title="Test Category",
+            slug="test-category",
+            is_active=True
+        )
+        self.products = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                product = Product.objects.create(
+                    title=f"Bulk Bag {i}",
+                    slug=f"bulk-bag-{i}",
+                    price=Decimal('1.00'),
+                    stock_quantity=10000,
+                    is_active=True
+                )
+                product.categories.add(self.category)
+                TieredPricing.objects.create(product=product, min_quantity=100, max_quantity=499, price_per_unit=Decimal('0.80'))
+                TieredPricing.objects.create(product=product, min_quantity=500, price_per_unit=Decimal('0.60'))
+                self.products.append(product)
+    
+    def _cart_with(self, quantities):
+        cart = Cart.objects.create(session_key=self.client.session.session_key)
+        for product, quantity in zip(self.products, quantities):
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return cart
+    
+    def test_totals_apply_tiers(self):
+        """Test totals use the matching tier for each quantity"""
+        cart = self._cart_with([10, 200, 600])
+        totals = CartTotals(cart)
+        self.assertEqual(totals.total_items, 810)
+        self.assertEqual(totals.subtotal, Decimal('10.00') + Decimal('160.00') + Decimal('360.00'))
+        self.assertEqual(totals.original_subtotal, Decimal('810.00'))
+        self.assertEqual(totals.total_savings, Decimal('280.00'))
+        self.assertTrue(totals.has_savings)
+        self.assertEqual(totals.get_shipping_estimate(), Decimal('29.99'))
+    
+    def test_totals_computed_in_fixed_queries(self):
+        """Test all cart numbers come from one prefetch regardless of item count"""
+        cart = self._cart_with([1, 150, 600, 20, 700])
+        cart = Cart.objects.get(pk=cart.pk)
+        with self.assertNumQueries(3):
+            cart.total_items
+            cart.subtotal
+            cart.original_subtotal
+            cart.savings_percentage
+            cart.shipping_progress
+            cart.amount_to_free_shipping
+            cart.get_total_with_tax('BC')
+            [item.applied_tier for item in cart.totals.items]
+    
+    def _add_to_cart(self, product, quantity):
+        self.client.post(
+            reverse('core:add_to_cart', kwargs={'slug': product.slug}), {'quantity': quantity},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+    
+    def test_cart_page_queries_do_not_grow_with_items(self):
+        """Test cart page query count is independent of the number of items"""
+        self.client.get(reverse('core:cart'))  # warm shared caches (menu, categories)
+        self._add_to_cart(self.products[0], 5)
+        with CaptureQueriesContext(connection) as one_item:
+            self.client.get(reverse('core:cart'))
+        
+        for product in self.products[1:]:
+            self._add_to_cart(product, 250)
+        with CaptureQueriesContext(connection) as five_items:
+            response = self.client.get(reverse('core:cart'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(one_item.captured_queries), len(five_items.captured_queries))
+    
+    def test_set_quantity_ajax_returns_tier_price(self):
+        """Test AJAX quantity change returns recalculated item and cart totals"""
+        self._add_to_cart(self.products[0], 10)
+        response = self.client.post(
+            reverse('core:set_cart_quantity_ajax', kwargs={'product_id': self.products[0].pk}),
+            {'quantity': 500}
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['item_total'], '300.00')
+        self.assertEqual(data['cart_total_items'], 500)
+
+
+class PriceLadderTestCase(TestCase):
+    """Tests for compiled tiered price ladders"""
+    
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                title="Ladder Bag",
+                slug="ladder-bag",
+                price=Decimal('1.00'),
+                is_active=True
+            )
+            TieredPricing.objects.create(product=self.product, min_quantity=500, price_per_unit=Decimal('0.60'))
+            TieredPricing.objects.create(product=self.product, min_quantity=100, max_quantity=299, price_per_unit=Decimal('0.80'))
+    
+    def test_bisect_lookup(self):
+        """Test quantities resolve to the right tier, honouring max_quantity gaps"""
+        ladder = PriceLadder(1, [
+            Tier(100, 299, Decimal('0.80'), ''),
+            Tier(500, None, Decimal('0.60'), 'Bulk'),
+        ])
+        self.assertIsNone(ladder.tier_for(99))
+        self.assertEqual(ladder.price_for(100), Decimal('0.80'))
+        self.assertEqual(ladder.price_for(299), Decimal('0.80'))
+        self.assertEqual(ladder.price_for(300, default=Decimal('1.00')), Decimal('1.00'))
+        self.assertEqual(ladder.tier_for(10000).label, 'Bulk')
+    
+    def test_cached_ladder_needs_no_queries(self):
+        """Test lookups after the first build do not touch the database"""
+        get_price_ladder(self.product.pk)
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(product.get_tiered_price(150), Decimal('0.80'))
+            self.assertEqual(product.get_tiered_price(50), Decimal('1.00'))
+    
+    def test_ladder_invalidated_on_tier_change(self):
+        """Test saving or deleting a tier recompiles the ladder"""
+        self.assertEqual(get_price_ladder(self.product.pk).price_for(600), Decimal('0.60'))
+        with self.captureOnCommitCallbacks(execute=True):
+            TieredPricing.objects.filter(min_quantity=500).get().delete()
+            TieredPricing.objects.create(product=self.product, min_quantity=300, price_per_unit=Decimal('0.70'))
+        self.assertEqual(get_price_ladder(self.product.pk).price_for(600), Decimal('0.70'))
+
+
+class ReviewAggregateTestCase(TestCase):
+    """Tests for denormalized review aggregates on Product"""
+    
+    def setUp(self):
+        self.product = Product.objects.create(
+            title="Rated Bag",
+            slug="rated-bag",
+            price=Decimal('1.00'),
+            is_active=True
+        )
+    
+    def add_review(self, rating, is_approved=True, product=None):
+        return ProductReview.objects.create(
+            product=product or self.product,
+            name="Reviewer",
+            email="reviewer@example.com",
+            rating=rating,
+            title="Review",
+            review="Solid bag",
+            is_approved=is_approved
+        )
+    
+    def test_aggregates_follow_approved_reviews(self):
+        """Test only approved reviews count, including approval changes and deletes"""
+        self.add_review(5)
+        self.add_review(4)
+        pending = self.add_review(1, is_approved=False)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 2)
+        self.assertEqual(self.product.average_rating, 4.5)
+        
+        pending.is_approved = True
+        pending.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, 10)
+        self.assertEqual(self.product.rating_avg, Decimal('3.3'))
+        
+        ProductReview.objects.filter(product=self.product).delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 0)
+        self.assertEqual(self.product.average_rating, 0)
+    
+    def test_review_moved_between_products(self):
+        """Test reassigning a review refreshes both products"""
+        other = Product.objects.create(title="Other Bag", slug="other-bag", price=Decimal('1.00'))
+        review = self.add_review(3)
+        review.product = other
+        review.save()
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.product.review_count, 0)
+        self.assertEqual(other.review_count, 1)
+    
+    def test_reading_aggregates_needs_no_queries(self):
+        """Test rating and count are read from the product row"""
+        self.add_review(4)
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(product.review_count, 1)
+            self.assertEqual(product.average_rating, 4.0)
+
+
+class CategoryTreeTestCase(TestCase):
+    """Tests for materialized-path hierarchies on categories and industries"""
+    
+    def setUp(self):
+        self.root = ProductCategory.objects.create(title="Packaging", slug="packaging")
+        self.bags = ProductCategory.objects.create(title="Paper Bags", slug="paper-bags", parent=self.root)
+        self.kraft = ProductCategory.objects.create(title="Brown Kraft", slug="brown-kraft", parent=self.bags)
+        self.other = ProductCategory.objects.create(title="Accessories", slug="accessories")
+    
+    def test_paths_and_levels(self):
+        """Test path, level and breadcrumbs are derived in one query"""
+        kraft = ProductCategory.objects.get(pk=self.kraft.pk)
+        self.assertEqual(kraft.path, f"{self.root.pk}/{self.bags.pk}/{self.kraft.pk}/")
+        self.assertEqual(kraft.level, 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(kraft.get_full_path(), "Packaging > Paper Bags > Brown Kraft")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.root.get_descendants(), [self.bags, self.kraft])
+    
+    def test_move_rewrites_subtree(self):
+        """Test moving a node updates the paths and depths of its descendants"""
+        self.bags.parent = self.other
+        self.bags.save()
+        kraft = ProductCategory.objects.get(pk=self.kraft.pk)
+        self.assertEqual(kraft.get_ancestors(), [self.other, self.bags])
+        self.assertEqual(kraft.level, 2)
+        self.assertEqual(self.root.get_descendants(), [])
+        
+        self.bags.parent = None
+        self.bags.save()
+        kraft.refresh_from_db()
+        self.assertEqual(kraft.path, f"{self.bags.pk}/{self.kraft.pk}/")
+        self.assertEqual(kraft.level, 1)
+    
+    def test_cannot_move_below_descendant(self):
+        """Test validation and save() both reject cycles"""
+        from django.core.exceptions import ValidationError
+        self.root.parent = self.kraft
+        with self.assertRaises(ValidationError):
+            self.root.clean()
+        with self.assertRaises(ValueError):
+            self.root.save()
+        self.root.refresh_from_db()
+        self.assertIsNone(self.root.parent_id)
+        self.assertEqual(self.root.path, f"{self.root.pk}/")
+    
+    def test_subtree_products(self):
+        """Test category pages list products from every sub-category"""
+        with self.captureOnCommitCallbacks(execute=True):
+            top = Product.objects.create(title="Top Bag", slug="top-bag", price=Decimal('1.00'))
+            deep = Product.objects.create(title="Deep Bag", slug="deep-bag", price=Decimal('1.00'))
+            elsewhere = Product.objects.create(title="Straw", slug="straw", price=Decimal('1.00'))
+            top.categories.add(self.root)
+            deep.categories.add(self.kraft, self.bags)
+            elsewhere.categories.add(self.other)
+        self.assertCountEqual(self.root.get_subtree_products(), [top, deep])
+        self.assertCountEqual(self.bags.get_subtree_products(), [deep])
+        
+        response = self.client.get(reverse('core:category_detail', kwargs={'slug': self.root.slug}))
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual([listing.product_id for listing in response.context['products']], [top.pk, deep.pk])
+    
+    def test_subtree_product_links_resolve(self):
+        """Test a sub-category product's card on the parent page links to a product page that loads"""
+        with self.captureOnCommitCallbacks(execute=True):
+            deep = Product.objects.create(title="Deep Bag", slug="deep-bag", price=Decimal('1.00'), is_active=True)
+            deep.categories.add(self.kraft)
+        response = self.client.get(reverse('core:category_detail', kwargs={'slug': self.bags.slug}))
+        link = reverse('core:product_detail', args=[self.kraft.slug, deep.slug])
+        self.assertContains(response, f'href="{link}"')
+        self.assertNotContains(response, reverse('core:product_detail', args=[self.bags.slug, deep.slug]))
+        self.assertEqual(self.client.get(link).status_code, 200)
+    
+    def test_industry_hierarchy(self):
+        """Test industries share the same tree behaviour"""
+        food = Industry.objects.create(title="Food Service", url="/food/")
+        cafes = Industry.objects.create(title="Cafes", url="/cafes/", parent=food)
+        self.assertEqual(cafes.level, 1)
+        self.assertEqual(cafes.get_full_path(), "Food Service > Cafes")
+        self.assertEqual(food.get_descendants(include_self=True), [food, cafes])
+
+
+class CacheTagTestCase(TestCase):
+    """Tests for tag-versioned caching and signal-driven invalidation"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.calls = 0
+    
+    def build(self):
+        self.calls += 1
+        return self.calls
+    
+    def test_bump_invalidates_only_tagged_entries(self):
+        """Test bumping a tag rebuilds entries under it and leaves others alone"""
+        self.assertEqual(caching.get_or_set('a', self.build, tags=['t1']), 1)
+        self.assertEqual(caching.get_or_set('b', self.build, tags=['t2']), 2)
+        self.assertEqual(caching.get_or_set('a', self.build, tags=['t1']), 1)
+        caching.bump_tags('t1')
+        self.assertEqual(caching.get_or_set('a', self.build, tags=['t1']), 3)
+        self.assertEqual(caching.get_or_set('b', self.build, tags=['t2']), 2)
+    
+    def test_set_tagged_keeps_versions_read_before_build(self):
+        """Test an entry whose tag was bumped while it was being built is stored already stale"""
+        versions = caching.get_tag_versions(['t1'])
+        caching.bump_tags('t1')  # a change committed mid-build
+        caching.set_tagged('entry', 'old rows', ['t1'], versions=versions)
+        self.assertIsNone(caching.get_tagged('entry'))
+        caching.set_tagged('entry', 'new rows', ['t1'], versions=caching.get_tag_versions(['t1']))
+        self.assertEqual(caching.get_tagged('entry'), 'new rows')
+    
+    def test_model_changes_bump_tags(self):
+        """Test edits outside the admin refresh the menu and category context"""
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(title="Home", url="/")
+            ProductCategory.objects.create(title="Bags", slug="bags")
+        response = self.client.get(reverse('core:index'))
+        self.assertEqual([m.title for m in response.context['menu_items']], ["Home"])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(title="About", url="/about/", order=1)
+            ProductCategory.objects.create(title="Boxes", slug="boxes")
+        response = self.client.get(reverse('core:index'))
+        self.assertEqual([m.title for m in response.context['menu_items']], ["Home", "About"])
+        self.assertEqual(len(response.context['product_categories']), 2)
+    
+    def test_category_link_bumps_product_tag(self):
+        """Test m2m changes from either side bump the product's tag"""
+        product = Product.objects.create(title="Tagged", slug="tagged", price=Decimal('1.00'))
+        category = ProductCategory.objects.create(title="Bags", slug="bags")
+        key = caching.product_tag(product.pk)
+        before = caching.get_tag_versions([key])[key]
+        with self.captureOnCommitCallbacks(execute=True):
+            category.products.add(product)
+            # Bumped only once the link is committed
+            self.assertEqual(before, caching.get_tag_versions([key])[key])
+        after_add = caching.get_tag_versions([key])[key]
+        self.assertNotEqual(before, after_add)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.products.clear()
+        self.assertNotEqual(after_add, caching.get_tag_versions([key])[key])
+
+
+class RequestCartTestCase(TestCase):
+    """Tests for the lazy request-scoped cart"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.product = Product.objects.create(
+            title="Lazy Bag",
+            slug="lazy-bag",
+            price=Decimal('2.00'),
+            stock_quantity=100,
+            is_active=True
+        )
+    
+    def test_browsing_does_not_create_carts(self):
+        """Test read-only pages never create a cart row"""
+        self.client.get(reverse('core:index'))
+        self.client.get(reverse('core:cart'))
+        self.client.get(reverse('core:cart_dropdown_html'))
+        self.assertEqual(Cart.objects.count(), 0)
+    
+    def test_cart_loaded_once_per_request(self):
+        """Test the view and the mini-cart context share a single cart lookup"""
+        self.client.force_login(User.objects.create_user('lazy', 'lazy@example.com', 'pass12345'))
+        self.client.post(reverse('core:add_to_cart', kwargs={'slug': self.product.slug}), {'quantity': 3})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:cart'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cart_total_items'], 3)
+        self.assertEqual(response.context['cart_subtotal'], Decimal('6.00'))
+        cart_lookups = [q for q in queries.captured_queries if 'FROM "core_cart"' in q['sql']]
+        self.assertEqual(len(cart_lookups), 1)
+
+
+class CartBackendTestCase(TestCase):
+    """Tests for the guest cookie cart and its promotion to database rows"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.product = Product.objects.create(
+            title="Guest Bag",
+            slug="guest-bag",
+            price=Decimal('2.00'),
+            stock_quantity=1000,
+            is_active=True
+        )
+    
+    def _add(self, quantity):
+        return self.client.post(
+            reverse('core:add_to_cart', kwargs={'slug': self.product.slug}), {'quantity': quantity},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+    
+    def test_guest_cart_writes_no_rows(self):
+        """Test a guest cart lives in a signed cookie, without cart rows or a session"""
+        self.assertEqual(self._add(3).json()['cart_total_items'], 3)
+        self.assertEqual(self._add(2).json()['cart_total_items'], 5)
+        self.assertEqual(Cart.objects.count(), 0)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        
+        response = self.client.get(reverse('core:cart'))
+        self.assertEqual(response.context['cart_total_items'], 5)
+        self.assertEqual(response.context['cart_subtotal'], Decimal('10.00'))
+    
+    def test_tampered_cookie_is_ignored(self):
+        """Test an unsigned cart cookie reads as an empty cart"""
+        self.client.cookies[GUEST_CART_COOKIE] = f'{self.product.pk}:500'
+        response = self.client.get(reverse('core:cart'))
+        self.assertEqual(response.context['cart_total_items'], 0)
+    
+    def test_lines_addressed_by_product_id(self):
+        """Test quantity changes and removal find guest lines by product id"""
+        self._add(3)
+        response = self.client.post(reverse('core:update_cart'), {'product_id': self.product.pk, 'quantity': 7})
+        self.assertEqual(response.json()['cart_total_items'], 7)
+        response = self.client.post(reverse('core:remove_cart_ajax', kwargs={'product_id': self.product.pk}))
+        self.assertEqual(response.json()['cart_total_items'], 0)
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+    
+    def test_checkout_promotes_guest_cart(self):
+        """Test checkout places the order from promoted rows and then clears the cookie"""
+        self._add(4)
+        response = self.client.post(reverse('core:checkout'), {
+            'first_name': 'Guest', 'last_name': 'Buyer', 'email': 'guest@example.com', 'phone': '4165550100',
+            'shipping_address_1': '1 King St', 'shipping_city': 'Toronto', 'shipping_state': 'ON',
+            'shipping_postal_code': 'M5V 1A1',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.get().items.get().quantity, 4)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+    
+    def test_sign_in_merges_guest_cart(self):
+        """Test signing in adds the guest lines to the customer's database cart"""
+        User.objects.create_user('buyer@example.com', 'buyer@example.com', 'pass12345')
+        self._add(3)
+        response = self.client.post(
+            reverse('accounts:signin'), {'username': 'buyer@example.com', 'password': 'pass12345'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+        
+        response = self.client.get(reverse('core:cart'))
+        self.assertEqual(response.context['cart_total_items'], 3)
+
+
+class PageCacheTestCase(TestCase):
+    """Tests for the anonymous full-page cache"""
+    
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        FAQ.objects.create(question="Minimum order?", answer="100 bags", is_active=True)
+    
+    def test_anonymous_page_served_from_cache(self):
+        """Test repeat anonymous visits hit the cache until a surrogate key is bumped"""
+        first = self.client.get(reverse('core:faq'))
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        self.assertIn('faq', first['Surrogate-Key'].split())
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('core:faq'))
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            FAQ.objects.create(question="Custom printing?", answer="Yes", is_active=True)
+        third = self.client.get(reverse('core:faq'))
+        self.assertEqual(third['X-Page-Cache'], 'MISS')
+        self.assertContains(third, "Custom printing?")
+    
+    def test_unlisted_query_params_bypass_cache(self):
+        """Test only the parameters a view varies on are cached"""
+        self.client.get(reverse('core:faq'))
+        response = self.client.get(reverse('core:faq'), {'utm_source': 'mail'})
+        self.assertNotIn('X-Page-Cache', response)
+    
+    def test_logged_in_and_cart_visitors_bypass_cache(self):
+        """Test per-visitor pages are rendered normally"""
+        self.client.get(reverse('core:faq'))
+        user = User.objects.create_user('shopper', 'shopper@example.com', 'pass12345')
+        self.client.force_login(user)
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('core:faq')))
+        product = Product.objects.create(title="Cached Bag", slug="cached-bag", price=Decimal('1.00'), stock_quantity=10, is_active=True)
+        
+        guest = Client()
+        guest.post(reverse('core:add_to_cart', kwargs={'slug': product.slug}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertNotIn('X-Page-Cache', guest.get(reverse('core:faq')))
+    
+    def test_csrf_token_is_per_visitor(self):
+        """Test cached pages carry each visitor's own CSRF token"""
+        from .page_cache import CSRF_PLACEHOLDER
+        self.client.get(reverse('core:index'))
+        visitor = Client(enforce_csrf_checks=True)
+        response = visitor.get(reverse('core:index'))
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+        self.assertIn('csrftoken', response.cookies)
+    
+    def test_cached_post_still_counts_views(self):
+        """Test blog post views are counted on cache hits"""
+        from blog.models import Post
+        post = Post.objects.create(
+            title="Kraft Guide", slug="kraft-guide", excerpt="Guide", content="Body",
+            meta_description="Guide", status='published'
+        )
+        self.client.get(reverse('blog:post_detail', kwargs={'slug': post.slug}))
+        response = self.client.get(reverse('blog:post_detail', kwargs={'slug': post.slug}))
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        flush_view_counts()
+        post.refresh_from_db()
+        self.assertEqual(post.view_count, 2)
+
+
+class OrderPlacementTestCase(TestCase):
+    """Tests for the bulk order placement service"""
+    
+    def setUp(self):
+        self.products = [
+            Product.objects.create(
+                title=f"Stock Bag {i}",
+                slug=f"stock-bag-{i}",
+                price=Decimal('2.00'),
+                stock_quantity=100,
+                track_inventory=True,
+                is_active=True
+            )
+            for i in range(6)
+        ]
+    
+    def _cart(self, session_key, quantities):
+        cart = Cart.objects.create(session_key=session_key)
+        for product, quantity in zip(self.products, quantities):
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return cart
+    
+    def _order_fields(self):
+        return {
+            'email': 'buyer@example.com',
+            'first_name': 'Buyer',
+            'last_name': 'Test',
+            'phone': '4165551234',
+            'shipping_address_1': '1 King St',
+            'shipping_city': 'Toronto',
+            'shipping_state': 'ON',
+            'shipping_postal_code': 'M5H 1A1',
+            'subtotal': Decimal('0.00'),
+            'total': Decimal('0.00'),
+        }
+    
+    def test_items_created_and_stock_decremented(self):
+        """Test order lines are written with totals and stock drops per product"""
+        cart = self._cart('bulk-a', [3, 5])
+        order = place_order(cart, **self._order_fields())
+        
+        lines = {line.product_id: line for line in order.items.all()}
+        self.assertEqual(lines[self.products[1].pk].total_price, Decimal('10.00'))
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 97)
+        self.assertEqual(Product.objects.get(pk=self.products[1].pk).stock_quantity, 95)
+        self.assertEqual(Product.objects.get(pk=self.products[2].pk).stock_quantity, 100)
+        self.assertFalse(cart.items.exists())
+    
+    def test_query_count_independent_of_lines(self):
+        """Test placing a 6-line order costs the same statements as a 1-line order"""
+        small = self._cart('bulk-small', [1])
+        large = self._cart('bulk-large', [1, 2, 3, 4, 5, 6])
+        get_price_ladder(self.products[0].pk)
+        with CaptureQueriesContext(connection) as one_line:
+            place_order(small, **self._order_fields())
+        for product in self.products[1:]:
+            get_price_ladder(product.pk)
+        with CaptureQueriesContext(connection) as six_lines:
+            place_order(large, **self._order_fields())
+        self.assertEqual(len(one_line.captured_queries), len(six_lines.captured_queries))
+    
+    def test_insufficient_stock_writes_nothing(self):
+        """Test a short line aborts the whole order"""
+        cart = self._cart('bulk-short', [5, 500])
+        with self.assertRaises(InsufficientStock):
+            place_order(cart, **self._order_fields())
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(OrderItem.objects.count(), 0)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 100)
+        self.assertEqual(cart.items.count(), 2)
+
+
+class EmailOutboxTestCase(TestCase):
+    """Tests for the outbound email queue and its worker"""
+    
+    def setUp(self):
+        self.client = Client()
+    
+    def test_contact_form_only_queues(self):
+        """Test the contact form writes an outbox row instead of sending"""
+        self.client.post(reverse('core:contact'), {
+            'name': 'Test User',
+            'email': 'visitor@example.com',
+            'subject': 'Bulk bags',
+            'message': 'Hello',
+        })
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_PENDING)
+        self.assertEqual(queued.reply_to, ['visitor@example.com'])
+    
+    def test_order_emails_queued_with_order(self):
+        """Test order confirmation and notification are queued, HTML included"""
+        product = Product.objects.create(title="Mail Bag", slug="mail-bag", price=Decimal('2.00'), track_inventory=False, is_active=True)
+        cart = Cart.objects.create(session_key='outbox-order')
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        order = place_order(
+            cart, email='buyer@example.com', first_name='Buyer', last_name='Test', phone='4165551234',
+            shipping_address_1='1 King St', shipping_city='Toronto', shipping_state='ON',
+            shipping_postal_code='M5H 1A1', subtotal=Decimal('4.00'), total=Decimal('4.00'),
+        )
+        send_order_confirmation_email(order)
+        send_order_notification_email(order)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(tuple(to) for to in OutboundEmail.objects.values_list('to', flat=True)),
+            [('buyer@example.com',), ('sales@packaxis.ca',)],
+        )
+        self.assertFalse(OutboundEmail.objects.filter(html_body='').exists())
+    
+    def test_worker_sends_in_batches(self):
+        """Test the command drains every due message and marks it sent"""
+        for i in range(5):
+            queue_email(f'Message {i}', 'Body', [f'user{i}@example.com'], html_body='<p>Body</p>')
+        call_command('send_queued_email', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT).exists())
+        self.assertEqual(send_queued_batch(), (0, 0))
+    
+    def test_failure_backs_off_then_gives_up(self):
+        """Test failed sends are rescheduled and eventually marked failed"""
+        queued = queue_email('Flaky', 'Body', ['user@example.com'])
+        with patch('django.core.mail.EmailMultiAlternatives.send', side_effect=OSError('SMTP down')):
+            self.assertEqual(send_queued_batch(), (0, 1))
+            queued.refresh_from_db()
+            self.assertEqual(queued.attempts, 1)
+            self.assertEqual(queued.status, OutboundEmail.STATUS_PENDING)
+            self.assertGreater(queued.next_attempt_at, timezone.now())
+            self.assertIn('SMTP down', queued.last_error)
+            
+            # Not due yet, so nothing is retried
+            self.assertEqual(send_queued_batch(), (0, 0))
+            
+            OutboundEmail.objects.filter(pk=queued.pk).update(attempts=MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+            send_queued_batch()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class ProductListingTestCase(TestCase):
+    """Tests for the denormalized product listing read model"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.category = ProductCategory.objects.create(title="Kraft Bags", slug="kraft-bags", is_active=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                title="Flat Handle Bag", slug="flat-handle-bag", price=Decimal('1.00'),
+                stock_quantity=0, track_inventory=True, is_active=True
+            )
+            self.product.categories.add(self.category)
+    
+    def test_listing_refreshed_on_changes(self):
+        """Test tiers, tags and stock flow into the listing row after commit"""
+        tag = Tag.objects.create(name="Eco", slug="eco")
+        with self.captureOnCommitCallbacks(execute=True):
+            TieredPricing.objects.create(product=self.product, min_quantity=500, price_per_unit=Decimal('0.60'))
+            self.product.tags.add(tag)
+        listing = ProductListing.objects.get(product=self.product)
+        self.assertEqual(listing.category_slug, 'kraft-bags')
+        self.assertEqual((listing.min_price, listing.max_price), (Decimal('0.60'), Decimal('1.00')))
+        self.assertTrue(listing.has_tier_pricing)
+        self.assertFalse(listing.in_stock)
+        self.assertEqual(listing.tags, [{'name': 'Eco', 'slug': 'eco'}])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_active = False
+            self.product.save()
+        self.assertFalse(ProductListing.objects.filter(product=self.product).exists())
+    
+    def test_primary_category_matches_product_page(self):
+        """Test listings and Product.primary_category pick the same category for the URL"""
+        first_in_menu = ProductCategory.objects.create(title="Aardvark Bags", slug="aardvark-bags", order=-1, is_active=True)
+        retired = ProductCategory.objects.create(title="Old Bags", slug="old-bags", is_active=False)
+        ProductCategory.objects.filter(pk=retired.pk).update(path='0/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.categories.add(first_in_menu, retired)
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.primary_category, self.category)
+        self.assertEqual(ProductListing.objects.get(product=product).category_slug, self.category.slug)
+    
+    def test_keyset_pagination(self):
+        """Test pages follow on from the cursor without overlap"""
+        for i in range(4):
+            product = Product.objects.create(title=f"Bag {i}", slug=f"bag-{i}", price=Decimal('1.00'), is_active=True)
+            product.categories.add(self.category)
+        refresh_listings()
+        first, cursor = listing_page(ProductListing.objects.all(), per_page=3)
+        second, last_cursor = listing_page(ProductListing.objects.all(), cursor, per_page=3)
+        self.assertEqual([listing.title for listing in first + second],
+                         ['Bag 0', 'Bag 1', 'Bag 2', 'Bag 3', 'Flat Handle Bag'])
+        self.assertIsNone(last_cursor)
+        self.assertEqual(listing_page(ProductListing.objects.all(), 'not-a-cursor', per_page=3)[0], first)
+    
+    def test_products_page_uses_listings(self):
+        """Test the products page renders listing rows and filters by category"""
+        response = self.client.get(reverse('core:products'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/product/kraft-bags/flat-handle-bag/')
+        response = self.client.get(reverse('core:products'), {'category': 'no-such-category'})
+        self.assertEqual(list(response.context['products']), [])
+
+
+class SearchTestCase(TestCase):
+    """Tests for product search and autocomplete"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.category = ProductCategory.objects.create(title="Grocery Bags", slug="grocery-bags", is_active=True)
+        products = [
+            ("Kraft Grocery Bag", "kraft-grocery-bag", '10" x 12 x 5 inches', "120 GSM", "Brown", "takeout"),
+            ("White Merchandise Bag", "white-merchandise-bag", "8x4x10", "80 GSM", "White", "retail"),
+            ("Paper Straw", "paper-straw", "", "", "Kraft", ""),
+        ]
+        for title, slug, size, gsm, color, keywords in products:
+            product = Product.objects.create(
+                title=title, slug=slug, size=size, gsm=gsm, color=color,
+                search_keywords=keywords, price=Decimal('1.00'), is_active=True
+            )
+            product.categories.add(self.category)
+        refresh_listings()
+    
+    def titles(self, query, **kwargs):
+        return [listing.title for listing in search_products(query, **kwargs)]
+    
+    def test_normalizes_sizes_and_gsm(self):
+        """Test different spellings of a size or weight produce the same token"""
+        self.assertEqual(tokenize('10" X 12 x 5 in, 120 GSM'), ['10x12x5', '120gsm'])
+        self.assertEqual(tokenize('10×12×5'), ['10x12x5'])
+    
+    def test_size_queries(self):
+        """Test sizes match with or without separators and spacing"""
+        self.assertEqual(self.titles('10 x 12 x 5'), ['Kraft Grocery Bag'])
+        self.assertEqual(self.titles('10125'), ['Kraft Grocery Bag'])
+        self.assertEqual(self.titles('bag 120gsm'), ['Kraft Grocery Bag'])
+    
+    def test_typos_and_prefixes(self):
+        """Test one-letter typos match and prefixes only complete when asked"""
+        self.assertEqual(self.titles('merchandize'), ['White Merchandise Bag'])
+        self.assertEqual(self.titles('merch'), [])
+        self.assertEqual(self.titles('white merch', prefix=True), ['White Merchandise Bag'])
+    
+    def test_title_outranks_secondary_fields(self):
+        """Test a term in the title ranks above the same term in the color field"""
+        self.assertEqual(self.titles('kraft'), ['Kraft Grocery Bag', 'Paper Straw'])
+    
+    def test_index_follows_catalog_changes(self):
+        """Test the index picks up products after their listings are refreshed"""
+        self.assertEqual(self.titles('cutlery'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(title="Wooden Cutlery", slug="wooden-cutlery", is_active=True)
+            product.categories.add(self.category)
+        self.assertEqual(self.titles('cutlery'), ['Wooden Cutlery'])
+    
+    def test_index_patches_changed_listings(self):
+        """Test refreshing some products patches just their terms into an index equal to a rebuild"""
+        index = get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            straw = Product.objects.get(slug='paper-straw')
+            straw.title = "Paper Stirrer"
+            straw.save()
+            Product.objects.filter(slug='white-merchandise-bag').update(is_active=False)
+            refresh_listings(Product.objects.filter(slug='white-merchandise-bag').values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            patched = get_index()
+        self.assertEqual(len(queries), 1)
+        rebuilt = TokenIndex(ProductListing.objects.values_list('product_id', 'search_primary', 'search_secondary'))
+        self.assertEqual(patched.postings, rebuilt.postings)
+        self.assertEqual(patched.terms, rebuilt.terms)
+        self.assertEqual(dict(patched.size_terms), dict(rebuilt.size_terms))
+        self.assertEqual(dict(patched.deletions), dict(rebuilt.deletions))
+        self.assertIn('merchandise', index.postings)
+        self.assertEqual(self.titles('stirer'), ['Paper Stirrer'])
+        self.assertEqual(self.titles('straw'), [])
+    
+    def test_search_views(self):
+        """Test the results page and the suggestion endpoint"""
+        response = self.client.get(reverse('core:search'), {'q': 'grocery'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/product/grocery-bags/kraft-grocery-bag/')
+        
+        response = self.client.get(reverse('core:search_suggest'), {'q': 'pap'})
+        results = response.json()['results']
+        self.assertEqual([result['title'] for result in results], ['Paper Straw'])
+        self.assertEqual(results[0]['url'], '/product/grocery-bags/paper-straw/')
+
+
+class FacetTestCase(TestCase):
+    """Tests for faceted filtering over the listing bitsets"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.bags = ProductCategory.objects.create(title="Bags", slug="bags", is_active=True)
+        self.kraft = ProductCategory.objects.create(title="Kraft", slug="kraft", parent=self.bags, is_active=True)
+        self.eco = Tag.objects.create(name="Eco", slug="eco")
+        self.restaurants = UseCase.objects.create(title="Restaurants", description="Takeout")
+        specs = [
+            ("Brown Twisted Bag", "brown-twisted-bag", "120 GSM", "Twisted", "Brown", Decimal('0.40')),
+            ("White Flat Bag", "white-flat-bag", "80 GSM", "Flat", "White", Decimal('0.30')),
+            ("Brown Flat Bag", "brown-flat-bag", "120gsm", "Flat", "Brown, White", Decimal('1.50')),
+        ]
+        self.products = {}
+        for title, slug, gsm, handle, color, price in specs:
+            product = Product.objects.create(
+                title=title, slug=slug, gsm=gsm, handle_type=handle, color=color, price=price, is_active=True
+            )
+            product.categories.add(self.kraft)
+            self.products[slug] = product
+        self.products['brown-twisted-bag'].tags.add(self.eco)
+        ProductUseCase.objects.create(product=self.products['brown-flat-bag'], use_case=self.restaurants)
+        refresh_listings()
+    
+    def titles(self, selected):
+        index = get_facet_index()
+        return [listing.title for listing in index.page(index.match(selected))[0]]
+    
+    def test_combined_filters(self):
+        """Test values within a facet are OR-ed and facets are AND-ed"""
+        self.assertEqual(self.titles({'gsm': ['120gsm']}), ['Brown Flat Bag', 'Brown Twisted Bag'])
+        self.assertEqual(self.titles({'gsm': ['120gsm'], 'handle': ['flat']}), ['Brown Flat Bag'])
+        self.assertEqual(self.titles({'color': ['white'], 'price': ['0.25-0.50', '1.00-5.00']}),
+                         ['Brown Flat Bag', 'White Flat Bag'])
+        self.assertEqual(self.titles({'tag': ['eco'], 'use_case': [str(self.restaurants.pk)]}), [])
+        self.assertEqual(self.titles({'category': ['bags']}), self.titles({}))
+    
+    def test_counts_exclude_own_facet(self):
+        """Test each option is counted against the other facets' selections only"""
+        groups = {name: options for name, heading, options in get_facet_index().counts({'handle': ['flat']})}
+        self.assertEqual([(value, count) for value, label, count, selected in groups['handle']],
+                         [('flat', 2), ('twisted', 1)])
+        self.assertEqual([(value, count) for value, label, count, selected in groups['color']],
+                         [('brown', 1), ('white', 2)])
+    
+    def test_index_follows_catalog_changes(self):
+        """Test tagging a product updates the bitsets after commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products['white-flat-bag'].tags.add(self.eco)
+        self.assertEqual(self.titles({'tag': ['eco']}), ['Brown Twisted Bag', 'White Flat Bag'])
+    
+    def test_index_order_independent_of_collation(self):
+        """Test rows in a case- and punctuation-insensitive order still page and patch in key order"""
+        titles = ["apple bag", "Banana Bag", "banana-bag", "Cherry Bag"]
+        products = {}
+        for i, title in enumerate(titles):
+            products[title] = Product.objects.create(
+                title=title, slug=f"fruit-{i}", color="Green", price=Decimal('1.00'), is_active=True
+            )
+        refresh_listings()
+        rows = list(ProductListing.objects.values_list('product_id', 'order', 'title', 'facets'))
+        rows.sort(key=lambda row: (row[1], row[2].lower().replace('-', ' '), row[0]))
+        index = FacetIndex(rows)
+        self.assertEqual(index.keys, sorted(index.keys))
+        
+        mask, cursor, seen = index.match({'color': ['green']}), None, []
+        while True:
+            page, cursor = index.page(mask, cursor, per_page=1)
+            seen += [listing.title for listing in page]
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(titles))
+        
+        cherry = products["Cherry Bag"].pk
+        patched = index.patched([cherry], [(cherry, 0, "Apple Bag", {'color': [['red', 'Red']]})])
+        self.assertEqual(patched.keys, sorted(patched.keys))
+        red = patched.page(patched.value_bits('color', 'red'))[0]
+        self.assertEqual([listing.product_id for listing in red], [cherry])
+    
+    def test_refresh_loads_only_linked_lineage(self):
+        """Test refreshing a product reads just its categories' ancestors, not every category"""
+        ProductCategory.objects.create(title="Boxes", slug="boxes", is_active=True)
+        product = self.products['white-flat-bag']
+        with CaptureQueriesContext(connection) as queries:
+            refresh_listings([product.pk])
+        category_reads = [query['sql'] for query in queries if 'FROM "core_productcategory"' in query['sql']]
+        self.assertTrue(category_reads)
+        self.assertTrue(all(' IN (' in sql for sql in category_reads))
+        facets = ProductListing.objects.get(product=product).facets
+        self.assertEqual(facets['category'], [['bags', 'Bags'], ['kraft', 'Kraft']])
+    
+    def test_index_patches_changed_listings(self):
+        """Test refreshing some products patches just their rows into an index equal to a rebuild"""
+        index = get_facet_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products['white-flat-bag'].title = "Aqua Flat Bag"
+            self.products['white-flat-bag'].save()
+            self.products['brown-twisted-bag'].is_active = False
+            self.products['brown-twisted-bag'].save()
+            product = Product.objects.create(title="Red Bag", slug="red-bag", color="Red", price=Decimal('7.00'), is_active=True)
+            product.categories.add(self.bags)
+        with CaptureQueriesContext(connection) as queries:
+            patched = get_facet_index()
+        self.assertEqual(len(queries), 1)
+        self.assertIn(' IN ', queries[0]['sql'])
+        rebuilt = FacetIndex(
+            ProductListing.objects.order_by('order', 'title', 'product_id')
+            .values_list('product_id', 'order', 'title', 'facets')
+        )
+        self.assertEqual(patched.keys, rebuilt.keys)
+        self.assertEqual(patched.bits, rebuilt.bits)
+        self.assertEqual(patched.labels, rebuilt.labels)
+        self.assertEqual(patched.all, rebuilt.all)
+        self.assertEqual(len(index.product_ids), 3)
+        self.assertEqual(self.titles({'color': ['white']}), ['Aqua Flat Bag', 'Brown Flat Bag'])
+    
+    def test_products_page_filters_and_pages(self):
+        """Test the products page applies facets and keeps them in the pager links"""
+        response = self.client.get(reverse('core:products'), {'handle': 'flat', 'color': 'brown'})
+        self.assertEqual([listing.title for listing in response.context['products']], ['Brown Flat Bag'])
+        
+        with patch('core.listings.LISTING_PAGE_SIZE', 1):
+            response = self.client.get(reverse('core:products'), {'handle': 'flat'})
+            self.assertContains(response, 'handle=flat&amp;after=')
+            response = self.client.get(reverse('core:products'), {'handle': 'flat', 'after': response.context['next_cursor']})
+        self.assertEqual([listing.title for listing in response.context['products']], ['White Flat Bag'])
+        self.assertIsNone(response.context['next_cursor'])
+
+
+class ImageDerivativeTestCase(TestCase):
+    """Tests for responsive image renditions"""
+    
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def upload(self, name, size=(1000, 500), color='brown'):
+        output = BytesIO()
+        Image.new('RGB', size, color).save(output, 'JPEG')
+        return default_storage.save(name, ContentFile(output.getvalue()))
+    
+    def test_renditions_per_width_and_format(self):
+        """Test every format is rendered at each width up to (not beyond) the original"""
+        asset = generate_derivatives(self.upload('products/bag.jpg'))
+        self.assertEqual(set(asset.renditions), {'avif', 'webp', 'jpeg'})
+        self.assertEqual([width for width, name in asset.renditions['webp']], [320, 640, 960, 1000])
+        for width, name in asset.renditions['jpeg']:
+            self.assertTrue(name.startswith(f'derivatives/{asset.content_hash[:2]}/{asset.content_hash}/'))
+            with default_storage.open(name) as f:
+                self.assertEqual(Image.open(f).width, width)
+    
+    def test_identical_uploads_share_renditions(self):
+        """Test renditions are keyed by content, not by file name"""
+        first = generate_derivatives(self.upload('products/a.jpg'))
+        second = generate_derivatives(self.upload('products/b.jpg'))
+        self.assertEqual(first.renditions, second.renditions)
+        self.assertEqual(ImageAsset.objects.count(), 2)
+    
+    def test_responsive_image_tag(self):
+        """Test the tag renders a <picture> with srcsets, or the original before renditions exist"""
+        source = self.upload('products/bag.jpg', size=(400, 400))
+        template = Template('{% load images %}{% responsive_image image "Bag" sizes="320px" loading="lazy" %}')
+        html = template.render(Context({'image': source}))
+        self.assertEqual(html, f'<img src="{default_storage.url(source)}" alt="Bag" loading="lazy">')
+        
+        generate_derivatives(source)
+        html = template.render(Context({'image': source}))
+        self.assertIn('<source type="image/avif" srcset="', html)
+        self.assertIn('320w, ', html)
+        self.assertIn('400w" sizes="320px">', html)
+        self.assertIn('alt="Bag" loading="lazy">', html)
+    
+    def test_generated_on_upload_and_by_command(self):
+        """Test saving an image schedules renditions and the command fills in the rest"""
+        category = ProductCategory.objects.create(title="Bags", slug="bags", is_active=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.image = self.upload('product-categories/bags.jpg', size=(300, 200))
+            category.save()
+        self.assertEqual([width for width, name in get_renditions(category.image)['webp']], [300])
+        
+        Product.objects.filter(pk=Product.objects.create(title="Bag", slug="bag").pk).update(
+            image=self.upload('products/bag.jpg', size=(200, 200), color='white')
+        )
+        out = StringIO()
+        call_command('rebuild_image_derivatives', workers=1, stdout=out)
+        self.assertIn('Rendered derivatives for 1 images', out.getvalue())
+        self.assertEqual(ImageAsset.objects.count(), 2)
+
+
+    def test_only_changed_images_rendered(self):
+        """Test saves that keep the image render nothing and a render bumps only the tags showing it"""
+        broken = default_storage.save('products/broken.jpg', ContentFile(b'not an image'))
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(title="Bag", slug="bag", image=broken)
+        with patch('core.images.generate_derivatives') as generate, self.captureOnCommitCallbacks(execute=True):
+            product.title = "Kraft Bag"
+            product.save()
+            ProductCategory.objects.create(title="Bags", slug="bags", is_active=True)
+        generate.assert_not_called()
+        
+        product.image = self.upload('products/bag.jpg', size=(200, 200))
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.save()
+        render = [callback for callback in callbacks if getattr(callback, '__name__', '') == 'generate']
+        for callback in callbacks:
+            if callback not in render:
+                callback()
+        tags = [caching.CATALOG, caching.CATEGORIES, caching.INDUSTRIES, caching.product_tag(product.pk)]
+        before = caching.get_tag_versions(tags)
+        self.assertEqual(len(render), 1)
+        render[0]()
+        after = caching.get_tag_versions(tags)
+        self.assertEqual([tag for tag in tags if after[tag] != before[tag]], [caching.product_tag(product.pk)])
+        self.assertTrue(get_renditions(product.image))
+    
+    @override_settings(IMAGE_DERIVATIVES_ON_UPLOAD=False)
+    def test_worker_renders_uploads(self):
+        """Test uploads are left to the command when rendering on upload is off"""
+        with self.captureOnCommitCallbacks(execute=True):
+            industry = Industry.objects.create(title="Retail", url="/retail/", image=self.upload('industries/retail.jpg'))
+        self.assertEqual(get_renditions(industry.image), {})
+        before = caching.get_tag_versions([caching.INDUSTRIES])
+        call_command('rebuild_image_derivatives', workers=1, stdout=StringIO())
+        self.assertTrue(get_renditions(industry.image))
+        self.assertNotEqual(caching.get_tag_versions([caching.INDUSTRIES]), before)
+
+
+class ProductDetailBundleTestCase(TestCase):
+    """Tests for the cached product detail read model"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = ProductCategory.objects.create(title="Bags", slug="bags", is_active=True)
+            self.product = Product.objects.create(title="Kraft Bag", slug="kraft-bag", price=Decimal('0.50'), is_active=True)
+            self.other = Product.objects.create(title="White Bag", slug="white-bag", price=Decimal('0.40'), is_active=True)
+            for product in (self.product, self.other):
+                product.categories.add(self.category)
+            self.restaurants = UseCase.objects.create(title="Restaurants", description="Takeout")
+            ProductUseCase.objects.create(product=self.product, use_case=self.restaurants)
+    
+    def add_rows(self, product, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                ProductVariant.objects.create(product=product, variant_type='size', name=f"Size {i}", value=f"S{i}")
+                ProductReview.objects.create(product=product, name=f"Buyer {i}", email="buyer@example.com",
+                                             rating=5, review="Great", is_approved=True)
+                TieredPricing.objects.create(product=product, min_quantity=100 * (i + 1), price_per_unit=Decimal('0.30'))
+    
+    def test_fixed_query_count(self):
+        """Test the bundle costs the same number of queries however many rows the product has"""
+        get_facet_index()
+        with CaptureQueriesContext(connection) as bare:
+            ProductDetailBundle('bags', 'white-bag').build()
+        self.add_rows(self.product, 5)
+        get_facet_index()
+        with CaptureQueriesContext(connection) as full:
+            bundle = ProductDetailBundle('bags', 'kraft-bag').build()
+        self.assertEqual(len(full), len(bare))
+        self.assertEqual(len(bundle['reviews']), 5)
+        self.assertEqual(len(bundle['size_variants']), 5)
+        self.assertEqual(len(bundle['tiered_prices']), 5)
+        self.assertEqual(bundle['product']['review_count'], 5)
+        self.assertEqual([use_case['title'] for use_case in bundle['use_cases']], ["Restaurants"])
+        self.assertEqual([related['slug'] for related in bundle['related_products']], ['white-bag'])
+    
+    def test_cached_until_row_changes(self):
+        """Test a warm bundle costs no queries and a new review invalidates it"""
+        loader = ProductDetailBundle('bags', 'kraft-bag')
+        self.assertEqual(loader.get()['reviews'], [])
+        with self.assertNumQueries(0):
+            loader.get()
+        self.add_rows(self.product, 1)
+        self.assertEqual(len(loader.get()['reviews']), 1)
+        self.assertIsNone(ProductDetailBundle('other', 'kraft-bag').get())
+    
+    def test_bump_during_build_is_not_cached_as_current(self):
+        """Test a product change committed while its bundle is built leaves that bundle stale"""
+        loader = ProductDetailBundle('bags', 'kraft-bag')
+        build_related = loader.related_products
+        
+        def related_products(category, product_id):
+            caching.bump_tags(caching.product_tag(product_id))
+            return build_related(category, product_id)
+        
+        with patch.object(loader, 'related_products', related_products):
+            self.assertIsNotNone(loader.get())
+        self.assertIsNone(caching.get_tagged(loader.cache_key))
+    
+    def test_page_renders_from_bundle(self):
+        """Test the product page renders the bundle and 404s outside the product's categories"""
+        response = self.client.get(reverse('core:product_detail', args=['bags', 'kraft-bag']))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Kraft Bag')
+        self.assertContains(response, 'Restaurants')
+        self.assertContains(response, reverse('core:product_detail', args=['bags', 'white-bag']))
+        
+        ProductCategory.objects.create(title="Boxes", slug="boxes", is_active=True)
+        response = self.client.get(reverse('core:product_detail', args=['boxes', 'kraft-bag']))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTestCase(TestCase):
+    """Tests for request instrumentation and per-view query budgets"""
+    
+    def setUp(self):
+        cache.clear()
+        reset_samples()
+        self.client = Client()
+        self.category = ProductCategory.objects.create(title="Bags", slug="bags", is_active=True)
+        for i in range(6):
+            product = Product.objects.create(title=f"Bag {i}", slug=f"bag-{i}", price=Decimal('0.50'), is_active=True)
+            product.categories.add(self.category)
+            TieredPricing.objects.create(product=product, min_quantity=100, price_per_unit=Decimal('0.40'))
+            ProductVariant.objects.create(product=product, variant_type='size', name="Small", value="S")
+            ProductReview.objects.create(product=product, name="Buyer", email="buyer@example.com",
+                                         rating=5, review="Great", is_approved=True)
+            FAQ.objects.create(question=f"Question {i}?", answer="Answer")
+        refresh_listings()
+    
+    def test_views_within_budget(self):
+        """Test the catalog, search and cart views stay within their query budgets on a cold cache"""
+        self.client.post(reverse('core:add_to_cart', args=['bag-0']), {'quantity': 100})
+        urls = [
+            reverse('core:index'),
+            reverse('core:products'),
+            reverse('core:services'),
+            reverse('core:industries'),
+            reverse('core:faq'),
+            reverse('core:category_detail', args=['bags']),
+            reverse('core:product_detail', args=['bags', 'bag-0']),
+            reverse('core:search') + '?q=bag',
+            reverse('core:search_suggest') + '?q=ba',
+            reverse('core:cart'),
+            reverse('core:cart_dropdown_html'),
+            reverse('core:contact'),
+            reverse('core:quote_request'),
+        ]
+        for url in urls:
+            cache.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+    
+    def test_server_timing_and_samples(self):
+        """Test each request reports its timings and is recorded under its URL name"""
+        response = self.client.get(reverse('core:faq'))
+        metrics = response.wsgi_request.metrics
+        self.assertGreater(metrics.queries, 0)
+        self.assertIn(f'db;desc="{metrics.queries} queries"', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertEqual(snapshot()['core:faq']['requests'], 1)
+    
+    def test_over_budget_raises_when_strict(self):
+        """Test a view over its budget raises in strict mode and is only logged otherwise"""
+        metrics = RequestMetrics()
+        metrics.queries = 3
+        view = query_budget(2)(lambda request: None)
+        with self.assertRaises(QueryBudgetExceeded):
+            check_query_budget('core:test', view, metrics)
+        with self.settings(QUERY_BUDGET_STRICT=False), self.assertLogs('core.instrumentation', 'WARNING'):
+            check_query_budget('core:test', view, metrics)
+    
+    def test_metrics_endpoint_is_staff_only(self):
+        """Test the metrics summary is only served to staff"""
+        url = reverse('core:request_metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user('ops', 'ops@example.com', 'pass12345', is_staff=True)
+        self.client.force_login(staff)
+        self.client.get(reverse('core:faq'))
+        data = self.client.get(url).json()
+        self.assertEqual(data['views']['core:faq']['requests'], 1)
+        self.assertEqual(sum(data['views']['core:faq']['histogram'].values()), 1)
+
+
+class BenchmarkCommandTestCase(TestCase):
+    """Tests for the storefront benchmark command"""
+    
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+    
+    def test_writes_results_for_every_scenario(self):
+        """Test each scenario is timed and the report is written as JSON"""
+        output = f'{self.output_dir}/run.json'
+        call_command(
+            'benchmark', '--in-place', products=8, categories=4, industries=3, carts=2, orders=3, posts=2,
+            iterations=2, warmup=1, allocation_samples=1, output=output, stdout=StringIO(),
+        )
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(set(report['results']), set(SCENARIOS))
+        self.assertEqual(report['catalog']['products'], 8)
+        for stats in report['results'].values():
+            self.assertEqual(stats['iterations'], 2)
+            self.assertLessEqual(stats['ms']['p50'], stats['ms']['p95'])
+            self.assertIn('alloc_peak_kb', stats)
+        self.assertGreater(report['results']['checkout']['queries']['p50'], 0)
+        self.assertEqual(Order.objects.exclude(order_number__startswith='BENCH-').count(), 4)
+    
+    def test_failed_checkout_is_an_error(self):
+        """Test a checkout redirected back to the cart fails the scenario instead of counting as done"""
+        request = SCENARIOS['checkout'](SimpleNamespace(new_shopper=Client))
+        with self.assertRaises(BenchmarkError):
+            request()
+        self.assertFalse(Order.objects.exists())
+
+
+class CartReaperTestCase(TestCase):
+    """Tests for the abandoned cart reaper"""
+    
+    def setUp(self):
+        self.product = Product.objects.create(
+            title="Reaper Bag",
+            slug="reaper-bag",
+            price=Decimal('1.00'),
+            is_active=True
+        )
+        self.now = timezone.now()
+    
+    def _cart(self, key, age, items=0):
+        cart = Cart.objects.create(session_key=key)
+        if items:
+            CartItem.objects.create(cart=cart, product=self.product, quantity=items)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=self.now - age)
+        return cart
+    
+    def test_deletes_expired_and_empty_carts(self):
+        """Test expired carts and stale empty carts go, with their items, in keyset batches"""
+        self._cart('expired-full', timedelta(days=40), items=5)
+        self._cart('expired-empty', timedelta(days=40))
+        self._cart('stale-empty', timedelta(hours=3))
+        kept_filling = self._cart('fresh-empty', timedelta(minutes=5))
+        kept_active = self._cart('active-full', timedelta(days=2), items=3)
+        
+        cursor, carts, items = reap_carts_batch(batch_size=2, now=self.now)
+        self.assertIsNotNone(cursor)
+        self.assertEqual((carts, items), (2, 1))
+        cursor, carts, items = reap_carts_batch(cursor, batch_size=2, now=self.now)
+        self.assertEqual((carts, items), (1, 0))
+        self.assertEqual(reap_carts_batch(cursor, batch_size=2, now=self.now), (None, 0, 0))
+        
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)), {kept_filling.pk, kept_active.pk})
+        self.assertEqual(CartItem.objects.count(), 1)
+    
+    def test_command_reports_counts(self):
+        """Test the reap_carts command walks every batch and reports what it deleted"""
+        for i in range(5):
+            self._cart(f'old-{i}', timedelta(days=60), items=2)
+        out = StringIO()
+        call_command('reap_carts', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 carts and 5 cart items in 3 batches', out.getvalue())
+        self.assertFalse(Cart.objects.exists())
+    
+    def test_cart_changes_keep_it_alive(self):
+        """Test editing a signed-in customer's cart moves its updated_at forward"""
+        client = Client()
+        client.force_login(User.objects.create_user('keeper', 'keeper@example.com', 'pass12345'))
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=100)
+        client.post(reverse('core:add_to_cart', kwargs={'slug': self.product.slug}), {'quantity': 2})
+        cart = Cart.objects.get()
+        Cart.objects.filter(pk=cart.pk).update(updated_at=self.now - timedelta(days=40))
+        client.post(reverse('core:set_cart_quantity_ajax', kwargs={'product_id': self.product.pk}), {'quantity': 4})
+        reap_carts_batch(now=timezone.now())
+        self.assertEqual(Cart.objects.get().items.get().quantity, 4)
+
+
+class CartBatchTestCase(TestCase):
+    """Tests for the batch cart mutation endpoint"""
+    
+    def setUp(self):
+        self.client = Client()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = [
+                Product.objects.create(
+                    title=f"Batch Bag {i}",
+                    slug=f"batch-bag-{i}",
+                    price=Decimal('1.00'),
+                    stock_quantity=1000,
+                    minimum_order=10,
+                    is_active=True
+                )
+                for i in range(6)
+            ]
+            TieredPricing.objects.create(product=self.products[0], min_quantity=100, price_per_unit=Decimal('0.50'))
+    
+    def _batch(self, items):
+        return self.client.post(reverse('core:cart_batch'), json.dumps({'items': items}), content_type='application/json')
+    
+    def test_applies_all_lines_and_returns_cart(self):
+        """Test set, add and remove lines are applied together and the cart comes back once"""
+        first, second, third = self.products[:3]
+        self._batch([{'product': third.pk, 'quantity': 20}])
+        response = self._batch([
+            {'product': first.pk, 'quantity': 60},
+            {'product': first.slug, 'quantity': 40, 'op': 'add'},
+            {'product': second.slug, 'quantity': 15},
+            {'product': third.pk, 'op': 'remove'},
+        ])
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['cart_total_items'], 115)
+        self.assertEqual(data['cart_subtotal'], '65.00')
+        self.assertEqual({item['product_id']: item['quantity'] for item in data['items']}, {first.pk: 100, second.pk: 15})
+    
+    def test_invalid_line_rejects_whole_batch(self):
+        """Test stock and minimum order are checked for every line before anything is written"""
+        response = self._batch([
+            {'product': self.products[0].pk, 'quantity': 50},
+            {'product': self.products[1].pk, 'quantity': 5},
+            {'product': self.products[2].pk, 'quantity': 5000},
+            {'product': 'no-such-bag', 'quantity': 50},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2, 3])
+        self.assertEqual(self.client.get(reverse('core:cart')).context['cart_total_items'], 0)
+    
+    def test_signed_in_batch_upserts_in_fixed_queries(self):
+        """Test a customer's batch upserts CartItem rows with queries independent of the line count"""
+        self.client.force_login(User.objects.create_user('buyer', 'buyer@example.com', 'pass12345'))
+        self._batch([{'product': self.products[0].pk, 'quantity': 10}])
+        with CaptureQueriesContext(connection) as two_lines:
+            self._batch([{'product': product.pk, 'quantity': 20} for product in self.products[:2]])
+        with CaptureQueriesContext(connection) as six_lines:
+            response = self._batch([{'product': product.pk, 'quantity': 30} for product in self.products])
+        self.assertEqual(response.json()['cart_total_items'], 180)
+        self.assertEqual(len(two_lines.captured_queries), len(six_lines.captured_queries))
+        self.assertEqual(sorted(CartItem.objects.values_list('quantity', flat=True)), [30] * 6)
+
+
+class QuickOrderTestCase(TestCase):
+    """Tests for quick-order SKU list import"""
+    
+    def setUp(self):
+        self.client = Client()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bag = Product.objects.create(
+                title="Quick Bag", slug="quick-bag", sku="QB-1", price=Decimal('1.00'), stock_quantity=5000, is_active=True
+            )
+            self.box = Product.objects.create(
+                title="Quick Box", slug="quick-box", sku="QX-1", price=Decimal('2.00'), stock_quantity=100, is_active=True
+            )
+            ProductVariant.objects.create(product=self.box, variant_type='size', name='Large', value='L', sku_suffix='L')
+            TieredPricing.objects.create(product=self.bag, min_quantity=250, price_per_unit=Decimal('0.75'), label='Bulk')
+    
+    def test_pasted_lines_added_with_report(self):
+        """Test pasted rows resolve product and variant SKUs, sum per product and report each line"""
+        response = self.client.post(reverse('core:quick_order'), {
+            'lines': 'SKU,Quantity\nqb-1,200\nQX-1-L\t30\n\nQB-1,100\nNOPE,5\nQX-1,abc\n',
+        })
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['added'], data['failed']), (3, 2))
+        lines = {entry['line']: entry for entry in data['lines']}
+        self.assertEqual(lines[2]['cart_quantity'], 300)
+        self.assertEqual((lines[2]['unit_price'], lines[2]['tier']), ('0.75', 'Bulk'))
+        self.assertEqual((lines[3]['product_id'], lines[3]['variant']), (self.box.pk, 'Large'))
+        self.assertEqual(lines[6]['error'], 'Unknown SKU.')
+        self.assertIn('error', lines[7])
+        self.assertEqual(data['cart_total_items'], 330)
+        self.assertEqual(data['cart_subtotal'], '285.00')
+    
+    def test_failing_product_is_skipped_and_reported(self):
+        """Test a product over its stock is reported on each of its rows and left out of the cart"""
+        response = self.client.post(reverse('core:quick_order'), {'lines': 'QX-1,60\nQX-1-L,60\nQB-1,10'})
+        data = response.json()
+        self.assertEqual([entry.get('error') for entry in data['lines']][:2], ['Only 100 items available in stock.'] * 2)
+        self.assertEqual(data['cart_total_items'], 10)
+    
+    def test_large_upload_streams_in_fixed_queries(self):
+        """Test thousands of uploaded lines cost the same handful of queries"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.post(reverse('core:quick_order'), {'lines': 'QB-1,1'})  # build the SKU index
+        body = '\ufeffsku,quantity\n' + 'QB-1,1\r\nQX-1-L,0\r\n' * 1500
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('core:quick_order'), {
+                'file': SimpleUploadedFile('order.csv', body.encode('utf-8'), content_type='text/csv'),
+            })
+        data = response.json()
+        self.assertEqual((data['added'], data['failed']), (1500, 1500))
+        self.assertEqual(data['cart_total_items'], 1501)
+        self.assertLess(len(queries.captured_queries), 10)
+
+
+class FakeStripe(ThreadingHTTPServer):
+    """
+    A local stand-in for the Stripe API's PaymentIntent endpoints (create,
+    retrieve, update and cancel).
+
+    Records every request and answers it from .intents; .fail_next requests
+    get a 500 first, and .delay holds each answer back that many seconds.
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self):
+        self.intents, self.requests = {}, []
+        self.fail_next, self.delay = 0, 0
+        super().__init__(('127.0.0.1', 0), FakeStripeHandler)
+    
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+    
+    def handle_error(self, request, client_address):
+        pass  # a client that timed out hangs up before its delayed answer
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+    
+    def log_message(self, *args):
+        pass
+    
+    def _answer(self, status, body):
+        time.sleep(self.server.delay)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _handle(self, form):
+        self.server.requests.append({'method': self.command, 'path': self.path, 'headers': dict(self.headers),
+                                     'form': form, 'port': self.client_address[1]})
+        if self.server.fail_next:
+            self.server.fail_next -= 1
+            return self._answer(500, {'error': {'type': 'api_error', 'message': 'Try again'}})
+        if self.command == 'POST' and self.path == '/v1/payment_intents':
+            intent_id = f'pi_fake_{len(self.server.intents) + 1}'
+            self.server.intents[intent_id] = {
+                'id': intent_id, 'object': 'payment_intent', 'status': 'requires_payment_method',
+                'amount': int(form['amount']), 'client_secret': f'{intent_id}_secret',
+            }
+            return self._answer(200, self.server.intents[intent_id])
+        path = self.path.split('/')  # ['', 'v1', 'payment_intents', id, action]
+        intent = self.server.intents.get(path[3]) if len(path) > 3 else None
+        if intent and self.command == 'POST':
+            if intent['status'] in ('succeeded', 'canceled'):
+                return self._answer(400, {'error': {'type': 'invalid_request_error', 'message': 'Intent is final'}})
+            if path[4:] == ['cancel']:
+                intent['status'] = 'canceled'
+            elif 'amount' in form:
+                intent['amount'] = int(form['amount'])
+        if intent:
+            return self._answer(200, intent)
+        self._answer(404, {'error': {'type': 'invalid_request_error', 'message': 'No such payment_intent'}})
+    
+    def do_GET(self):
+        self._handle({})
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self._handle(dict(parse_qsl(body)))
+
+
+class AsyncPaymentTestCase(TestCase):
+    """Tests for the async payment views against a local fake Stripe API"""
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripe()
+        threading.Thread(target=cls.stripe.serve_forever, daemon=True).start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.stripe.shutdown()
+        cls.stripe.server_close()
+        super().tearDownClass()
+    
+    def setUp(self):
+        self.stripe.intents.clear()
+        self.stripe.requests.clear()
+        self.stripe.fail_next, self.stripe.delay = 0, 0
+        settings_override = override_settings(
+            STRIPE_API_BASE=self.stripe.url, STRIPE_MAX_NETWORK_RETRIES=0, STRIPE_TIMEOUT=5,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.product = Product.objects.create(
+            title="Paid Bag", slug="paid-bag", price=Decimal('2.00'), stock_quantity=1000, is_active=True
+        )
+        self.client.post(
+            reverse('core:add_to_cart', kwargs={'slug': self.product.slug}), {'quantity': 100},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+    
+    def _create_intent(self):
+        return self.client.post(
+            reverse('core:create_payment_intent'), json.dumps({'shipping_method': 'standard', 'province': 'ON'}),
+            content_type='application/json',
+        )
+    
+    def _process(self, intent_id):
+        return self.client.post(reverse('core:process_payment'), json.dumps({
+            'payment_intent_id': intent_id,
+            'form_data': {'email': 'paid@example.com', 'first_name': 'Paid', 'last_name': 'Buyer',
+                          'shipping_address_1': '1 King St', 'shipping_city': 'Toronto', 'shipping_state': 'ON',
+                          'shipping_postal_code': 'm5v 1a1'},
+        }), content_type='application/json')
+    
+    def test_create_intent_and_place_order(self):
+        """Test the intent is created with the cart total and idempotency key, and a succeeded one places the order"""
+        data = self._create_intent().json()
+        created = self.stripe.requests[0]
+        self.assertEqual(data['clientSecret'], 'pi_fake_1_secret')
+        self.assertEqual(int(created['form']['amount']), round(data['amount'] * 100))
+        self.assertIn('Idempotency-Key', created['headers'])
+        
+        self.assertEqual(self._process('pi_fake_1').json()['error'], 'Payment not completed')
+        self.stripe.intents['pi_fake_1']['status'] = 'succeeded'
+        data = self._process('pi_fake_1').json()
+        order = Order.objects.get()
+        self.assertEqual(data['order_number'], order.order_number)
+        self.assertEqual((order.payment_id, order.shipping_postal_code), ('pi_fake_1', 'M5V 1A1'))
+        self.assertFalse(CartItem.objects.exists())
+    
+    def test_retry_budget(self):
+        """Test a 500 from Stripe is retried only when STRIPE_MAX_NETWORK_RETRIES allows it"""
+        self.stripe.fail_next = 1
+        self.assertEqual(self._create_intent().status_code, 400)
+        self.stripe.fail_next = 1
+        with override_settings(STRIPE_MAX_NETWORK_RETRIES=1):
+            response = self._create_intent()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.stripe.requests), 3)
+    
+    def test_timeout(self):
+        """Test a Stripe call slower than STRIPE_TIMEOUT fails instead of waiting it out"""
+        self.stripe.delay = 1
+        with override_settings(STRIPE_TIMEOUT=0.2):
+            started = time.monotonic()
+            response = self._create_intent()
+        self.assertEqual(response.status_code, 400)
+        self.assertLess(time.monotonic() - started, 1)
+    
+    def test_client_pools_connections(self):
+        """Test calls made on one event loop share one client and its open connection"""
+        self.stripe.intents['pi_pooled'] = {'id': 'pi_pooled', 'object': 'payment_intent', 'status': 'succeeded'}
+        
+        async def retrieve_twice():
+            client = get_stripe_client()
+            self.assertIs(get_stripe_client(), client)
+            for _ in range(2):
+                await client.payment_intents.retrieve_async('pi_pooled')
+        
+        async_to_sync(retrieve_twice)()
+        first, second = self.stripe.requests
+        self.assertEqual(first['port'], second['port'])
+
+    def test_intent_reused_and_updated(self):
+        """Test recalculating unchanged totals skips Stripe and changed totals update the same intent"""
+        first = self._create_intent().json()
+        self.assertEqual(self._create_intent().json(), first)
+        self.assertEqual(len(self.stripe.requests), 1)
+        
+        response = self.client.post(
+            reverse('core:create_payment_intent'), json.dumps({'shipping_method': 'standard', 'province': 'AB'}),
+            content_type='application/json',
+        )
+        updated = self.stripe.requests[-1]
+        self.assertEqual((updated['method'], updated['path']), ('POST', '/v1/payment_intents/pi_fake_1'))
+        self.assertEqual(response.json()['clientSecret'], first['clientSecret'])
+        self.assertLess(response.json()['amount'], first['amount'])
+        self.assertEqual(self.stripe.intents['pi_fake_1']['amount'], round(response.json()['amount'] * 100))
+        
+        # A paid intent is spent: the next checkout gets a new one
+        self.stripe.intents['pi_fake_1']['status'] = 'succeeded'
+        self._process('pi_fake_1')
+        self.client.post(
+            reverse('core:add_to_cart', kwargs={'slug': self.product.slug}), {'quantity': 100},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(self._create_intent().json()['clientSecret'], 'pi_fake_2_secret')
+    
+    def test_reaper_cancels_abandoned_intent(self):
+        """Test reaping an abandoned cart cancels the PaymentIntent it held"""
+        self._create_intent()
+        Cart.objects.update(updated_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(reap_carts_batch()[1], 1)
+        self.assertEqual(self.stripe.intents['pi_fake_1']['status'], 'canceled')
+        self.assertEqual(self.stripe.requests[-1]['path'], '/v1/payment_intents/pi_fake_1/cancel')
+    
+    def test_rejected_order_keeps_paid_intent(self):
+        """Test an order rejected after payment leaves the paid intent on the cart"""
+        self._create_intent()
+        self.stripe.intents['pi_fake_1']['status'] = 'succeeded'
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=10, track_inventory=True)
+        self.assertEqual(self._process('pi_fake_1').status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.get().payment_intent_id, 'pi_fake_1')
+    
+    def test_asgi_chain_needs_no_sync_adaptation(self):
+        """Test the payment views are reached through an all-async middleware chain under ASGI"""
+        # Django logs 'Synchronous handler adapted for ...' for each sync-only middleware
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            client = AsyncClient()
+            client.cookies = self.client.cookies
+            response = async_to_sync(client.post)(
+                reverse('core:create_payment_intent'), {'shipping_method': 'standard', 'province': 'ON'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.json()['clientSecret'], 'pi_fake_1_secret')
+        self.assertNotIn('db;desc="0 queries"', response['Server-Timing'])
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeEventQueueTestCase(TestCase):
+    """Tests for queued Stripe webhook events and their worker"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.orders = {
+            intent_id: Order.objects.create(
+                order_number=f'WH-{intent_id}', email='hook@example.com', first_name='Hook', last_name='Buyer',
+                phone='4165550100', shipping_address_1='1 King St', shipping_city='Toronto', shipping_state='ON',
+                shipping_postal_code='M5V 1A1', subtotal=Decimal('10.00'), total=Decimal('10.00'),
+                payment_status=status, payment_id=intent_id,
+            )
+            for intent_id, status in [('pi_new', 'pending'), ('pi_paid', 'paid'), ('pi_refund', 'paid')]
+        }
+    
+    def _event(self, event_id, event_type, obj, created=1700000000):
+        return {'id': event_id, 'object': 'event', 'type': event_type, 'created': created, 'data': {'object': obj}}
+    
+    def _send(self, event, secret='whsec_test'):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('core:stripe_webhook'), payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}',
+        )
+    
+    def test_webhook_queues_event_once(self):
+        """Test a verified event is stored once per id and acknowledged without touching orders"""
+        event = self._event('evt_1', 'payment_intent.succeeded', {'id': 'pi_new'})
+        self.assertEqual(self._send(event).status_code, 200)
+        self.assertEqual(self._send(event).status_code, 200)
+        forged = self._event('evt_2', 'payment_intent.succeeded', {'id': 'pi_new'})
+        self.assertEqual(self._send(forged, secret='whsec_other').status_code, 400)
+        stored = StripeEvent.objects.get()
+        self.assertEqual((stored.event_id, stored.status), ('evt_1', StripeEvent.STATUS_PENDING))
+        self.orders['pi_new'].refresh_from_db()
+        self.assertEqual(self.orders['pi_new'].payment_status, 'pending')
+    
+    def test_batch_moves_payment_status_forward(self):
+        """Test a batch applies events in Stripe order with bulk updates, never moving a status back"""
+        events = [
+            self._event('evt_a', 'payment_intent.payment_failed', {'id': 'pi_new'}, created=1),
+            self._event('evt_b', 'payment_intent.succeeded', {'id': 'pi_new'}, created=2),
+            self._event('evt_c', 'payment_intent.payment_failed', {'id': 'pi_paid'}, created=3),
+            self._event('evt_d', 'charge.refunded', {'id': 'ch_1', 'refunded': True, 'payment_intent': 'pi_refund'}, created=4),
+            self._event('evt_e', 'customer.created', {'id': 'cus_1'}, created=5),
+            self._event('evt_f', 'payment_intent.succeeded', {}, created=6),
+        ]
+        for event in reversed(events):
+            store_stripe_event(event)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_stripe_events_batch(), (5, 1))
+        self.assertLess(len(queries.captured_queries), 10)
+        statuses = dict(Order.objects.values_list('payment_id', 'payment_status'))
+        self.assertEqual(statuses, {'pi_new': 'paid', 'pi_paid': 'paid', 'pi_refund': 'refunded'})
+        self.assertIn("KeyError('id')", StripeEvent.objects.get(event_id='evt_f').last_error)
+        
+        out = StringIO()
+        call_command('process_stripe_events', stdout=out)
+        self.assertIn('Processed 0 Stripe events', out.getvalue())
+    
+    def test_spent_intents_forgotten_on_carts(self):
+        """Test succeeded and canceled intents are cleared from carts so checkout can't reuse them"""
+        carts = {}
+        for intent_id in ('pi_done', 'pi_dropped', 'pi_open'):
+            carts[intent_id] = Cart.objects.create(session_key=f'session-{intent_id}')
+            carts[intent_id].set_payment_intent(intent_id, f'{intent_id}_secret', 'fingerprint')
+        store_stripe_event(self._event('evt_s', 'payment_intent.succeeded', {'id': 'pi_done'}, created=1))
+        store_stripe_event(self._event('evt_c', 'payment_intent.canceled', {'id': 'pi_dropped'}, created=2))
+        store_stripe_event(self._event('evt_f', 'payment_intent.payment_failed', {'id': 'pi_open'}, created=3))
+        process_stripe_events_batch()
+        stored = dict(Cart.objects.values_list('session_key', 'payment_intent_id'))
+        self.assertEqual(stored, {'session-pi_done': '', 'session-pi_dropped': '', 'session-pi_open': 'pi_open'})
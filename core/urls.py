@@ -12,6 +12,8 @@ urlpatterns = [
     path('pricing-brochure/', views.pricing_brochure, name='pricing_brochure'),
     path('faq/', views.faq, name='faq'),
     path('quote/', views.quote_request, name='quote_request'),
+    path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('product/<slug:slug>/', views.category_detail, name='category_detail'),
     path('product/<slug:category_slug>/<slug:product_slug>/', views.product_detail, name='product_detail'),
     path('product/<slug:category_slug>/<slug:product_slug>/review/', views.submit_review, name='submit_review'),
@@ -22,10 +24,12 @@ urlpatterns = [
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<slug:slug>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/', views.update_cart, name='update_cart'),
-    path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
-    path('cart/update-ajax/<int:item_id>/', views.update_cart_ajax, name='update_cart_ajax'),
-    path('cart/set-quantity-ajax/<int:item_id>/', views.set_cart_quantity_ajax, name='set_cart_quantity_ajax'),
-    path('cart/remove-ajax/<int:item_id>/', views.remove_cart_ajax, name='remove_cart_ajax'),
+    path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/update-ajax/<int:product_id>/', views.update_cart_ajax, name='update_cart_ajax'),
+    path('cart/set-quantity-ajax/<int:product_id>/', views.set_cart_quantity_ajax, name='set_cart_quantity_ajax'),
+    path('cart/remove-ajax/<int:product_id>/', views.remove_cart_ajax, name='remove_cart_ajax'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
+    path('cart/quick-order/', views.quick_order, name='quick_order'),
     path('cart/dropdown-html/', views.cart_dropdown_html, name='cart_dropdown_html'),
     path('checkout/', views.checkout, name='checkout'),
     path('order-confirmation/<str:order_number>/', views.order_confirmation, name='order_confirmation'),
@@ -40,6 +44,9 @@ urlpatterns = [
     path('payment/process/', views.process_payment, name='process_payment'),
     path('payment/webhook/', views.stripe_webhook, name='stripe_webhook'),
     
+    # Staff-only request metrics (core.instrumentation)
+    path('ops/request-metrics/', views.request_metrics, name='request_metrics'),
+    
     # Dynamic Industry-Specific Landing Pages (must be last to avoid catching other URLs)
     path('<slug:slug>/', views.industry_detail, name='industry_detail'),
 ]
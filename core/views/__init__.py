@@ -11,7 +11,9 @@ Modules:
 - checkout.py: Checkout process and order management
 - payment.py: Stripe payment processing
 - quote.py: Quote request handling
+- search.py: Product search and autocomplete suggestions
 - api.py: AJAX API endpoints (promo codes, reviews, rate limiting)
+- metrics.py: Staff-only request metrics
 - utils.py: Shared utility functions (cart validation, shipping, calculations)
 """
 
@@ -54,6 +56,8 @@ from .cart import (
     update_cart_ajax,
     remove_cart_ajax,
     set_cart_quantity_ajax,
+    cart_batch,
+    quick_order,
     cart_dropdown_html,
 )
 
@@ -78,6 +82,12 @@ from .quote import (
     quote_request,
 )
 
+# Product search
+from .search import (
+    search,
+    search_suggest,
+)
+
 # API endpoints
 from .api import (
     apply_promo_code,
@@ -86,6 +96,11 @@ from .api import (
     ratelimit_error,
 )
 
+# Request metrics
+from .metrics import (
+    request_metrics,
+)
+
 # Utility functions
 from .utils import (
     generate_idempotency_key,
@@ -124,6 +139,8 @@ __all__ = [
     'update_cart_ajax',
     'remove_cart_ajax',
     'set_cart_quantity_ajax',
+    'cart_batch',
+    'quick_order',
     'cart_dropdown_html',
     # Checkout
     'checkout',
@@ -137,11 +154,16 @@ __all__ = [
     'stripe_webhook',
     # Quote
     'quote_request',
+    # Search
+    'search',
+    'search_suggest',
     # API
     'apply_promo_code',
     'remove_promo_code',
     'submit_review',
     'ratelimit_error',
+    # Metrics
+    'request_metrics',
     # Utils
     'generate_idempotency_key',
     'validate_cart_for_checkout',
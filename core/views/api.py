@@ -9,6 +9,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from ..middleware import get_request_cart
 from ..models import PromoCode, Product, ProductReview, Order
 from ..security import sanitize_text
 
@@ -26,11 +27,8 @@ def apply_promo_code(request):
         if not code:
             return JsonResponse({'success': False, 'error': 'Please enter a promo code.'})
         
-        # Import here to avoid circular imports
-        from .cart import get_or_create_cart
-        
         # Get cart for subtotal
-        cart = get_or_create_cart(request)
+        cart = get_request_cart(request)
         if cart.total_items == 0:
             return JsonResponse({'success': False, 'error': 'Your cart is empty.'})
         
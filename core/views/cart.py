@@ -1,39 +1,55 @@
 """
 Shopping cart views.
-Includes: cart display, add/update/remove, cart dropdown, quantity management.
+Includes: cart display, add/update/remove, batch changes, quick order, cart dropdown, quantity management.
 """
 import json
 import logging
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.db.models import Q
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from ..models import Cart, CartItem, Product
+from ..carts import CartFull, get_cart_backend, line_quantity_error
+from ..instrumentation import query_budget
+from ..middleware import get_request_cart
+from ..models import Product
+from ..quick_order import parse_quick_order, plan_quick_order
 from ..security import ratelimit_cart_api
 
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_LINES = 100
+BATCH_OPS = ('set', 'add', 'remove')
+
+
+def _redirect_to_product(product):
+    """Redirect back to a product page under its primary category"""
+    category = product.primary_category
+    return redirect('core:product_detail', category_slug=category.slug if category else 'products', product_slug=product.slug)
+
 
 def get_or_create_cart(request):
-    """Get or create a cart for the current session"""
-    if not request.session.session_key:
-        request.session.create()
-    
-    session_key = request.session.session_key
-    cart, created = Cart.objects.get_or_create(session_key=session_key)
-    return cart
+    """The visitor's cart saved as database rows (promoting a guest cart)"""
+    return get_cart_backend(request).promote()
+
 
+def _get_item_or_404(backend, product_id):
+    """The cart line for a product, with its product loaded"""
+    item = backend.get_item(product_id)
+    if item is None:
+        raise Http404('No such item in the cart')
+    return item
 
+
+@query_budget(10)
 def cart_view(request):
     """Display shopping cart with tiered pricing"""
-    cart = get_or_create_cart(request)
-    
-    # Prefetch products and their tiered prices for better performance
-    cart_items = cart.items.select_related('product').prefetch_related('product__tiered_prices').all()
+    cart = get_request_cart(request)
     
+    # Items, products and tiers are loaded once and shared by every total on the page
     context = {
         'cart': cart,
-        'cart_items': cart_items,
+        'cart_items': cart.totals.items,
     }
     return render(request, 'core/cart.html', context)
 
@@ -42,7 +58,7 @@ def cart_view(request):
 def add_to_cart(request, slug):
     """Add a product to cart with rate limiting and validation"""
     product = get_object_or_404(Product, slug=slug, is_active=True)
-    cart = get_or_create_cart(request)
+    backend = get_cart_backend(request)
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     
     # Parse and validate quantity
@@ -63,7 +79,7 @@ def add_to_cart(request, slug):
                 'message': 'This product is not available for purchase.'
             })
         messages.error(request, 'This product is not available for purchase.')
-        return redirect('core:product_detail', category_slug=product.category.slug if product.category else 'products', product_slug=slug)
+        return _redirect_to_product(product)
     
     # Check stock if tracking inventory
     if product.track_inventory and not product.allow_backorder:
@@ -74,7 +90,7 @@ def add_to_cart(request, slug):
                     'message': f'Sorry, only {product.stock_quantity} items available in stock.'
                 })
             messages.error(request, f'Sorry, only {product.stock_quantity} items available in stock.')
-            return redirect('core:product_detail', category_slug=product.category.slug if product.category else 'products', product_slug=slug)
+            return _redirect_to_product(product)
     
     # Check minimum order quantity
     min_order_warning = None
@@ -84,34 +100,35 @@ def add_to_cart(request, slug):
             messages.warning(request, min_order_warning)
         quantity = product.minimum_order
     
-    # Add to cart or update quantity (with race condition handling)
+    # Add to cart or update quantity
     try:
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
+        in_cart = backend.quantity(product.pk)
         
-        if not created:
+        if in_cart:
             # Verify combined quantity doesn't exceed stock
-            new_quantity = cart_item.quantity + quantity
+            new_quantity = in_cart + quantity
             if product.track_inventory and not product.allow_backorder:
                 if product.stock_quantity < new_quantity:
                     if is_ajax:
                         return JsonResponse({
                             'success': False,
-                            'message': f'Cannot add more. You already have {cart_item.quantity} in cart and only {product.stock_quantity} available.'
+                            'message': f'Cannot add more. You already have {in_cart} in cart and only {product.stock_quantity} available.'
                         })
-                    messages.error(request, f'Cannot add more. You already have {cart_item.quantity} in cart.')
+                    messages.error(request, f'Cannot add more. You already have {in_cart} in cart.')
                     return redirect('core:cart')
             
-            cart_item.quantity = new_quantity
-            cart_item.save()
+            backend.set_quantity(product.pk, new_quantity)
             if not is_ajax:
                 messages.success(request, f'Updated quantity of "{product.title}" in your cart.')
         else:
+            backend.set_quantity(product.pk, quantity)
             if not is_ajax:
                 messages.success(request, f'Added "{product.title}" to your cart.')
+    except CartFull as e:
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': str(e)})
+        messages.error(request, str(e))
+        return redirect('core:cart')
     except Exception as e:
         logger.error(f'Error adding to cart: {str(e)}')
         if is_ajax:
@@ -124,12 +141,13 @@ def add_to_cart(request, slug):
     
     # Return JSON for AJAX requests
     if is_ajax:
+        totals = backend.cart.totals
         response_data = {
             'success': True,
             'message': f'Added {quantity}x {product.title} to cart',
-            'cart_total_items': cart.total_items,
-            'cart_subtotal': str(cart.subtotal),
-            'cart_count': cart.total_items,
+            'cart_total_items': totals.total_items,
+            'cart_subtotal': str(totals.subtotal),
+            'cart_count': totals.total_items,
         }
         if min_order_warning:
             response_data['warning'] = min_order_warning
@@ -141,27 +159,28 @@ def add_to_cart(request, slug):
 @require_POST
 def update_cart(request):
     """Update cart item quantity with tiered pricing support"""
-    cart = get_or_create_cart(request)
+    backend = get_cart_backend(request)
     
     try:
         data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
-        item_id = data.get('item_id')
+        product_id = data.get('product_id')
         quantity = int(data.get('quantity', 1))
         
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        cart_item = _get_item_or_404(backend, product_id)
         
         if quantity <= 0:
-            cart_item.delete()
+            backend.remove(cart_item.product_id)
             message = f'Removed "{cart_item.product.title}" from cart.'
+            totals = backend.cart.totals
             
             return JsonResponse({
                 'success': True,
                 'removed': True,
                 'message': message,
-                'cart_total_items': cart.total_items,
-                'cart_subtotal': str(cart.subtotal),
-                'original_subtotal': str(cart.original_subtotal),
-                'total_savings': str(cart.total_savings),
+                'cart_total_items': totals.total_items,
+                'cart_subtotal': str(totals.subtotal),
+                'original_subtotal': str(totals.original_subtotal),
+                'total_savings': str(totals.total_savings),
             })
         else:
             # Check stock
@@ -172,10 +191,13 @@ def update_cart(request):
                         'message': f'Only {cart_item.product.stock_quantity} items available in stock.'
                     })
             
-            cart_item.quantity = quantity
-            cart_item.save()
+            backend.set_quantity(cart_item.product_id, quantity)
             message = f'Updated quantity to {quantity}.'
             
+            # Recalculate once and read the item back from the prefetched totals
+            totals = backend.cart.totals
+            cart_item = totals.get_item(cart_item.product_id)
+            
             # Get tiered pricing info
             applied_tier = cart_item.applied_tier
             tier_label = applied_tier.label if applied_tier else None
@@ -183,10 +205,10 @@ def update_cart(request):
             return JsonResponse({
                 'success': True,
                 'message': message,
-                'cart_total_items': cart.total_items,
-                'cart_subtotal': str(cart.subtotal),
-                'original_subtotal': str(cart.original_subtotal),
-                'total_savings': str(cart.total_savings),
+                'cart_total_items': totals.total_items,
+                'cart_subtotal': str(totals.subtotal),
+                'original_subtotal': str(totals.original_subtotal),
+                'total_savings': str(totals.total_savings),
                 'item_total': str(cart_item.total_price),
                 'item_savings': str(cart_item.total_savings),
                 'unit_price': str(cart_item.unit_price),
@@ -202,47 +224,49 @@ def update_cart(request):
         })
 
 
-def remove_from_cart(request, item_id):
+def remove_from_cart(request, product_id):
     """Remove an item from cart"""
-    cart = get_or_create_cart(request)
+    backend = get_cart_backend(request)
     
-    cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+    cart_item = _get_item_or_404(backend, product_id)
     product_title = cart_item.product.title
-    cart_item.delete()
+    backend.remove(product_id)
     
     messages.success(request, f'Removed "{product_title}" from your cart.')
     
     # Return JSON for AJAX requests
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        totals = backend.cart.totals
         return JsonResponse({
             'success': True,
             'message': f'Removed from cart',
-            'cart_total_items': cart.total_items,
-            'cart_subtotal': str(cart.subtotal),
+            'cart_total_items': totals.total_items,
+            'cart_subtotal': str(totals.subtotal),
         })
     
     return redirect('core:cart')
 
 
 @require_POST
-def update_cart_ajax(request, item_id):
+def update_cart_ajax(request, product_id):
     """AJAX endpoint for updating cart item quantity from dropdown"""
-    cart = get_or_create_cart(request)
+    backend = get_cart_backend(request)
     
     try:
         data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
         change = int(data.get('change', 0))
         
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        cart_item = _get_item_or_404(backend, product_id)
         new_quantity = cart_item.quantity + change
         
         if new_quantity <= 0:
-            cart_item.delete()
+            backend.remove(product_id)
+            totals = backend.cart.totals
             return JsonResponse({
                 'success': True,
                 'removed': True,
-                'cart_total_items': cart.total_items,
-                'cart_subtotal': str(cart.subtotal),
+                'cart_total_items': totals.total_items,
+                'cart_subtotal': str(totals.subtotal),
             })
         
         # Check stock
@@ -253,15 +277,15 @@ def update_cart_ajax(request, item_id):
                     'error': f'Only {cart_item.product.stock_quantity} items available in stock.'
                 })
         
-        cart_item.quantity = new_quantity
-        cart_item.save()
+        backend.set_quantity(product_id, new_quantity)
         
+        totals = backend.cart.totals
         return JsonResponse({
             'success': True,
             'new_quantity': new_quantity,
-            'item_total': str(cart_item.total_price),
-            'cart_total_items': cart.total_items,
-            'cart_subtotal': str(cart.subtotal),
+            'item_total': str(totals.get_item(product_id).total_price),
+            'cart_total_items': totals.total_items,
+            'cart_subtotal': str(totals.subtotal),
         })
         
     except Exception as e:
@@ -272,18 +296,19 @@ def update_cart_ajax(request, item_id):
 
 
 @require_POST
-def remove_cart_ajax(request, item_id):
+def remove_cart_ajax(request, product_id):
     """AJAX endpoint for removing cart item from dropdown"""
-    cart = get_or_create_cart(request)
+    backend = get_cart_backend(request)
     
     try:
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        cart_item.delete()
+        _get_item_or_404(backend, product_id)
+        backend.remove(product_id)
         
+        totals = backend.cart.totals
         return JsonResponse({
             'success': True,
-            'cart_total_items': cart.total_items,
-            'cart_subtotal': str(cart.subtotal),
+            'cart_total_items': totals.total_items,
+            'cart_subtotal': str(totals.subtotal),
         })
     except Exception as e:
         return JsonResponse({
@@ -293,9 +318,9 @@ def remove_cart_ajax(request, item_id):
 
 
 @require_POST
-def set_cart_quantity_ajax(request, item_id):
+def set_cart_quantity_ajax(request, product_id):
     """AJAX endpoint for setting cart item quantity directly (manual input)"""
-    cart = get_or_create_cart(request)
+    backend = get_cart_backend(request)
     
     try:
         data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
@@ -313,7 +338,7 @@ def set_cart_quantity_ajax(request, item_id):
                 'error': 'Maximum quantity is 9999.'
             })
         
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        cart_item = _get_item_or_404(backend, product_id)
         
         # Check stock
         if cart_item.product.track_inventory and not cart_item.product.allow_backorder:
@@ -323,15 +348,15 @@ def set_cart_quantity_ajax(request, item_id):
                     'error': f'Only {cart_item.product.stock_quantity} items available in stock.'
                 })
         
-        cart_item.quantity = quantity
-        cart_item.save()
+        backend.set_quantity(product_id, quantity)
         
+        totals = backend.cart.totals
         return JsonResponse({
             'success': True,
             'new_quantity': quantity,
-            'item_total': str(cart_item.total_price),
-            'cart_total_items': cart.total_items,
-            'cart_subtotal': str(cart.subtotal),
+            'item_total': str(totals.get_item(product_id).total_price),
+            'cart_total_items': totals.total_items,
+            'cart_subtotal': str(totals.subtotal),
         })
         
     except ValueError:
@@ -346,15 +371,152 @@ def set_cart_quantity_ajax(request, item_id):
         })
 
 
+def _batch_products(mutations):
+    """The active products a batch refers to (by id or slug), loaded in one query"""
+    ids = {ref for ref in (m.get('product') for m in mutations) if isinstance(ref, int)}
+    slugs = {ref for ref in (m.get('product') for m in mutations) if isinstance(ref, str)}
+    products = {}
+    for product in Product.objects.filter(Q(pk__in=ids) | Q(slug__in=slugs), is_active=True):
+        products[product.pk] = products[product.slug] = product
+    return products
+
+
+@require_POST
+@ratelimit_cart_api
+@query_budget(12)
+def cart_batch(request):
+    """
+    Apply many cart changes in one request (multi-line B2B orders).
+    
+    Body: {"items": [{"product": id or slug, "quantity": n, "op": "set" | "add" | "remove"}, ...]}.
+    Every line is validated before anything is written; the changes are then
+    applied together and the recalculated cart is returned once.
+    """
+    try:
+        mutations = json.loads(request.body)['items']
+    except (ValueError, KeyError, TypeError):
+        mutations = None
+    if not isinstance(mutations, list) or not mutations or not all(isinstance(m, dict) for m in mutations):
+        return JsonResponse({'success': False, 'message': 'Expected a JSON body with a list of "items".'}, status=400)
+    if len(mutations) > MAX_BATCH_LINES:
+        return JsonResponse({'success': False, 'message': f'At most {MAX_BATCH_LINES} lines per request.'}, status=400)
+    
+    backend = get_cart_backend(request)
+    products = _batch_products(mutations)
+    current = backend.lines
+    quantities = {}
+    errors = []
+    for index, mutation in enumerate(mutations):
+        ref = mutation.get('product')
+        op = mutation.get('op', 'set')
+        product = products.get(ref) if isinstance(ref, (int, str)) else None
+        if product is None:
+            errors.append({'index': index, 'product': ref, 'error': 'Product not found.'})
+            continue
+        if op not in BATCH_OPS:
+            errors.append({'index': index, 'product': ref, 'error': f'Unknown op "{op}".'})
+            continue
+        
+        in_cart = quantities.get(product.pk, current.get(product.pk, 0))
+        if op == 'remove':
+            quantities[product.pk] = 0
+            continue
+        try:
+            quantity = int(mutation.get('quantity', 1))
+        except (ValueError, TypeError):
+            quantity = 0
+        if quantity < 1:
+            errors.append({'index': index, 'product': ref, 'error': 'Quantity must be at least 1.'})
+            continue
+        new_quantity = in_cart + quantity if op == 'add' else quantity
+        error = line_quantity_error(product, new_quantity)
+        if error:
+            errors.append({'index': index, 'product': ref, 'error': error})
+            continue
+        quantities[product.pk] = new_quantity
+    
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+    
+    try:
+        backend.set_quantities(quantities)
+    except CartFull as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    totals = backend.cart.totals
+    return JsonResponse({
+        'success': True,
+        'items': [
+            {
+                'product_id': item.product_id,
+                'title': item.product.title,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'base_price': str(item.base_price),
+                'item_total': str(item.total_price),
+                'item_savings': str(item.total_savings),
+                'savings_percentage': item.savings_percentage,
+            }
+            for item in totals.items
+        ],
+        'cart_total_items': totals.total_items,
+        'cart_subtotal': str(totals.subtotal),
+        'original_subtotal': str(totals.original_subtotal),
+        'total_savings': str(totals.total_savings),
+    })
+
+
+@require_POST
+@ratelimit_cart_api
+def quick_order(request):
+    """
+    Add a pasted or uploaded SKU list to the cart.
+    
+    Takes `sku,quantity` rows (comma or tab separated) as an uploaded "file"
+    or pasted "lines". Matched lines are written to the cart together; the
+    response reports every row, with the price tier it landed in or why it
+    was skipped.
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        # Iterating the upload streams it line by line from its chunks
+        lines = (line.decode('utf-8-sig', errors='replace') for line in upload)
+    else:
+        lines = request.POST.get('lines', '').splitlines()
+    
+    backend = get_cart_backend(request)
+    quantities, report = plan_quick_order(parse_quick_order(lines), backend.lines)
+    if not report:
+        return JsonResponse({'success': False, 'message': 'Add at least one "sku,quantity" line.'}, status=400)
+    
+    if quantities:
+        try:
+            backend.set_quantities(quantities)
+        except CartFull as e:
+            return JsonResponse({'success': False, 'message': str(e), 'lines': report}, status=400)
+    
+    totals = backend.cart.totals
+    failed = sum(1 for entry in report if 'error' in entry)
+    return JsonResponse({
+        'success': bool(quantities),
+        'added': len(report) - failed,
+        'failed': failed,
+        'lines': report,
+        'cart_total_items': totals.total_items,
+        'cart_subtotal': str(totals.subtotal),
+    })
+
+
+@query_budget(10)
 def cart_dropdown_html(request):
     """Returns the cart dropdown HTML for AJAX updates"""
-    cart = get_or_create_cart(request)
-    cart_items = cart.items.select_related('product').all()
+    cart = get_request_cart(request)
+    totals = cart.totals
     
     context = {
-        'cart_items_preview': cart_items[:3],
-        'cart_total_items': cart.total_items,
-        'cart_subtotal': cart.subtotal,
+        'cart_items_preview': totals.items[:3],
+        'cart_total_items': totals.total_items,
+        'cart_subtotal': totals.subtotal,
     }
     
     return render(request, 'core/partials/cart_dropdown_content.html', context)
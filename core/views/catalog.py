@@ -2,76 +2,63 @@
 Product catalog views.
 Includes: product detail, category detail, legacy product landing pages.
 """
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404
-from ..models import Product, ProductCategory
+from .. import caching
+from ..facets import get_facet_index
+from ..instrumentation import query_budget
+from ..models import ProductCategory
+from ..page_cache import add_surrogate_keys, cache_anonymous_page
+from ..product_detail import ProductDetailBundle
 
 
+@query_budget(14)
+@cache_anonymous_page(tags=[caching.CATALOG], vary_on=['after'])
 def category_detail(request, slug):
-    """Category detail page showing all products in a category"""
+    """Category detail page showing all products in a category and its sub-categories"""
     category = get_object_or_404(ProductCategory, slug=slug, is_active=True)
-    products = Product.objects.filter(category=category, is_active=True).order_by('order', 'title')
     
-    # Get tiered prices for displaying price range
-    for product in products:
-        if hasattr(product, 'tiered_prices'):
-            product.tiered_prices_list = product.tiered_prices.all().order_by('min_quantity')
+    # The category facet covers the whole subtree, so no join or DISTINCT is needed
+    index = get_facet_index()
+    products, next_cursor = index.page(index.value_bits('category', category.slug), request.GET.get('after'))
     
     context = {
         'category': category,
         'products': products,
+        'next_cursor': next_cursor,
         'product_categories': ProductCategory.objects.filter(is_active=True),
     }
     return render(request, 'core/category-detail.html', context)
 
 
+@query_budget(20)
+@cache_anonymous_page(tags=[caching.CATALOG])
 def product_detail(request, category_slug, product_slug):
     """Dynamic product detail view using category and product slugs"""
-    category = get_object_or_404(ProductCategory, slug=category_slug, is_active=True)
-    product = get_object_or_404(Product, slug=product_slug, category=category, is_active=True)
-    
-    # Get related products from the same category
-    related_products = Product.objects.filter(
-        category=product.category,
-        is_active=True
-    ).exclude(id=product.id)[:4]
-    
-    # Get tiered pricing
-    tiered_prices = []
-    if hasattr(product, 'tiered_prices'):
-        tiered_prices = product.tiered_prices.all().order_by('min_quantity')
-    
-    # Get product variants
-    size_variants = []
-    color_variants = []
-    if hasattr(product, 'variants'):
-        size_variants = product.variants.filter(variant_type='size', is_active=True)
-        color_variants = product.variants.filter(variant_type='color', is_active=True)
-    
-    # Get approved reviews
-    reviews = []
-    if hasattr(product, 'reviews'):
-        reviews = product.reviews.filter(is_approved=True).order_by('-created_at')
-    
-    # Get product industries
-    product_industries = []
-    if hasattr(product, 'product_industries'):
-        product_industries = product.product_industries.select_related('industry').all()
+    # Everything on the page comes from one cached bundle (see core.product_detail)
+    loader = ProductDetailBundle(category_slug, product_slug)
+    bundle = loader.get()
+    if bundle is None:
+        raise Http404('No product matches the given query.')
+    product = bundle['product']
+    add_surrogate_keys(request, caching.product_tag(product['id']), versions=loader.versions)
     
     context = {
         'product': product,
-        'product_name': product.title,
-        'category': product.category,
-        'product_description': product.description,
-        'product_image': product.image.url if product.image else '',
-        'product_images': product.get_all_images(),
-        'specifications': product.get_specifications(),
-        'features': product.get_features(),
-        'related_products': related_products,
-        'tiered_prices': tiered_prices,
-        'size_variants': size_variants,
-        'color_variants': color_variants,
-        'reviews': reviews,
-        'product_industries': product_industries,
+        'product_name': product['title'],
+        'category': product['category'],
+        'product_description': product['description'],
+        'product_image': product['image']['url'] if product['image'] else '',
+        'product_images': bundle['images'],
+        'specifications': bundle['specifications'],
+        'features': bundle['features'],
+        'related_products': bundle['related_products'],
+        'tiered_prices': bundle['tiered_prices'],
+        'size_variants': bundle['size_variants'],
+        'color_variants': bundle['color_variants'],
+        'reviews': bundle['reviews'],
+        'product_industries': bundle['product_industries'],
+        'use_cases': bundle['use_cases'],
     }
     return render(request, 'core/product-detail.html', context)
 
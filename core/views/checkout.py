@@ -6,14 +6,17 @@ import logging
 from decimal import Decimal
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.core.mail import send_mail, EmailMultiAlternatives
 from django.conf import settings
 from django.db import transaction
 from django.db.models import F
 from django.core.cache import cache
 from django.template.loader import render_to_string
 from django.http import HttpResponseForbidden
-from ..models import Cart, Order, OrderItem, Product, PromoCode, SiteSettings
+from ..mail import queue_email
+from ..carts import get_cart_backend
+from ..middleware import get_request_cart
+from ..models import Order, PromoCode, SiteSettings
+from ..orders import place_order
 from ..security import sanitize_text
 from .utils import (
     generate_idempotency_key,
@@ -21,23 +24,23 @@ from .utils import (
     build_shipping_methods,
     calculate_order_totals,
 )
-from .cart import get_or_create_cart
 
 logger = logging.getLogger(__name__)
 
 
 def checkout(request):
     """Checkout page with order form"""
-    cart = get_or_create_cart(request)
+    cart = get_request_cart(request)
+    totals = cart.totals
     
     # Redirect to cart if empty
-    if cart.total_items == 0:
+    if totals.is_empty:
         messages.warning(request, 'Your cart is empty. Add some products before checkout.')
         return redirect('core:cart')
     
     # Re-verify stock availability before checkout
     stock_errors = []
-    for item in cart.items.select_related('product').all():
+    for item in totals.items:
         if item.product.track_inventory and not item.product.allow_backorder:
             if item.product.stock_quantity < item.quantity:
                 stock_errors.append(f'{item.product.title}: only {item.product.stock_quantity} available')
@@ -86,9 +89,13 @@ def checkout(request):
             for error in errors:
                 messages.error(request, error)
         else:
+            # A guest cart becomes rows only now: the order is placed from locked cart rows
+            backend = get_cart_backend(request)
+            order_cart = backend.promote()
+            
             # Generate idempotency key to prevent duplicate submissions
             user_identifier = request.user.email if request.user.is_authenticated else request.session.session_key
-            idempotency_key = generate_idempotency_key(cart.id, user_identifier)
+            idempotency_key = generate_idempotency_key(order_cart.id, user_identifier)
             
             # Check for duplicate submission (within 5-minute window)
             cache_key = f'checkout_idempotency_{idempotency_key}'
@@ -106,99 +113,65 @@ def checkout(request):
                 if promo_code_str:
                     try:
                         promo = PromoCode.objects.get(code=promo_code_str)
-                        is_valid, _ = promo.is_valid(cart.subtotal, email)
+                        is_valid, _ = promo.is_valid(totals.subtotal, email)
                         if is_valid:
-                            discount_amount = promo.calculate_discount(cart.subtotal, order_totals['shipping_cost'])
+                            discount_amount = promo.calculate_discount(totals.subtotal, order_totals['shipping_cost'])
                             # Increment usage
                             PromoCode.objects.filter(id=promo.id).update(usage_count=F('usage_count') + 1)
                     except PromoCode.DoesNotExist:
                         promo_code_str = ''  # Invalid code
                 
                 # Recalculate total with discount
-                final_subtotal = cart.subtotal - discount_amount
+                final_subtotal = totals.subtotal - discount_amount
                 final_tax = final_subtotal * Decimal(str(order_totals['tax_rate']))
                 final_total = final_subtotal + order_totals['shipping_cost'] + final_tax
                 
-                # Use database transaction for order creation
+                # Different billing address?
+                different_billing = request.POST.get('different_billing') == 'on'
+                
+                # Create the order and queue its emails in one transaction: both exist or neither
                 with transaction.atomic():
-                    # Lock cart items to prevent race conditions
-                    cart_items_locked = list(cart.items.select_related('product').select_for_update().all())
-                    
-                    # Final stock verification within transaction
-                    for item in cart_items_locked:
-                        if item.product.track_inventory and not item.product.allow_backorder:
-                            # Refresh product to get current stock
-                            current_stock = Product.objects.filter(id=item.product.id).values_list('stock_quantity', flat=True).first()
-                            if current_stock < item.quantity:
-                                raise ValueError(f'{item.product.title}: only {current_stock} available')
-                    
-                    # Check if different billing address
-                    different_billing = request.POST.get('different_billing') == 'on'
-                    
-                    # Create order from cart
-                    order = Order.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    email=email,
-                    first_name=request.POST.get('first_name', '').strip(),
-                    last_name=request.POST.get('last_name', '').strip(),
-                    company_name=request.POST.get('company_name', '').strip(),
-                    phone=request.POST.get('phone', '').strip(),
-                    shipping_address_1=request.POST.get('shipping_address_1', '').strip(),
-                    shipping_address_2=request.POST.get('shipping_address_2', '').strip(),
-                    shipping_city=request.POST.get('shipping_city', '').strip(),
-                    shipping_state=request.POST.get('shipping_state', '').strip(),
-                    shipping_postal_code=request.POST.get('shipping_postal_code', '').strip().upper(),
-                    shipping_country=request.POST.get('shipping_country', 'Canada').strip(),
-                    shipping_method=order_totals['selected_method']['label'],
-                    shipping_eta=order_totals['selected_method']['eta'],
-                    # Billing address
-                    billing_same_as_shipping=not different_billing,
-                    billing_address_1=request.POST.get('billing_address_1', '').strip() if different_billing else '',
-                    billing_address_2=request.POST.get('billing_address_2', '').strip() if different_billing else '',
-                    billing_city=request.POST.get('billing_city', '').strip() if different_billing else '',
-                    billing_state=request.POST.get('billing_state', '').strip() if different_billing else '',
-                    billing_postal_code=request.POST.get('billing_postal_code', '').strip().upper() if different_billing else '',
-                    billing_country=request.POST.get('billing_country', 'Canada').strip() if different_billing else '',
-                    customer_notes=request.POST.get('customer_notes', '').strip(),
-                    subtotal=cart.subtotal,
-                    shipping_cost=order_totals['shipping_cost'],
-                    tax=final_tax,
-                    discount=discount_amount,
-                    promo_code=promo_code_str,
-                    total=final_total,
-                )
+                    # Lock, re-check stock, create the order and items, and empty the cart
+                    order = place_order(
+                        order_cart,
+                        user=request.user if request.user.is_authenticated else None,
+                        email=email,
+                        first_name=request.POST.get('first_name', '').strip(),
+                        last_name=request.POST.get('last_name', '').strip(),
+                        company_name=request.POST.get('company_name', '').strip(),
+                        phone=request.POST.get('phone', '').strip(),
+                        shipping_address_1=request.POST.get('shipping_address_1', '').strip(),
+                        shipping_address_2=request.POST.get('shipping_address_2', '').strip(),
+                        shipping_city=request.POST.get('shipping_city', '').strip(),
+                        shipping_state=request.POST.get('shipping_state', '').strip(),
+                        shipping_postal_code=request.POST.get('shipping_postal_code', '').strip().upper(),
+                        shipping_country=request.POST.get('shipping_country', 'Canada').strip(),
+                        shipping_method=order_totals['selected_method']['label'],
+                        shipping_eta=order_totals['selected_method']['eta'],
+                        # Billing address
+                        billing_same_as_shipping=not different_billing,
+                        billing_address_1=request.POST.get('billing_address_1', '').strip() if different_billing else '',
+                        billing_address_2=request.POST.get('billing_address_2', '').strip() if different_billing else '',
+                        billing_city=request.POST.get('billing_city', '').strip() if different_billing else '',
+                        billing_state=request.POST.get('billing_state', '').strip() if different_billing else '',
+                        billing_postal_code=request.POST.get('billing_postal_code', '').strip().upper() if different_billing else '',
+                        billing_country=request.POST.get('billing_country', 'Canada').strip() if different_billing else '',
+                        customer_notes=request.POST.get('customer_notes', '').strip(),
+                        subtotal=totals.subtotal,
+                        shipping_cost=order_totals['shipping_cost'],
+                        tax=final_tax,
+                        discount=discount_amount,
+                        promo_code=promo_code_str,
+                        total=final_total,
+                    )
+                    send_order_confirmation_email(order)
+                    send_order_notification_email(order)
                 
-                    # Create order items from locked cart items
-                    for cart_item in cart_items_locked:
-                        OrderItem.objects.create(
-                            order=order,
-                            product=cart_item.product,
-                            product_title=cart_item.product.title,
-                            product_sku=cart_item.product.sku or '',
-                            quantity=cart_item.quantity,
-                            unit_price=cart_item.unit_price,
-                            total_price=cart_item.total_price,
-                        )
-                        
-                        # Update stock atomically using F() to prevent race conditions
-                        if cart_item.product.track_inventory:
-                            Product.objects.filter(id=cart_item.product.id).update(
-                                stock_quantity=F('stock_quantity') - cart_item.quantity
-                            )
-                    
-                    # Clear cart within transaction
-                    cart.items.all().delete()
+                backend.checked_out()
                 
                 # Set idempotency cache after successful transaction (outside transaction)
                 cache.set(cache_key, order.order_number, 300)  # 5 minutes
                 
-                # Send emails asynchronously (outside transaction)
-                try:
-                    send_order_confirmation_email(order)
-                    send_order_notification_email(order)
-                except Exception as email_error:
-                    logger.error(f'Email send failed for order {order.order_number}: {str(email_error)}')
-                
                 # Store order number in session for access control
                 recent_orders = request.session.get('recent_orders', [])
                 recent_orders.append(order.order_number)
@@ -224,7 +197,7 @@ def checkout(request):
     
     context = {
         'cart': cart,
-        'cart_items': cart.items.select_related('product').all(),
+        'cart_items': totals.items,
         'STRIPE_PUBLISHABLE_KEY': settings.STRIPE_PUBLISHABLE_KEY,
         'online_payments_enabled': site_settings.online_payments_enabled,
         'order_totals': order_totals,
@@ -312,7 +285,7 @@ def download_invoice(request, order_number):
 
 
 def send_order_confirmation_email(order):
-    """Send order confirmation to customer"""
+    """Queue the order confirmation for the customer (call inside the order's transaction)"""
     try:
         subject = f'Order Confirmation - {order.order_number} | PackAxis'
         
@@ -359,23 +332,16 @@ Questions? Reply to this email or call us at (416) 275-2227
             'invoice_url': invoice_url,
         })
         
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[order.email],
-        )
-        email.attach_alternative(html_message, "text/html")
-        email.send(fail_silently=False)
-        
-        logger.info(f'Order confirmation email sent to {order.email} for order {order.order_number}')
-        
     except Exception as e:
-        logger.error(f'Failed to send order confirmation email to {order.email}: {str(e)}')
+        logger.error(f'Failed to render order confirmation email for order {order.order_number}: {str(e)}')
+        return
+    
+    queue_email(subject, text_message, [order.email], html_body=html_message)
+    logger.info(f'Order confirmation email queued for {order.email} (order {order.order_number})')
 
 
 def send_order_notification_email(order):
-    """Send new order notification to admin"""
+    """Queue the new order notification for admin (call inside the order's transaction)"""
     try:
         subject = f'🛒 New Order #{order.order_number} - ${order.total}'
         
@@ -420,17 +386,9 @@ https://packaxis.ca/admin/core/order/
             'order': order,
         })
         
-        # Send email
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[settings.QUOTE_EMAIL],
-        )
-        email.attach_alternative(html_message, "text/html")
-        email.send(fail_silently=False)
-        
-        logger.info(f'Order notification email sent to admin for order {order.order_number}')
-        
     except Exception as e:
-        logger.error(f'Failed to send order notification email: {str(e)}')
+        logger.error(f'Failed to render order notification email for order {order.order_number}: {str(e)}')
+        return
+    
+    queue_email(subject, text_message, [settings.QUOTE_EMAIL], html_body=html_message, reply_to=[order.email])
+    logger.info(f'Order notification email queued for order {order.order_number}')
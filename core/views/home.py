@@ -4,16 +4,23 @@ Includes: homepage, contact, privacy, terms, services, industries, products, pri
 """
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.http import HttpResponseRedirect
 import logging
-from ..models import ProductCategory, Service, Industry, Product, FAQ
+from .. import caching
+from django.utils.http import urlencode
+from ..facets import FACET_NAMES, get_facet_index, selected_facets
+from ..instrumentation import query_budget
+from ..mail import queue_email
+from ..models import ProductCategory, Service, Industry, FAQ
+from ..page_cache import cache_anonymous_page
 from ..security import sanitize_text, ratelimit_contact_form, handle_ratelimit
 
 logger = logging.getLogger(__name__)
 
 
+@query_budget(12)
+@cache_anonymous_page(tags=[caching.SERVICES, caching.INDUSTRIES])
 @handle_ratelimit
 @ratelimit_contact_form
 def index(request):
@@ -26,43 +33,27 @@ def index(request):
         company = sanitize_text(request.POST.get('company', 'Not provided'))
         message_text = sanitize_text(request.POST.get('message', ''))
         
-        # Send email notification
+        email_subject = f'New Contact Form Submission from {name}'
+        email_body = f"""
+        New contact form submission:
+        
+        Name: {name}
+        Email: {email}
+        Phone: {phone}
+        Company: {company}
+        
+        Message:
+        {message_text}
+        """
+        
         try:
-            # Check if email is configured
-            if not settings.EMAIL_HOST_USER or not settings.EMAIL_HOST_PASSWORD:
-                logger.warning('Email credentials not configured')
-                messages.warning(
-                    request,
-                    'Your message has been received but email notifications are not configured. We will respond as soon as possible.'
-                )
-            else:
-                email_subject = f'New Contact Form Submission from {name}'
-                email_body = f"""
-                New contact form submission:
-                
-                Name: {name}
-                Email: {email}
-                Phone: {phone}
-                Company: {company}
-                
-                Message:
-                {message_text}
-                """
-                
-                send_mail(
-                    email_subject,
-                    email_body,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [settings.QUOTE_EMAIL],
-                    fail_silently=False,
-                )
-                
-                messages.success(
-                    request, 
-                    'Thank you for reaching out! We\'ve received your message and will get back to you within 24 hours.'
-                )
+            queue_email(email_subject, email_body, [settings.QUOTE_EMAIL], reply_to=[email])
+            messages.success(
+                request, 
+                'Thank you for reaching out! We\'ve received your message and will get back to you within 24 hours.'
+            )
         except Exception as e:
-            logger.error(f'Email send failed: {str(e)}')
+            logger.error(f'Contact form email could not be queued: {str(e)}')
             messages.error(
                 request,
                 'Oops! Something went wrong. Please try again or contact us directly at hello@packaxis.ca'
@@ -91,6 +82,7 @@ def terms_of_service(request):
     return render(request, 'core/terms-of-service.html')
 
 
+@query_budget(12)
 @handle_ratelimit
 @ratelimit_contact_form
 def contact_page(request):
@@ -104,16 +96,8 @@ def contact_page(request):
         subject = sanitize_text(request.POST.get('subject', 'Contact Form'))
         message_text = sanitize_text(request.POST.get('message', ''))
         
-        try:
-            if not settings.EMAIL_HOST_USER or not settings.EMAIL_HOST_PASSWORD:
-                logger.warning('Email credentials not configured')
-                messages.warning(
-                    request,
-                    'Your message has been received but email notifications are not configured. We will respond as soon as possible.'
-                )
-            else:
-                email_subject = f'[Contact Form] {subject} - from {name}'
-                email_body = f"""
+        email_subject = f'[Contact Form] {subject} - from {name}'
+        email_body = f"""
 New contact form submission from packaxis.ca/contact/
 
 Subject: {subject}
@@ -128,22 +112,16 @@ Message:
 
 ---
 This email was sent from the Packaxis website contact form.
-                """
-                
-                send_mail(
-                    email_subject,
-                    email_body,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [settings.QUOTE_EMAIL],
-                    fail_silently=False,
-                )
-                
-                messages.success(
-                    request, 
-                    'Thank you for contacting us! We\'ve received your message and will get back to you within 24 hours.'
-                )
+        """
+        
+        try:
+            queue_email(email_subject, email_body, [settings.QUOTE_EMAIL], reply_to=[email])
+            messages.success(
+                request, 
+                'Thank you for contacting us! We\'ve received your message and will get back to you within 24 hours.'
+            )
         except Exception as e:
-            logger.error(f'Contact form email send failed: {str(e)}')
+            logger.error(f'Contact form email could not be queued: {str(e)}')
             messages.error(
                 request,
                 'Oops! Something went wrong. Please try again or contact us directly at hello@packaxis.ca'
@@ -154,6 +132,8 @@ This email was sent from the Packaxis website contact form.
     return render(request, 'core/contact.html')
 
 
+@query_budget(10)
+@cache_anonymous_page(tags=[caching.SERVICES])
 def services_page(request):
     """Display all services on a dedicated page"""
     services = Service.objects.filter(is_active=True)
@@ -163,6 +143,8 @@ def services_page(request):
     return render(request, 'core/services.html', context)
 
 
+@query_budget(12)
+@cache_anonymous_page(tags=[caching.INDUSTRIES])
 def industries_page(request):
     """Display all industries on a dedicated page"""
     industries = Industry.objects.filter(is_active=True)
@@ -172,20 +154,24 @@ def industries_page(request):
     return render(request, 'core/industries.html', context)
 
 
+@query_budget(14)
+@cache_anonymous_page(tags=[caching.CATALOG], vary_on=FACET_NAMES + ['after'])
 def products_page(request):
-    """Display all products on a dedicated page"""
-    products = Product.objects.filter(is_active=True).select_related('category').order_by('category', 'title')
-    categories = ProductCategory.objects.filter(is_active=True)
+    """Display all products on a dedicated page, filtered by any combination of facets"""
+    categories = list(ProductCategory.objects.filter(is_active=True))
     
-    # Get selected category filter
-    selected_category = request.GET.get('category', '')
-    if selected_category:
-        products = products.filter(category__slug=selected_category)
+    # Filtering and facet counts come from the in-memory facet bitsets
+    index = get_facet_index()
+    selected = selected_facets(request.GET)
+    products, next_cursor = index.page(index.match(selected), request.GET.get('after'))
     
     context = {
         'products': products,
         'categories': categories,
-        'selected_category': selected_category,
+        'selected_category': request.GET.get('category', ''),
+        'facet_groups': index.counts(selected),
+        'facet_query': urlencode(selected, doseq=True),
+        'next_cursor': next_cursor,
     }
     return render(request, 'core/products.html', context)
 
@@ -195,6 +181,8 @@ def pricing_brochure(request):
     return render(request, 'core/pricing-brochure.html')
 
 
+@query_budget(12)
+@cache_anonymous_page(tags=[caching.FAQ])
 def faq(request):
     """Display FAQ page with common questions"""
     faqs = FAQ.objects.filter(is_active=True)
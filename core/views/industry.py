@@ -5,9 +5,11 @@ Includes: dynamic industry detail pages, legacy industry landing pages.
 from django.shortcuts import render
 from django.http import Http404
 from django.db import models
+from ..instrumentation import query_budget
 from ..models import Industry, Product
 
 
+@query_budget(16)
 def industry_detail(request, slug):
     """
     Dynamic industry detail page that shows products for that industry.
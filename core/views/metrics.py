@@ -0,0 +1,13 @@
+"""
+Request metrics views.
+Includes: staff-only per-view latency, query and cache summary.
+"""
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from ..instrumentation import WINDOW, snapshot
+
+
+@staff_member_required
+def request_metrics(request):
+    """p50/p95/max of each measured number and a latency histogram per URL name, over the rolling window"""
+    return JsonResponse({'window': WINDOW, 'views': snapshot()})
@@ -5,14 +5,17 @@ Includes: quote form, quote submission, validation.
 import logging
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from ..instrumentation import query_budget
+from ..mail import queue_email
 from ..models import Product, ProductCategory, Quote
 from ..security import sanitize_text, ratelimit_quote_form, handle_ratelimit
 
 logger = logging.getLogger(__name__)
 
 
+@query_budget(14)
 @handle_ratelimit
 @ratelimit_quote_form
 def quote_request(request):
@@ -35,8 +38,7 @@ def quote_request(request):
             # Get product object
             product = get_object_or_404(Product, id=product_id)
             
-            # Create quote request
-            quote = Quote.objects.create(
+            quote = Quote(
                 name=name,
                 company_name=company_name,
                 email=email,
@@ -48,9 +50,11 @@ def quote_request(request):
                 message=message_text
             )
             
-            # Send email notification
-            subject = f'New Quote Request from {name}'
-            email_message = f"""
+            # Queue the email notification in the same transaction as the quote
+            with transaction.atomic():
+                quote.save()
+                subject = f'New Quote Request from {name}'
+                email_message = f"""
 New Quote Request Received:
 
 Customer Details:
@@ -71,17 +75,7 @@ Additional Message:
 Quote ID: {quote.id}
 Submitted: {quote.created_at.strftime('%Y-%m-%d %H:%M:%S')}
             """
-            
-            try:
-                send_mail(
-                    subject,
-                    email_message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [settings.QUOTE_EMAIL],  # Email where quotes should be sent
-                    fail_silently=False,
-                )
-            except Exception as e:
-                print(f"Email sending failed: {e}")
+                queue_email(subject, email_message, [settings.QUOTE_EMAIL], reply_to=[email])
             
             messages.success(request, '🎉 Thank you! Your quote request has been submitted successfully. We\'ll get back to you within 24 hours.')
             return redirect('core:quote_request')
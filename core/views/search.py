@@ -0,0 +1,52 @@
+"""
+Product search views.
+Includes: search results page, autocomplete suggestions.
+"""
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+from ..instrumentation import query_budget
+from ..search import search_products
+from ..security import handle_ratelimit, ratelimit_search, ratelimit_search_suggest, sanitize_text
+
+MAX_QUERY_LENGTH = 100
+RESULTS_LIMIT = 48
+SUGGESTIONS_LIMIT = 8
+
+
+def _query(request):
+    return (sanitize_text(request.GET.get('q', '')) or '').strip()[:MAX_QUERY_LENGTH]
+
+
+@query_budget(12)
+@handle_ratelimit
+@ratelimit_search
+def search(request):
+    """Search results for ?q=, ranked by relevance (sizes, GSM, tags and categories included)"""
+    query = _query(request)
+    products = search_products(query, limit=RESULTS_LIMIT) if query else []
+    context = {
+        'query': query,
+        'products': products,
+    }
+    return render(request, 'core/search.html', context)
+
+
+@query_budget(8)
+@handle_ratelimit
+@ratelimit_search_suggest
+def search_suggest(request):
+    """Autocomplete: best matches for a partially typed query, completing the last word as a prefix"""
+    query = _query(request)
+    listings = search_products(query, limit=SUGGESTIONS_LIMIT, prefix=True) if query else []
+    results = [
+        {
+            'title': listing.title,
+            'url': reverse('core:product_detail', args=[listing.category_slug or 'products', listing.slug]),
+            'price': str(listing.price) if listing.price is not None else None,
+            'thumbnail': listing.thumbnail_url,
+            'category': listing.category_title,
+        }
+        for listing in listings
+    ]
+    return JsonResponse({'query': query, 'results': results})
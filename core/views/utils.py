@@ -20,13 +20,14 @@ def generate_idempotency_key(cart_id, user_identifier):
 def validate_cart_for_checkout(cart):
     """Comprehensive cart validation for checkout - returns (is_valid, errors)."""
     errors = []
+    totals = cart.totals
     
-    if cart.total_items == 0:
+    if totals.is_empty:
         errors.append('Your cart is empty.')
         return False, errors
     
     # Re-verify stock and prices
-    for item in cart.items.select_related('product').all():
+    for item in totals.items:
         product = item.product
         
         if not product.is_active:
@@ -42,8 +43,8 @@ def validate_cart_for_checkout(cart):
 
 def build_shipping_methods(cart):
     """Construct shipping method options with dynamic pricing."""
-    subtotal = cart.subtotal
-    standard_cost = Decimal('0.00') if subtotal >= cart.FREE_SHIPPING_THRESHOLD else cart.get_shipping_estimate()
+    totals = cart.totals
+    standard_cost = totals.get_shipping_estimate()
     standard_cost = standard_cost.quantize(Decimal('0.01'))
 
     express_cost = Decimal('12.00').quantize(Decimal('0.01'))
@@ -77,10 +78,11 @@ def calculate_order_totals(cart, shipping_method_id, province, shipping_methods=
     methods_map = {m['id']: m for m in shipping_methods}
     selected = methods_map.get(shipping_method_id, shipping_methods[0])
 
+    totals = cart.totals
     shipping_cost = selected['cost'].quantize(Decimal('0.01'))
-    tax_rate = cart.TAX_RATES.get(province, cart.TAX_RATES.get('ON', Decimal('0.13')))
-    tax_amount = (cart.subtotal * tax_rate).quantize(Decimal('0.01'))
-    total = (cart.subtotal + shipping_cost + tax_amount).quantize(Decimal('0.01'))
+    tax_rate = totals.get_tax_rate(province)
+    tax_amount = (totals.subtotal * tax_rate).quantize(Decimal('0.01'))
+    total = (totals.subtotal + shipping_cost + tax_amount).quantize(Decimal('0.01'))
 
     return {
         'shipping_methods': shipping_methods,
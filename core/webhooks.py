@@ -0,0 +1,121 @@
+"""
+Stripe webhook event queue.
+
+The webhook view only verifies an event's signature and stores it with
+store_stripe_event(), keyed by the event id, so Stripe's redeliveries are
+acknowledged without being applied twice, and the response goes out before
+any order is touched. The process_stripe_events management command applies
+the queue: process_stripe_events_batch() claims pending events in the order
+Stripe created them and moves the orders they concern with one UPDATE per
+payment status.
+
+A payment status only moves forward (pending, failed, paid, refunded), so a
+late or reordered event can't undo a newer one: a failed attempt reported
+after the customer paid with another card leaves the order paid.
+
+A succeeded or canceled PaymentIntent can't be confirmed again, so the batch
+also forgets it on the cart holding it: when the customer paid but the
+browser never reached process_payment, the next checkout gets a new intent
+instead of the spent one's client secret.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from .models import Cart, Order, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_STATUS_ORDER = ['pending', 'failed', 'paid', 'refunded']
+# Events after which a PaymentIntent can't be confirmed again
+SPENT_INTENT_EVENTS = ('payment_intent.succeeded', 'payment_intent.canceled')
+
+
+def store_stripe_event(event):
+    """Queue a verified event (the parsed payload); returns False when its id was already stored"""
+    _, created = StripeEvent.objects.get_or_create(event_id=event['id'], defaults={
+        'type': event['type'],
+        'payload': event,
+        'stripe_created': datetime.fromtimestamp(event['created'], tz=dt_timezone.utc),
+    })
+    return created
+
+
+def payment_update(event):
+    """(payment intent id, payment status) an event moves an order to, or None for events orders ignore"""
+    obj = event['data']['object']
+    if event['type'] == 'payment_intent.succeeded':
+        return obj['id'], 'paid'
+    if event['type'] == 'payment_intent.payment_failed':
+        return obj['id'], 'failed'
+    if event['type'] == 'charge.refunded' and obj.get('refunded') and obj.get('payment_intent'):
+        # Partial refunds leave the order paid
+        return obj['payment_intent'], 'refunded'
+    return None
+
+
+def spent_intent_id(event):
+    """Id of the PaymentIntent the event leaves unusable for another checkout, or None"""
+    if event['type'] in SPENT_INTENT_EVENTS:
+        return event['data']['object']['id']
+    return None
+
+
+def process_stripe_events_batch(batch_size=100):
+    """
+    Apply up to batch_size pending events and return (processed, failed).
+
+    Events are locked with SKIP LOCKED, so several workers can drain the
+    queue; an event whose payload can't be read is marked failed with the
+    error and the rest of the batch is applied.
+    """
+    with transaction.atomic():
+        batch = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=StripeEvent.STATUS_PENDING)
+            .order_by('stripe_created', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0, 0
+
+        statuses = {}  # payment intent id: furthest status the batch reaches
+        spent = set()
+        processed, failed = [], []
+        for event in batch:
+            try:
+                update = payment_update(event.payload)
+                spent_id = spent_intent_id(event.payload)
+            except (KeyError, TypeError) as e:
+                event.status = StripeEvent.STATUS_FAILED
+                event.last_error = f'Unreadable {event.type} event: {e!r}'
+                logger.error(f'Stripe event {event.event_id}: {event.last_error}')
+                failed.append(event)
+                continue
+            if update:
+                payment_id, status = update
+                current = statuses.get(payment_id, 'pending')
+                if PAYMENT_STATUS_ORDER.index(status) > PAYMENT_STATUS_ORDER.index(current):
+                    statuses[payment_id] = status
+            if spent_id:
+                spent.add(spent_id)
+            processed.append(event.pk)
+
+        for position, status in enumerate(PAYMENT_STATUS_ORDER):
+            payment_ids = [payment_id for payment_id, target in statuses.items() if target == status]
+            if payment_ids:
+                Order.objects.filter(
+                    payment_id__in=payment_ids, payment_status__in=PAYMENT_STATUS_ORDER[:position],
+                ).update(payment_status=status)
+        if spent:
+            Cart.objects.filter(payment_intent_id__in=spent).update(
+                payment_intent_id='', payment_intent_secret='', payment_intent_fingerprint='',
+            )
+
+        if processed:
+            StripeEvent.objects.filter(pk__in=processed).update(
+                status=StripeEvent.STATUS_PROCESSED, processed_at=timezone.now(), last_error='',
+            )
+        if failed:
+            StripeEvent.objects.bulk_update(failed, ['status', 'last_error'])
+
+    return len(processed), len(failed)
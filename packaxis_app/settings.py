@@ -81,9 +81,11 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'core.instrumentation.RequestMetricsMiddleware',  # Query/cache/template timings (first, to time everything)
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files for production
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise static files, async-capable
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.CartMiddleware',  # Lazy request.cart shared by views and templates
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -116,6 +118,7 @@ TEMPLATES = [
                 'core.context_processors.product_categories_context',
                 'core.context_processors.cart_context',
                 'core.context_processors.google_oauth_enabled',
+                'core.context_processors.page_cache',
             ],
         },
     },
@@ -137,6 +140,8 @@ if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
+            # Set DB_CONN_MAX_AGE=0 for the ASGI web process (startup.py): each request
+            # runs its sync code on a fresh thread, which can't reuse a persistent connection
             conn_max_age=config('DB_CONN_MAX_AGE', default=60, cast=int),
             conn_health_checks=True,
         )
@@ -150,7 +155,7 @@ else:
     DB_PASSWORD = config('DB_PASSWORD', default='postgres123')
     DB_HOST = config('DB_HOST', default='localhost')
     DB_PORT = config('DB_PORT', default='5432')
-    DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)  # Set 0 under ASGI, see above
     DB_ATOMIC_REQUESTS = config('DB_ATOMIC_REQUESTS', default=True, cast=bool)
 
     DB_OPTIONS = {}
@@ -286,6 +291,13 @@ MEDIA_ROOT = BASE_DIR / 'media'
 if DEBUG:
     MEDIA_URL = 'media/'
 
+# Uploaded images are served as AVIF/WebP/JPEG renditions at these widths
+# (core.images), stored under derivatives/ in the same storage as the originals
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 960, 1280, 1920)
+# Render them after the upload's commit, in the request; turn off when the
+# images worker (rebuild_image_derivatives --loop) renders them instead
+IMAGE_DERIVATIVES_ON_UPLOAD = config('IMAGE_DERIVATIVES_ON_UPLOAD', default=True, cast=bool)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -333,6 +345,33 @@ CACHE_TIMEOUT_MEDIUM = 300  # 5 minutes - for product lists
 CACHE_TIMEOUT_LONG = 3600  # 1 hour - for static content
 CACHE_TIMEOUT_DAY = 86400  # 24 hours - for rarely changing content
 
+# Full-page cache for anonymous, cart-less visitors (core.page_cache)
+PAGE_CACHE_ENABLED = config('PAGE_CACHE_ENABLED', default=True, cast=bool)
+PAGE_CACHE_TIMEOUT = CACHE_TIMEOUT_LONG
+
+# Per-request SQL, cache and template metrics (core.instrumentation): sent as a
+# Server-Timing header and kept per view over the last REQUEST_METRICS_WINDOW
+# requests. Views over their @query_budget raise when QUERY_BUDGET_STRICT is on
+# and are only logged otherwise.
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=True, cast=bool)
+REQUEST_METRICS_WINDOW = 500
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=DEBUG, cast=bool)
+
+# Cart storage (core.carts): signed-in customers keep Cart rows, guests keep
+# their lines in a signed cookie until checkout or sign-in promotes them
+CART_BACKEND = 'core.carts.DatabaseCartBackend'
+GUEST_CART_BACKEND = 'core.carts.CookieCartBackend'
+GUEST_CART_MAX_LINES = 50
+
+# Carts untouched for CART_EXPIRY_DAYS, and empty ones after
+# EMPTY_CART_GRACE_HOURS, are deleted by the reap_carts command (core.cart_reaper)
+CART_EXPIRY_DAYS = 30
+EMPTY_CART_GRACE_HOURS = 1
+
+# Blog post views are buffered in the cache and written to the database at
+# most this often (blog.view_counts); 0 leaves flushing to flush_blog_views
+BLOG_VIEW_FLUSH_INTERVAL = config('BLOG_VIEW_FLUSH_INTERVAL', default=CACHE_TIMEOUT_MEDIUM, cast=int)
+
 # Jazzmin Settings
 JAZZMIN_SETTINGS = {
     # title of the window (Will default to current_admin_site.site_title if absent or None)
@@ -513,6 +552,11 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = 'no-reply@packaxis.ca'
 QUOTE_EMAIL = 'sales@packaxis.ca'  # Email where quote requests and contact forms will be sent
 
+# Outbound mail is queued in core.OutboundEmail and delivered by
+# `python manage.py send_queued_email --loop`; failures back off exponentially
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=6, cast=int)
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = config('EMAIL_OUTBOX_RETRY_BASE_SECONDS', default=60, cast=int)
+
 # Logging Configuration - Enterprise Grade
 LOGGING = {
     'version': 1,
@@ -606,6 +650,12 @@ STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='pk_test_your_
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='sk_test_your_secret_key')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
 STRIPE_CURRENCY = 'cad'  # Canadian Dollars
+# Stripe API calls from the async payment views (core.payments): seconds per request
+# and to connect, and retries after network errors; STRIPE_API_BASE points at stripe-mock
+STRIPE_TIMEOUT = config('STRIPE_TIMEOUT', default=10, cast=float)
+STRIPE_CONNECT_TIMEOUT = config('STRIPE_CONNECT_TIMEOUT', default=3, cast=float)
+STRIPE_MAX_NETWORK_RETRIES = config('STRIPE_MAX_NETWORK_RETRIES', default=2, cast=int)
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
 
 # Google OAuth Provider Settings
 SOCIALACCOUNT_PROVIDERS = {
@@ -18,18 +18,20 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from core.sitemaps import sitemap_view, robots_txt_view
+from core.sitemaps import sitemap_view, sitemap_section_view, robots_txt_view
 
 urlpatterns = [
     # Admin path - use only one obscure path for security
     # Remove /admin/ to prevent easy discovery by attackers
     path('superusers/', admin.site.urls),
     # path('admin/', admin.site.urls),  # DISABLED for security
-    path('', include('core.urls')),
+    # Before core.urls, whose catch-all industry pattern would otherwise match /blog/
     path('blog/', include('blog.urls')),
+    path('', include('core.urls')),
     path('accounts/', include('accounts.urls')),
     path('accounts/', include('allauth.urls')),
     path('sitemap.xml', sitemap_view, name='sitemap'),
+    path('sitemap-<slug:section>.xml', sitemap_section_view, name='sitemap_section'),
     path('robots.txt', robots_txt_view, name='robots'),
 ]
 
@@ -10,6 +10,11 @@ echo "📊 Running database migrations..."
 python manage.py migrate --noinput
 echo "✅ Migrations completed!"
 
+echo ""
+echo "🗂️  Rebuilding product listings..."
+python manage.py rebuild_listings
+echo "✅ Product listings ready!"
+
 echo ""
 echo "👤 Creating/checking superuser..."
 python create_superuser.py
@@ -17,4 +22,4 @@ echo "✅ Superuser ready!"
 
 echo ""
 echo "🌐 Starting Gunicorn web server..."
-gunicorn packaxis_app.wsgi:application --bind 0.0.0.0:$PORT --workers 4 --timeout 120
+gunicorn packaxis_app.asgi:application --worker-class uvicorn_worker.UvicornWorker --bind 0.0.0.0:$PORT --workers 4 --timeout 120
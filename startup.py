@@ -39,6 +39,9 @@ def main():
     # Run migrations
     run_command("python manage.py migrate --noinput", "Database migrations")
     
+    # Rebuild the product listing read model (cheap; catches up on rows changed outside signals)
+    run_command("python manage.py rebuild_listings", "Product listing rebuild")
+    
     # Create superuser
     run_command("python create_superuser.py", "Superuser creation")
     
@@ -53,7 +56,9 @@ def main():
     port = os.environ.get('PORT', '8080')
     os.execvp('gunicorn', [
         'gunicorn',
-        'packaxis_app.wsgi:application',
+        'packaxis_app.asgi:application',
+        # ASGI workers, so the async payment views wait on Stripe without holding a worker
+        '--worker-class', 'uvicorn_worker.UvicornWorker',
         '--bind', f'0.0.0.0:{port}',
         '--workers', '4',
         '--timeout', '120',